@@ -0,0 +1,203 @@
+#!/usr/bin/python3
+# Copyright 2019 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Benchmarks for the storage model on synthetic, storage-dense machines.
+
+Run from the top of the tree with the same environment as the tests, e.g.:
+
+    PYTHONPATH=.:fake_deps python3 scripts/benchmark-storage.py render
+"""
+
+import argparse
+import collections
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault('FAKE_TRANSLATE', 'always')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from subiquity.models.filesystem import (  # noqa: E402
+    align_down,
+    Disk,
+    FilesystemModel,
+    )
+
+
+FakeStorageInfo = collections.namedtuple('FakeStorageInfo', ['size'])
+
+
+def make_disk(model, n, size=2 << 40):
+    disk = Disk(
+        m=model, serial='serial%s' % n, path='/dev/vd%s' % n,
+        info=FakeStorageInfo(size=size))
+    model._add_action(disk)
+    return disk
+
+
+def make_machine(target_actions, partitions_per_disk):
+    """Make a model with (about) target_actions actions in it.
+
+    Each disk gets partitions_per_disk partitions, each of which is
+    formatted and mounted somewhere below /srv, which is itself mounted.
+    """
+    model = FilesystemModel()
+    srv_disk = make_disk(model, 'srv')
+    srv = model.add_filesystem(srv_disk, 'ext4')
+    model.add_mount(srv, '/srv')
+    i = 0
+    while len(model._actions) < target_actions:
+        disk = make_disk(model, i)
+        size = align_down(disk.free_for_partitions // partitions_per_disk)
+        for j in range(partitions_per_disk):
+            part = model.add_partition(disk, size)
+            fs = model.add_filesystem(part, 'ext4')
+            model.add_mount(fs, '/srv/{}/{}'.format(i, j))
+        i += 1
+    return model
+
+
+def timeit(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def bench_render(args):
+    model = make_machine(args.actions, args.partitions)
+    orders = {
+        'sorted': list(model._actions),
+        'reversed': list(reversed(model._actions)),
+        'shuffled': random.Random(0).sample(
+            model._actions, len(model._actions)),
+        }
+    for name, actions in orders.items():
+        model._actions[:] = actions
+        t = timeit(model._render_actions, args.repeat)
+        print("render {} actions ({}): {:.3f}s".format(
+            len(actions), name, t))
+
+
+def bench_partitions(args):
+    model = FilesystemModel()
+    disks = [make_disk(model, i) for i in range(args.disks)]
+    for disk in disks:
+        size = align_down(disk.free_for_partitions // args.partitions)
+        for j in range(args.partitions):
+            model.add_partition(disk, size)
+
+    def label_all():
+        for disk in disks:
+            for part in disk.partitions():
+                part.label
+
+    t = timeit(label_all, args.repeat)
+    print("label {} disks with {} partitions: {:.3f}s".format(
+        args.disks, args.partitions, t))
+    t = timeit(model._render_actions, args.repeat)
+    print("render {} actions: {:.3f}s".format(len(model._actions), t))
+
+
+def make_probe_config(disks, partitions_per_disk):
+    """Make curtin storage config and blockdev data for a synthetic machine.
+
+    Each disk has partitions_per_disk partitions, each formatted ext4.
+    """
+    config = []
+    blockdevs = {}
+    part_size = 1 << 30
+    for i in range(disks):
+        path = '/dev/disk{}'.format(i)
+        disk_id = 'disk-{}'.format(i)
+        config.append({
+            'type': 'disk', 'id': disk_id, 'path': path,
+            'serial': 'serial{}'.format(i), 'ptable': 'gpt',
+            })
+        blockdevs[path] = {
+            'DEVNAME': path,
+            'DEVTYPE': 'disk',
+            'ID_SERIAL': 'serial{}'.format(i),
+            'MAJOR': '8',
+            'attrs': {'size': str((partitions_per_disk + 1) * part_size)},
+            }
+        for j in range(partitions_per_disk):
+            part_id = 'part-{}-{}'.format(i, j)
+            config.append({
+                'type': 'partition', 'id': part_id, 'device': disk_id,
+                'size': part_size, 'number': j + 1,
+                })
+            config.append({
+                'type': 'format', 'id': 'fs-{}-{}'.format(i, j),
+                'volume': part_id, 'fstype': 'ext4',
+                })
+    return config, blockdevs
+
+
+def bench_memory(args):
+    config, blockdevs = make_probe_config(args.disks, args.partitions)
+    model = FilesystemModel()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    start = time.perf_counter()
+    for obj in model._actions_from_config(config, blockdevs):
+        model._add_action(obj)
+    elapsed = time.perf_counter() - start
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(
+        stat.size_diff for stat in after.compare_to(before, 'filename'))
+    count = len(model._actions)
+    print("load {} disks, {} actions: {:.3f}s, {:.1f}MiB, {} bytes/action"
+          .format(args.disks, count, elapsed, size / (1 << 20),
+                  size // count))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    sub = parser.add_subparsers(dest='benchmark')
+    sub.required = True
+
+    render = sub.add_parser(
+        'render', help="time rendering the curtin storage config")
+    render.add_argument('--actions', type=int, default=10000)
+    render.add_argument('--partitions', type=int, default=8)
+    render.add_argument('--repeat', type=int, default=3)
+    render.set_defaults(func=bench_render)
+
+    partitions = sub.add_parser(
+        'partitions', help="time labelling disks with many partitions")
+    partitions.add_argument('--disks', type=int, default=16)
+    partitions.add_argument('--partitions', type=int, default=128)
+    partitions.add_argument('--repeat', type=int, default=3)
+    partitions.set_defaults(func=bench_partitions)
+
+    memory = sub.add_parser(
+        'memory', help="measure the memory used by the model objects")
+    memory.add_argument('--disks', type=int, default=2000)
+    memory.add_argument('--partitions', type=int, default=4)
+    memory.set_defaults(func=bench_memory)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/python3
+# Copyright 2019 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Compare how long each stage of several installs took.
+
+Each argument is an install profile (the curtin-profile.json that
+subiquity leaves in /var/log/installer) or a journal export such as
+examples/curtin-events.json. The first is the baseline, and stages that
+took more than --threshold times as long in a later install are marked
+with a '!'. For example:
+
+    PYTHONPATH=. python3 scripts/compare-install-profiles.py \\
+        examples/curtin-events.json /tmp/*/curtin-profile.json
+"""
+
+import argparse
+import os
+import sys
+
+os.environ.setdefault('FAKE_TRANSLATE', 'always')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from subiquity.install_profile import (  # noqa: E402
+    load_profile,
+    stage_durations,
+    STAGE_DEPTH,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('profiles', nargs='+', metavar='PROFILE')
+    parser.add_argument(
+        '--depth', type=int, default=STAGE_DEPTH,
+        help="show events nested this deep (default %(default)s)")
+    parser.add_argument(
+        '--threshold', type=float, default=1.25,
+        help="mark stages this many times slower than the baseline")
+    parser.add_argument(
+        '--min-seconds', type=float, default=1.0,
+        help="do not mark stages that took less than this in the baseline")
+    opts = parser.parse_args()
+
+    profiles = [load_profile(path) for path in opts.profiles]
+    durations = [stage_durations(p, opts.depth) for p in profiles]
+    keys = []
+    for d in durations:
+        for key in d:
+            if key not in keys:
+                keys.append(key)
+
+    for i, (path, profile) in enumerate(zip(opts.profiles, profiles)):
+        machine = ', '.join(
+            '{}={}'.format(k, v) for k, v in sorted(profile.machine.items()))
+        print("[{}] {} {}".format(i, path, machine))
+    print()
+
+    width = max(len(m) + 2 * n.count('/') for n, m in keys)
+    width = max(width, len("total"))
+    header = ' ' * width + ''.join(
+        '{:>10}'.format('[{}]'.format(i)) for i in range(len(profiles)))
+    print(header)
+    for key in keys:
+        name, message = key
+        row = (' ' * 2 * name.count('/') + message).ljust(width)
+        base = durations[0].get(key)
+        for d in durations:
+            duration = d.get(key)
+            if duration is None:
+                row += '{:>10}'.format('-')
+                continue
+            mark = ' '
+            if base is not None and base >= opts.min_seconds \
+               and duration > base * opts.threshold:
+                mark = '!'
+            row += '{:>9.1f}{}'.format(duration, mark)
+        print(row)
+    print('total'.ljust(width) + ''.join(
+        '{:>9.1f} '.format(p.total) for p in profiles))
+
+
+if __name__ == '__main__':
+    main()
@@ -23,28 +23,21 @@ from subiquitycore.controller import BaseController
 from subiquity.models.filesystem import (
     align_up,
     Bootloader,
+    dehumanize_size,
     DeviceAction,
     Partition,
     raidlevels_by_value,
     )
-from subiquity.ui.views import (
-    FilesystemView,
-    GuidedDiskSelectionView,
-    GuidedFilesystemView,
-    )
-from subiquity.ui.views.filesystem.probing import (
-    SlowProbing,
-    ProbingFailed,
+from subiquity.models.planner import (
+    boot_partition_size,
+    GUIDED_LVM_BOOT_SIZE,
+    GuidedPlanner,
     )
 
 
 log = logging.getLogger("subiquitycore.controller.filesystem")
 block_discover_log = logging.getLogger('block-discover')
 
-BIOS_GRUB_SIZE_BYTES = 1 * 1024 * 1024    # 1MiB
-PREP_GRUB_SIZE_BYTES = 8 * 1024 * 1024    # 8MiB
-UEFI_GRUB_SIZE_BYTES = 512 * 1024 * 1024  # 512MiB EFI partition
-
 
 class ProbeState(enum.IntEnum):
     NOT_STARTED = enum.auto()
@@ -69,11 +62,17 @@ class FilesystemController(BaseController):
         self.answers.setdefault('manual', [])
         self.showing = False
         self._probe_state = ProbeState.NOT_STARTED
+        self._prefetch_manual_handle = None
 
     def start(self):
+        if self.model.probe_data is not None:
+            # Restored from the snapshot taken before a refresh.
+            block_discover_log.info("using probe data from snapshot")
+            self._probe_state = ProbeState.DONE
+            return
         block_discover_log.info("starting probe")
         self._probe_state = ProbeState.PROBING
-        self.run_in_bg(self._bg_probe, self._probed)
+        self.run_in_bg(self._bg_probe, self._probed, lane='probe')
         self.loop.set_alarm_in(
             5.0, lambda loop, ud: self._check_probe_timeout())
 
@@ -125,9 +124,15 @@ class FilesystemController(BaseController):
         self.run_in_bg(
             lambda: self._bg_probe(["blockdev"]),
             lambda fut: self._probed(fut, True),
+            lane='probe',
             )
 
     def default(self):
+        from subiquity.ui.views.filesystem import GuidedFilesystemView
+        from subiquity.ui.views.filesystem.probing import (
+            SlowProbing,
+            ProbingFailed,
+            )
         self.showing = True
         if self._probe_state in [ProbeState.PROBING,
                                  ProbeState.REPROBING]:
@@ -135,11 +140,26 @@ class FilesystemController(BaseController):
         elif self._probe_state == ProbeState.FAILED:
             self.ui.set_body(ProbingFailed(self))
         else:
-            self.ui.set_body(GuidedFilesystemView(self))
+            self.ui.set_body(self.take_view(
+                'guided', lambda: GuidedFilesystemView(self)))
             if self.answers['guided']:
                 self.guided(self.answers.get('guided-method', 'direct'))
             elif self.answers['manual']:
                 self.manual()
+            else:
+                # Choosing "Manual" from here is the slow transition.
+                self._cancel_prefetch_manual()
+                self._prefetch_manual_handle = self.loop.set_alarm_in(
+                    0.1, self._prefetch_manual)
+
+    def _prefetch_manual(self, loop, ud):
+        self._prefetch_manual_handle = None
+        self.prefetch_view('manual', self._make_manual_view)
+
+    def _cancel_prefetch_manual(self):
+        if self._prefetch_manual_handle is not None:
+            self.loop.remove_alarm(self._prefetch_manual_handle)
+            self._prefetch_manual_handle = None
 
     def _action_get(self, id):
         dev_spec = id[0].split()
@@ -149,16 +169,10 @@ class FilesystemController(BaseController):
                 dev = self.model.all_disks()[int(dev_spec[2])]
         elif dev_spec[0] == "raid":
             if dev_spec[1] == "name":
-                for r in self.model.all_raids():
-                    if r.name == dev_spec[2]:
-                        dev = r
-                        break
+                dev = self.model.raid_by_name(dev_spec[2])
         elif dev_spec[0] == "volgroup":
             if dev_spec[1] == "name":
-                for r in self.model.all_volgroups():
-                    if r.name == dev_spec[2]:
-                        dev = r
-                        break
+                dev = self.model.volgroup_by_name(dev_spec[2])
         if dev is None:
             raise Exception("could not resolve {}".format(id))
         if len(id) > 1:
@@ -234,21 +248,140 @@ class FilesystemController(BaseController):
         else:
             raise Exception("could not process action {}".format(action))
 
+    def prefetch_key(self):
+        if self._probe_state != ProbeState.DONE:
+            return None
+        return self.model.generation
+
+    def prefetch(self):
+        from subiquity.ui.views.filesystem import GuidedFilesystemView
+        self.prefetch_view('guided', lambda: GuidedFilesystemView(self))
+
+    def _make_manual_view(self):
+        from subiquity.ui.views.filesystem import FilesystemView
+        return FilesystemView(self.model, self)
+
     def manual(self):
-        self.ui.set_body(FilesystemView(self.model, self))
+        self._cancel_prefetch_manual()
+        self.ui.set_body(self.take_view('manual', self._make_manual_view))
         if self.answers['guided']:
             self.finish()
         if self.answers['manual']:
             self._run_iterator(self._run_actions(self.answers['manual']))
             self.answers['manual'] = []
 
+    def _guided_answers_disk(self, method):
+        index = self.answers['guided-index']
+        if index == 'best':
+            disk = GuidedPlanner(self.model).best_disk(method)
+            if disk is None:
+                raise Exception("no disk is suitable for guided storage")
+            return disk
+        return self.model.all_disks()[index]
+
     def guided(self, method):
+        from subiquity.ui.views.filesystem import GuidedDiskSelectionView
+        self._cancel_prefetch_manual()
         v = GuidedDiskSelectionView(self.model, self, method)
         self.ui.set_body(v)
         if self.answers['guided']:
-            index = self.answers['guided-index']
-            disk = self.model.all_disks()[index]
-            v.choose_disk(None, disk)
+            v.choose_disk(None, self._guided_answers_disk(method))
+
+    def guided_layout(self, disk, method):
+        self.reformat(disk)
+        if method == "direct":
+            result = {
+                "size": disk.free_for_partitions,
+                "fstype": "ext4",
+                "mount": "/",
+                }
+            self.partition_disk_handler(disk, None, result)
+        elif method == 'lvm':
+            if DeviceAction.MAKE_BOOT in disk.supported_actions:
+                self.make_boot_disk(disk)
+            self.create_partition(
+                device=disk, spec=dict(
+                    size=GUIDED_LVM_BOOT_SIZE,
+                    fstype="ext4",
+                    mount='/boot'
+                    ))
+            part = self.create_partition(
+                device=disk, spec=dict(
+                    size=disk.free_for_partitions,
+                    fstype=None,
+                    ))
+            self._guided_lvm_root({part})
+        else:
+            raise Exception("unknown guided method '{}'".format(method))
+
+    def _guided_lvm_root(self, devices):
+        vg = self.create_volgroup(
+            spec=dict(
+                name="ubuntu-vg",
+                devices=devices,
+                ))
+        self.create_logical_volume(
+            vg=vg, spec=dict(
+                size=dehumanize_size("4G"),
+                name="ubuntu-lv",
+                fstype="ext4",
+                mount="/",
+                ))
+
+    def guided_multi_disk_layout(self, plan):
+        # plan is a MultiDiskPlan from GuidedPlanner.multi_disk_plan.
+        boot_disk = plan.disks[0]
+        for disk in plan.disks:
+            self.reformat(disk)
+        # The root filesystem is not on a partition of a disk, so
+        # mounting it will not make a boot disk as in guided_layout.
+        if DeviceAction.MAKE_BOOT in boot_disk.supported_actions:
+            self.make_boot_disk(boot_disk)
+        if plan.kind == "lvm":
+            self.create_partition(
+                device=boot_disk, spec=dict(
+                    size=GUIDED_LVM_BOOT_SIZE,
+                    fstype="ext4",
+                    mount='/boot'
+                    ))
+        parts = set()
+        for disk in plan.disks:
+            parts.add(self.create_partition(
+                device=disk, spec=dict(
+                    size=disk.free_for_partitions,
+                    fstype=None,
+                    )))
+        if plan.kind == "raid1":
+            raid_names = {raid.name for raid in self.model.all_raids()}
+            x = 0
+            while 'md{}'.format(x) in raid_names:
+                x += 1
+            raid = self.create_raid(
+                spec=dict(
+                    name='md{}'.format(x),
+                    level=raidlevels_by_value["raid1"],
+                    devices=parts,
+                    spare_devices=set(),
+                    ))
+            self.create_filesystem(raid, dict(fstype="ext4", mount="/"))
+        elif plan.kind == "lvm":
+            self._guided_lvm_root(parts)
+        else:
+            raise Exception("unknown guided plan '{}'".format(plan.kind))
+
+    def apply_answers(self):
+        # Only guided answers can be applied without the UI: the manual
+        # actions are replayed through the forms of the manual view.
+        if not self.answers['guided'] or self.answers['manual']:
+            return False
+        if self._probe_state != ProbeState.DONE:
+            return False
+        method = self.answers.get('guided-method', 'direct')
+        self.guided_layout(self._guided_answers_disk(method), method)
+        if not self.model.can_install():
+            raise Exception("answers did not provide complete fs config")
+        self.signal.emit_signal('installprogress:filesystem-config-done')
+        return True
 
     def reset(self):
         log.info("Resetting Filesystem model")
@@ -257,10 +390,12 @@ class FilesystemController(BaseController):
 
     def cancel(self):
         self.showing = False
+        self._cancel_prefetch_manual()
         self.signal.emit_signal('prev-screen')
 
     def finish(self):
         self.showing = False
+        self._cancel_prefetch_manual()
         log.debug("FilesystemController.finish next-screen")
         # start curtin install in background
         self.signal.emit_signal('installprogress:filesystem-config-done')
@@ -321,10 +456,8 @@ class FilesystemController(BaseController):
 
     def _create_boot_partition(self, disk):
         bootloader = self.model.bootloader
+        part_size = boot_partition_size(bootloader, disk.size)
         if bootloader == Bootloader.UEFI:
-            part_size = UEFI_GRUB_SIZE_BYTES
-            if UEFI_GRUB_SIZE_BYTES*2 >= disk.size:
-                part_size = disk.size // 2
             log.debug('Adding EFI partition first')
             part = self.create_partition(
                 disk,
@@ -334,7 +467,7 @@ class FilesystemController(BaseController):
             log.debug('Adding PReP gpt partition first')
             part = self.create_partition(
                 disk,
-                dict(size=PREP_GRUB_SIZE_BYTES, fstype=None, mount=None),
+                dict(size=part_size, fstype=None, mount=None),
                 # must be wiped or grub-install will fail
                 wipe='zero',
                 flag='prep')
@@ -343,7 +476,7 @@ class FilesystemController(BaseController):
             log.debug('Adding grub_bios gpt partition first')
             part = self.create_partition(
                 disk,
-                dict(size=BIOS_GRUB_SIZE_BYTES, fstype=None, mount=None),
+                dict(size=part_size, fstype=None, mount=None),
                 flag='bios_grub')
             self.model.grub_install_device = disk
         return part
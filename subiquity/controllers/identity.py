@@ -17,7 +17,6 @@ import logging
 
 from subiquitycore.controller import BaseController
 
-from subiquity.ui.views import IdentityView
 
 log = logging.getLogger('subiquity.controllers.identity')
 
@@ -29,18 +28,43 @@ class IdentityController(BaseController):
         self.model = self.base_model.identity
         self.answers = self.all_answers.get('Identity', {})
 
+    def _answers_user_spec(self):
+        if not all(elem in self.answers for elem in
+                   ['realname', 'username', 'password', 'hostname']):
+            return None
+        return {
+            'realname': self.answers['realname'],
+            'username': self.answers['username'],
+            'hostname': self.answers['hostname'],
+            'password': self.answers['password'],
+            }
+
     def default(self):
+        from subiquity.ui.views.identity import IdentityView
         self.ui.set_body(IdentityView(self.model, self))
-        if all(elem in self.answers for elem in
-               ['realname', 'username', 'password', 'hostname']):
-            d = {
-                'realname': self.answers['realname'],
-                'username': self.answers['username'],
-                'hostname': self.answers['hostname'],
-                'password': self.answers['password'],
-                }
+        d = self._answers_user_spec()
+        if d is not None:
             self.done(d)
 
+    def apply_answers(self):
+        from subiquity.ui.views.identity import (
+            IdentityForm,
+            read_reserved_usernames,
+            )
+        d = self._answers_user_spec()
+        if d is None:
+            return False
+        # Check the answers just as the form on the screen would.
+        form = IdentityForm(
+            read_reserved_usernames(), dict(d, confirm_password=d['password']))
+        errors = form.errors()
+        if errors:
+            raise Exception("invalid Identity answers: {}".format(
+                "; ".join(
+                    "{}: {}".format(k, v) for k, v in sorted(errors.items()))))
+        self._add_user(d)
+        return True
+
     def cancel(self):
         self.signal.emit_signal('prev-screen')
 
@@ -50,6 +74,9 @@ class IdentityController(BaseController):
         log.debug(
             "IdentityController.done next-screen user_spec=%s",
             safe_spec)
+        self._add_user(user_spec)
+        self.signal.emit_signal('next-screen')
+
+    def _add_user(self, user_spec):
         self.model.add_user(user_spec)
         self.signal.emit_signal('installprogress:identity-config-done')
-        self.signal.emit_signal('next-screen')
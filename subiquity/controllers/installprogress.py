@@ -16,6 +16,8 @@
 
 from concurrent.futures import Future
 import datetime
+import functools
+import itertools
 import logging
 import os
 import signal
@@ -33,7 +35,12 @@ from systemd import journal
 from subiquitycore import utils
 from subiquitycore.controller import BaseController
 
-from subiquity.ui.views.installprogress import ProgressView
+from subiquity.install_profile import (
+    ETAEstimator,
+    InstallProfile,
+    load_history,
+    machine_info,
+    )
 
 
 log = logging.getLogger("subiquitycore.controller.installprogress")
@@ -67,6 +74,14 @@ def task(f=None, transitions=None, **kw):
                        when the function returns, unless some other transition
                        has been followed beforehand.
       ._extra -- any extra keyword arguments passed to @task()
+
+    A task that is not run in the background can return a Future, in
+    which case the task completes when the Future does.
+
+    Consecutive tasks passed the same group=... are run as one state
+    (see TaskGroup), concurrently except that a task passed
+    after=(name, ...) is not started until the named tasks from earlier
+    in its group have completed.
     """
     if transitions is None:
         transitions = {}
@@ -92,13 +107,69 @@ def task(f=None, transitions=None, **kw):
         return annotate
 
 
+class TaskGroup:
+    """Tasks that are run concurrently, as one state of a StateMachine.
+
+    The group succeeds when all of its tasks have, and fails (once the
+    tasks that are running have finished) if any task does. Tasks in a
+    group cannot have transitions of their own.
+    """
+
+    _is_bg = False
+
+    def __init__(self, name, tasks):
+        self._name = name
+        self._order = tasks[0]._order
+        self._transitions = {}
+        self._extra = {}
+        self.tasks = tasks
+        self._names = {func._name for func in tasks}
+        seen = set()
+        for func in tasks:
+            if func._transitions:
+                raise Exception(
+                    "task {} in group {} has transitions".format(
+                        func._name, name))
+            # Dependencies on tasks that have been filtered out of the
+            # group are ignored, but ones on later tasks would deadlock.
+            for dep in self.deps(func):
+                if dep not in seen:
+                    raise Exception(
+                        "task {} in group {} comes before {}".format(
+                            dep, name, func._name))
+            seen.add(func._name)
+
+    def deps(self, func):
+        """The names of the tasks in this group func waits for."""
+        return {
+            dep for dep in func._extra.get('after', ())
+            if dep in self._names
+            }
+
+    def __repr__(self):
+        return "TaskGroup({!r}, {})".format(
+            self._name, [func._name for func in self.tasks])
+
+
+def _group_tasks(task_funcs):
+    r = []
+    for group, funcs in itertools.groupby(
+            task_funcs, lambda f: f._extra.get('group')):
+        if group is None:
+            r.extend(funcs)
+        else:
+            r.append(TaskGroup(group, list(funcs)))
+    return r
+
+
 def collect_tasks(inst, filter_task=lambda f: True):
     """Collect the methods on inst annotated with @task.
 
     Returns a list of tuples (method, transitions) where method is the
-    annotated method and transitions are the transitions defined while
-    method is running, with 'success' automatically filled in as a
-    transition to the next state if not otherwise defined.
+    annotated method (or a TaskGroup of them) and transitions are the
+    transitions defined while method is running, with 'success'
+    automatically filled in as a transition to the next state if not
+    otherwise defined.
     """
     task_funcs = []
     attrs = inst.__class__.__dict__.values()
@@ -108,6 +179,7 @@ def collect_tasks(inst, filter_task=lambda f: True):
         if filter_task(a):
             task_funcs.append(getattr(inst, a.__name__))
     task_funcs.sort(key=lambda f: f._order)
+    task_funcs = _group_tasks(task_funcs)
     r = []
     for i, func in enumerate(task_funcs[:-1]):
         transitions = func._transitions.copy()
@@ -162,33 +234,50 @@ class StateMachine:
             else:
                 log.debug("all tasks completed")
 
-    def run(self):
-        log.debug("running task %s", self.cur)
-        func = self._tasks[self.cur]
-
-        def end(fut):
-            log.debug('_end %s %s', func._name, fut)
-            self._results[func._name] = fut
-            if 'label' in func._extra:
-                self.controller._install_event_finish()
-            for subscriber in self._subscribers.get(func._name, ()):
-                subscriber(fut)
-
+    def _start(self, func, end, nest=True):
+        """Run func, passing a Future for its result to end."""
         if 'label' in func._extra:
-            self.controller._install_event_start(func._extra['label'])
+            self.controller._install_event_start(
+                func._extra['label'], nest=nest)
 
         if func._is_bg:
-            self.controller.run_in_bg(func, end)
+            self.controller.run_in_bg(func, end, lane='install')
         else:
             fut = Future()
             try:
-                fut.set_result(func())
+                result = func()
             except urwid.ExitMainLoop:
                 raise
             except Exception as e:
                 fut.set_exception(e)
+            else:
+                if isinstance(result, Future):
+                    result.add_done_callback(end)
+                    return
+                fut.set_result(result)
             end(fut)
 
+    def _end(self, name, fut):
+        log.debug('_end %s %s', name, fut)
+        self._results[name] = fut
+        for subscriber in self._subscribers.get(name, ()):
+            subscriber(fut)
+
+    def run(self):
+        log.debug("running task %s", self.cur)
+        func = self._tasks[self.cur]
+
+        if isinstance(func, TaskGroup):
+            _GroupRun(self, func).start_ready()
+            return
+
+        def end(fut):
+            if 'label' in func._extra:
+                self.controller._install_event_finish()
+            self._end(func._name, fut)
+
+        self._start(func, end)
+
     def transition(self, name):
         """Follow the named transition for the current state."""
         new = self._transitions[self.cur][name]
@@ -197,6 +286,155 @@ class StateMachine:
         self.run()
 
 
+class JournalBatcher:
+    """Hand journal entries on in batches, at most fps batches a second.
+
+    Entries are queued as they are read and callback is called with all
+    the queued entries, either straight away or, if a batch was handed
+    on less than 1/fps seconds ago, from an alarm. So however fast
+    curtin logs, the screen is updated at most fps times a second.
+    """
+
+    def __init__(self, loop, callback, fps):
+        self.loop = loop
+        self.callback = callback
+        if fps > 0:
+            self.interval = 1 / fps
+        else:
+            self.interval = 0
+        self._pending = []
+        self._alarm = None
+        self._last_batch = 0.0
+        # For summary().
+        self.entries = 0
+        self.batches = 0
+        self._first_entry = None
+        self._last_entry = None
+        self._total_latency = 0.0
+        self._max_latency = 0.0
+        self._timed_entries = 0
+
+    def add(self, entries):
+        if not entries:
+            return
+        now = time.monotonic()
+        if self._first_entry is None:
+            self._first_entry = now
+        self._last_entry = now
+        self._pending.extend(entries)
+        if self._alarm is not None:
+            return
+        wait = self._last_batch + self.interval - now
+        if wait <= 0:
+            self.flush()
+        else:
+            self._alarm = self.loop.set_alarm_in(wait, self._alarm_fired)
+
+    def _alarm_fired(self, loop, user_data):
+        self._alarm = None
+        self.flush()
+
+    def flush(self):
+        """Hand on the queued entries now."""
+        if self._alarm is not None:
+            self.loop.remove_alarm(self._alarm)
+            self._alarm = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        self._last_batch = time.monotonic()
+        self._record(batch)
+        self.callback(batch)
+
+    def _record(self, batch):
+        self.entries += len(batch)
+        self.batches += 1
+        now = time.time()
+        for entry in batch:
+            # The time journald received the entry, as a datetime.
+            ts = entry.get('__REALTIME_TIMESTAMP')
+            if ts is None:
+                continue
+            latency = max(0.0, now - ts.timestamp())
+            self._total_latency += latency
+            self._max_latency = max(self._max_latency, latency)
+            self._timed_entries += 1
+
+    def summary(self):
+        duration = 0.0
+        if self._first_entry is not None:
+            duration = self._last_entry - self._first_entry
+        rate = self.entries / duration if duration > 0 else 0.0
+        mean = 0.0
+        if self._timed_entries:
+            mean = self._total_latency / self._timed_entries
+        return (
+            "{} journal entries in {} batches, {:.1f} entries/s, "
+            "ingest latency mean {:.3f}s max {:.3f}s").format(
+                self.entries, self.batches, rate, mean, self._max_latency)
+
+
+class _GroupRun:
+    # The state of a TaskGroup being run by a StateMachine.
+
+    def __init__(self, sm, group):
+        self.sm = sm
+        self.group = group
+        self.waiting = list(group.tasks)
+        self.running = set()
+        self.done = set()
+        self.labelled = 0  # running tasks that have a label
+        self.failure = None
+        self._starting = False
+        self._finished = False
+
+    def start_ready(self):
+        # Foreground tasks complete inside _start, so this is called
+        # from end() while it is already running.
+        if self._starting:
+            return
+        self._starting = True
+        try:
+            while self.failure is None:
+                ready = [
+                    func for func in self.waiting
+                    if self.group.deps(func) <= self.done]
+                if not ready:
+                    break
+                for func in ready:
+                    self.waiting.remove(func)
+                    self.running.add(func._name)
+                    if 'label' in func._extra:
+                        self.labelled += 1
+                    log.debug("starting %s in %s", func._name, self.group)
+                    self.sm._start(
+                        func, functools.partial(self.end, func), nest=False)
+        finally:
+            self._starting = False
+        if not self.running and not self._finished:
+            self._finished = True
+            fut = Future()
+            if self.failure is not None:
+                fut.set_exception(self.failure)
+            else:
+                fut.set_result(None)
+            self.sm._end(self.group._name, fut)
+
+    def end(self, func, fut):
+        self.running.discard(func._name)
+        if 'label' in func._extra:
+            self.labelled -= 1
+            self.sm.controller._install_event_finish(
+                nest=False, stop_spinner=self.labelled == 0)
+        exc = fut.exception()
+        if exc is None:
+            self.done.add(func._name)
+        elif self.failure is None:
+            self.failure = exc
+        self.sm._end(func._name, fut)
+        self.start_ready()
+
+
 class InstallProgressController(BaseController):
     signals = [
         ('installprogress:filesystem-config-done', 'filesystem_config_done'),
@@ -213,6 +451,10 @@ class InstallProgressController(BaseController):
         self.progress_view_showing = False
         self.install_state = InstallState.NOT_STARTED
         self.journal_listener_handle = None
+        self.journal_batcher = None
+        # How many times a second the screen is updated with curtin's
+        # events and output.
+        self.ui_fps = float(os.environ.get('SUBIQUITY_UI_FPS', '10'))
         self._postinstall_prerequisites = {
             'install': False,
             'ssh': False,
@@ -220,6 +462,9 @@ class InstallProgressController(BaseController):
             'snap': False,
             }
         self._event_indent = ""
+        self._events_drained = None
+        self.install_profile = None
+        self.eta_estimator = None
         self._event_syslog_identifier = 'curtin_event.%s' % (os.getpid(),)
         self._log_syslog_identifier = 'curtin_log.%s' % (os.getpid(),)
         self.sm = None
@@ -247,6 +492,8 @@ class InstallProgressController(BaseController):
 
     def curtin_error(self, log_text=None):
         log.debug('curtin_error: %s', log_text)
+        self._log_journal_stats()
+        self.save_install_profile()
         self.install_state = InstallState.ERROR
         self.progress_view.spinner.stop()
         if log_text:
@@ -261,23 +508,42 @@ class InstallProgressController(BaseController):
                '--identifier=' + self._log_syslog_identifier] + cmd
         return utils.run_command(cmd, **kwargs)
 
-    def _journal_event(self, event):
-        if event['SYSLOG_IDENTIFIER'] == self._event_syslog_identifier:
-            self.curtin_event(event)
-        elif event['SYSLOG_IDENTIFIER'] == self._log_syslog_identifier:
-            self.curtin_log(event)
-
-    def _install_event_start(self, message):
+    def _journal_events(self, events):
+        lines = []
+        for event in events:
+            if event['SYSLOG_IDENTIFIER'] == self._event_syslog_identifier:
+                self.curtin_event(event)
+            elif event['SYSLOG_IDENTIFIER'] == self._log_syslog_identifier:
+                lines.append(event['MESSAGE'])
+        if lines:
+            self.progress_view.add_log_lines(lines)
+
+    def _log_journal_stats(self):
+        if self.journal_batcher is not None:
+            log.debug("curtin %s", self.journal_batcher.summary())
+
+    def _install_event_start(self, message, nest=True):
+        # Events that happen at the same time as each other are passed
+        # nest=False, so they are shown side by side rather than each
+        # inside the last.
         log.debug("_install_event_start %s", message)
         self.footer_description.set_text(message)
         self.progress_view.add_event(self._event_indent + message)
-        self._event_indent += "  "
+        if nest:
+            self._event_indent += "  "
         self.footer_spinner.start()
 
-    def _install_event_finish(self):
-        self._event_indent = self._event_indent[:-2]
+    def _install_event_finish(self, nest=True, stop_spinner=True):
+        if nest:
+            self._event_indent = self._event_indent[:-2]
         log.debug("_install_event_finish %r", self._event_indent)
-        self.footer_spinner.stop()
+        if stop_spinner:
+            self.footer_spinner.stop()
+        # This runs the next task, which may start the spinner again, so
+        # it has to come last.
+        if not self._event_indent and self._events_drained is not None:
+            drained, self._events_drained = self._events_drained, None
+            drained.set_result(None)
 
     def curtin_event(self, event):
         e = {}
@@ -288,27 +554,62 @@ class InstallProgressController(BaseController):
         event_type = event.get("CURTIN_EVENT_TYPE")
         if event_type not in ['start', 'finish']:
             return
+        self.install_profile.event(event)
         if event_type == 'start':
             self._install_event_start(event.get("CURTIN_MESSAGE", "??"))
         if event_type == 'finish':
             self._install_event_finish()
+        self._update_eta()
 
-    def curtin_log(self, event):
-        self.progress_view.add_log_line(event['MESSAGE'])
+    def _update_eta(self):
+        if self.eta_estimator is None:
+            return
+        left = self.eta_estimator.remaining(
+            self.install_profile, time.monotonic())
+        if left is None:
+            return
+        self.footer_eta.set_text(
+            _("about {minutes} min left").format(
+                minutes=max(1, round(left / 60))))
+
+    def _history_loaded(self, fut):
+        self.eta_estimator = ETAEstimator(fut.result())
+        self._update_eta()
+
+    def _profile_dir(self):
+        if self.opts.dry_run:
+            return '.subiquity'
+        else:
+            return '/var/log/installer'
+
+    def save_install_profile(self):
+        if self.install_profile is None:
+            return
+        path = os.path.join(self._profile_dir(), 'curtin-profile.json')
+        try:
+            self.install_profile.save(path)
+        except OSError:
+            log.exception("saving install profile failed")
 
     def start_journald_listener(self, identifiers, callback):
+        """Call callback with lists of entries logged with identifiers.
+
+        Returns the JournalBatcher that callback is called from.
+        """
         reader = journal.Reader()
         args = []
         for identifier in identifiers:
             args.append("SYSLOG_IDENTIFIER={}".format(identifier))
         reader.add_match(*args)
+        batcher = JournalBatcher(self.loop, callback, self.ui_fps)
 
         def watch():
             if reader.process() != journal.APPEND:
                 return
-            for event in reader:
-                callback(event)
-        return self.loop.watch_file(reader.fileno(), watch)
+            batcher.add(list(reader))
+        self.journal_listener_handle = self.loop.watch_file(
+            reader.fileno(), watch)
+        return batcher
 
     def _write_config(self, path, config):
         with open(path, 'w') as conf:
@@ -343,6 +644,8 @@ class InstallProgressController(BaseController):
         log.debug('Curtin Install: starting curtin')
         self.install_state = InstallState.RUNNING
         self.footer_description = urwid.Text(_("starting..."))
+        self.footer_eta = urwid.Text("")
+        from subiquity.ui.views.installprogress import ProgressView
         self.progress_view = ProgressView(self)
         self.footer_spinner = self.progress_view.spinner
 
@@ -350,22 +653,34 @@ class InstallProgressController(BaseController):
         self.ui.set_footer(urwid.Columns(
             [('pack', urwid.Text(_("Install in progress:"))),
              (self.footer_description),
+             ('pack', self.footer_eta),
              ('pack', self.footer_spinner)], dividechars=1))
 
-        self.journal_listener_handle = self.start_journald_listener(
+        # The time each of curtin's stages takes is recorded, and the
+        # times from earlier installs used to estimate how long is left.
+        self.install_profile = InstallProfile(machine_info())
+        history = [
+            os.path.join(
+                os.environ.get("SNAP", "."), "examples", "curtin-events.json"),
+            ]
+        self.run_in_bg(lambda: load_history(history), self._history_loaded)
+
+        self.journal_batcher = self.start_journald_listener(
             [self._event_syslog_identifier, self._log_syslog_identifier],
-            self._journal_event)
+            self._journal_events)
 
         curtin_cmd = self._get_curtin_command()
 
         log.debug('Curtin install cmd: {}'.format(curtin_cmd))
         self.run_in_bg(
             lambda: self._bg_run_command_logged(curtin_cmd),
-            self.curtin_install_completed)
+            self.curtin_install_completed,
+            lane='install')
 
     def curtin_install_completed(self, fut):
         cp = fut.result()
         log.debug('curtin_install completed: %s', cp.returncode)
+        self._log_journal_stats()
         if cp.returncode != 0:
             self.curtin_error()
             return
@@ -382,6 +697,10 @@ class InstallProgressController(BaseController):
     def cancel(self):
         pass
 
+    def stop(self):
+        if self.progress_view is not None:
+            self.progress_view.close()
+
     def start_postinstall_configuration(self):
         has_network = self.base_model.network.has_network
 
@@ -398,22 +717,44 @@ class InstallProgressController(BaseController):
         self.sm.run()
 
     @task
-    def _bg_drain_curtin_events(self):
-        waited = 0.0
-        while self._event_indent and waited < 5.0:
-            time.sleep(0.1)
-            waited += 0.1
-        log.debug("waited %s seconds for events to drain", waited)
+    def drain_curtin_events(self):
+        # curtin can exit before the journal listener has seen all the
+        # events it sent, so wait (for a while) for every event that has
+        # started to finish.
+        if self.journal_batcher is not None:
+            self.journal_batcher.flush()
+        if not self._event_indent:
+            return
+        drained = self._events_drained = Future()
+        start = time.monotonic()
+
+        def timed_out(loop, user_data):
+            if self._events_drained is drained:
+                log.debug("timed out waiting for events to drain")
+                self._events_drained = None
+                drained.set_result(None)
+
+        def done(fut):
+            self.loop.remove_alarm(handle)
+            log.debug(
+                "waited %.3f seconds for events to drain",
+                time.monotonic() - start)
+
+        handle = self.loop.set_alarm_in(5.0, timed_out)
+        drained.add_done_callback(done)
+        return drained
 
     @task
     def start_final_configuration(self):
+        # All of curtin's events have been seen by now.
+        self.save_install_profile()
         self._install_event_start("final system configuration")
 
-    @task(label="configuring cloud-init")
+    @task(label="configuring cloud-init", group='configure_target')
     def _bg_configure_cloud_init(self):
         self.base_model.configure_cloud_init()
 
-    @task(label="installing openssh")
+    @task(label="installing openssh", group='configure_target')
     def _bg_install_openssh(self):
         if self.opts.dry_run:
             cmd = ["sleep", str(2/self.scale_factor)]
@@ -425,7 +766,9 @@ class InstallProgressController(BaseController):
                 ]
         self._bg_run_command_logged(cmd, check=True)
 
-    @task(label="restoring apt configuration")
+    # openssh is installed using the installer's apt configuration.
+    @task(label="restoring apt configuration", group='configure_target',
+          after=('install_openssh',))
     def _bg_restore_apt_config(self):
         if self.opts.dry_run:
             cmds = [["sleep", str(1/self.scale_factor)]]
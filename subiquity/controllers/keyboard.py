@@ -18,7 +18,6 @@ import logging
 from subiquitycore.controller import BaseController
 
 from subiquity.models.keyboard import KeyboardSetting
-from subiquity.ui.views import KeyboardView
 
 log = logging.getLogger('subiquity.controllers.keyboard')
 
@@ -46,13 +45,43 @@ class KeyboardController(BaseController):
     def default(self):
         if self.model.current_lang is None:
             self.model.load_language('C')
-        view = KeyboardView(self.model, self, self.opts)
-        self.ui.set_body(view)
+        self.ui.set_body(self.take_view('keyboard', self._make_view))
         if 'layout' in self.answers:
             layout = self.answers['layout']
             variant = self.answers.get('variant', '')
             self.done(KeyboardSetting(layout=layout, variant=variant))
 
+    def prefetch_key(self):
+        if self.model.current_lang is None:
+            return None
+        return (self.model.current_lang, self.model.setting)
+
+    def prefetch(self):
+        self.prefetch_view('keyboard', self._make_view)
+
+    def _make_view(self):
+        from subiquity.ui.views.keyboard import KeyboardView
+        return KeyboardView(self.model, self, self.opts)
+
+    def apply_answers(self):
+        if 'layout' not in self.answers:
+            return False
+        if self.model.current_lang is None:
+            self.model.load_language('C')
+        layout = self.answers['layout']
+        variant = self.answers.get('variant', '')
+        if layout not in self.model.layouts:
+            raise Exception("unknown keyboard layout {!r}".format(layout))
+        if variant and variant not in self.model.variants[layout]:
+            raise Exception(
+                "unknown variant {!r} of keyboard layout {!r}".format(
+                    variant, layout))
+        setting = KeyboardSetting(layout=layout, variant=variant)
+        self.run_in_bg(
+            lambda: self.model.set_keyboard(setting),
+            lambda fut: fut.result())
+        return True
+
     def done(self, setting):
         self.run_in_bg(
             lambda: self.model.set_keyboard(setting),
@@ -19,7 +19,6 @@ import requests
 from xml.etree import ElementTree
 
 from subiquitycore.controller import BaseController
-from subiquity.ui.views.mirror import MirrorView
 
 log = logging.getLogger('subiquity.controllers.mirror')
 
@@ -49,7 +48,7 @@ class MirrorController(BaseController):
     def snapd_network_changed(self):
         if self.check_state != CheckState.DONE:
             self.check_state = CheckState.CHECKING
-            self.run_in_bg(self._bg_lookup, self.looked_up)
+            self.run_in_bg(self._bg_lookup, self.looked_up, lane='network')
 
     def _bg_lookup(self):
         return requests.get("https://geoip.ubuntu.com/lookup")
@@ -85,6 +84,7 @@ class MirrorController(BaseController):
 
     def default(self):
         self.check_state = CheckState.DONE
+        from subiquity.ui.views.mirror import MirrorView
         self.ui.set_body(MirrorView(self.model, self))
         if 'mirror' in self.answers:
             self.done(self.answers['mirror'])
@@ -92,6 +92,19 @@ class MirrorController(BaseController):
              or 'accept-default' in self.answers:
             self.done(self.model.mirror)
 
+    def apply_answers(self):
+        if 'mirror' in self.answers:
+            mirror = self.answers['mirror']
+        elif 'country-code' in self.answers \
+             or 'accept-default' in self.answers:
+            mirror = self.model.mirror
+        else:
+            return False
+        self.check_state = CheckState.DONE
+        if mirror != self.model.mirror:
+            self.model.mirror = mirror
+        return True
+
     def cancel(self):
         self.signal.emit_signal('prev-screen')
 
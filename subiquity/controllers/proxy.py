@@ -18,7 +18,6 @@ import os
 
 from subiquitycore.controller import BaseController
 
-from subiquity.ui.views.proxy import ProxyView
 
 log = logging.getLogger('subiquity.controllers.proxy')
 
@@ -31,6 +30,7 @@ class ProxyController(BaseController):
         self.answers = self.all_answers.get('Proxy', {})
 
     def default(self):
+        from subiquity.ui.views.proxy import ProxyView
         self.ui.set_body(ProxyView(self.model, self))
         if 'proxy' in self.answers:
             self.done(self.answers['proxy'])
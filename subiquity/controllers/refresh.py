@@ -13,16 +13,19 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import asyncio
 import enum
 import logging
 import os
-import time
 
 import requests.exceptions
 
+from subiquitycore.async_helpers import schedule_task
 from subiquitycore.controller import BaseController
 from subiquitycore.core import Skip
 
+from subiquity.snapd import AsyncSnapd
+
 log = logging.getLogger('subiquity.controllers.refresh')
 
 
@@ -63,31 +66,34 @@ class RefreshController(BaseController):
         self.view = None
         self.offered_first_time = False
         self.answers = self.all_answers.get("Refresh", {})
+        self.snapd = AsyncSnapd(self.snapd_connection, self.pool)
 
     def start(self):
         self.switch_state = SwitchState.SWITCHING
-        self.run_in_bg(self._bg_get_snap_details, self._got_snap_details)
-
-    def _bg_get_snap_details(self):
-        return self.snapd_connection.get(
-            'v2/snaps/{snap_name}'.format(snap_name=self.snap_name))
+        schedule_task(self.configure_snapd())
 
-    def _got_snap_details(self, fut):
+    async def configure_snapd(self):
         try:
-            response = fut.result()
-            response.raise_for_status()
+            r = await self.snapd.get(
+                'v2/snaps/{snap_name}'.format(snap_name=self.snap_name))
         except requests.exceptions.RequestException:
-            log.exception("_got_snap_details")
+            log.exception("getting snap details")
         else:
-            r = response.json()
             self.current_snap_version = r['result']['version']
             log.debug(
                 "current version of snap is: %r",
                 self.current_snap_version)
         channel = self.get_refresh_channel()
-        self.run_in_bg(
-            lambda: self._bg_switch_snap(channel),
-            self._snap_switched)
+        try:
+            success = await self.switch_snap(channel)
+        except Exception:
+            log.exception("switching snap")
+            return
+        log.debug("snap switching completed")
+        if not success:
+            return
+        self.switch_state = SwitchState.SWITCHED
+        self._maybe_check_for_update()
 
     def get_refresh_channel(self):
         """Return the channel we should refresh subiquity to."""
@@ -118,40 +124,26 @@ class RefreshController(BaseController):
         release = info.split()[1]
         return 'stable/ubuntu-' + release
 
-    def _bg_switch_snap(self, channel):
+    async def switch_snap(self, channel):
         log.debug("switching %s to %s", self.snap_name, channel)
         try:
-            response = self.snapd_connection.post(
+            response = await self.snapd.post(
                 'v2/snaps/{}'.format(self.snap_name),
                 {'action': 'switch', 'channel': channel})
-            response.raise_for_status()
         except requests.exceptions.RequestException:
             log.exception("switching")
             return
-        change = response.json()["change"]
+        change = response["change"]
         while True:
             try:
-                response = self.snapd_connection.get(
+                response = await self.snapd.get(
                     'v2/changes/{}'.format(change))
-                response.raise_for_status()
             except requests.exceptions.RequestException:
                 log.exception("checking switch")
                 return
-            if response.json()["result"]["status"] == "Done":
+            if response["result"]["status"] == "Done":
                 return True
-            time.sleep(0.1)
-
-    def _snap_switched(self, fut):
-        log.debug("snap switching completed")
-        try:
-            success = fut.result()
-        except Exception:
-            log.exception("_snap_switched")
-            return
-        if not success:
-            return
-        self.switch_state = SwitchState.SWITCHED
-        self._maybe_check_for_update()
+            await asyncio.sleep(0.1)
 
     def snapd_network_changed(self):
         self.network_state = "up"
@@ -171,27 +163,26 @@ class RefreshController(BaseController):
         if self.check_state.is_definite():
             return
         self.check_state = CheckState.CHECKING
-        self.run_in_bg(self._bg_check_for_update, self._check_result)
-
-    def _bg_check_for_update(self):
-        return self.snapd_connection.get('v2/find', select='refresh')
+        schedule_task(self.check_for_update())
 
-    def _check_result(self, fut):
+    async def check_for_update(self):
+        try:
+            result = await self.snapd.get('v2/find', select='refresh')
+        except requests.exceptions.RequestException as e:
+            error = e
+        else:
+            error = None
         # If we managed to send concurrent requests and one has
         # already provided an answer, just forget all about the other
         # one!
         if self.check_state.is_definite():
             return
-        try:
-            response = fut.result()
-            response.raise_for_status()
-        except requests.exceptions.RequestException as e:
-            log.exception("checking for update")
-            self.check_error = e
+        if error is not None:
+            log.error("checking for update failed: %s", error)
+            self.check_error = error
             self.check_state = CheckState.FAILED
         else:
-            result = response.json()
-            log.debug("_check_result %s", result)
+            log.debug("check_for_update %s", result)
             for snap in result["result"]:
                 if snap["name"] == self.snap_name:
                     self.check_state = CheckState.AVAILABLE
@@ -205,49 +196,44 @@ class RefreshController(BaseController):
         if self.view:
             self.view.update_check_state()
 
-    def start_update(self, callback):
+    async def start_update(self):
+        """Ask snapd to refresh the snap, returning the id of the change.
+
+        Returns None if the request fails.
+        """
         update_marker = os.path.join(self.application.state_dir, 'updating')
         open(update_marker, 'w').close()
-        self.run_in_bg(
-            self._bg_start_update,
-            lambda fut: self.update_started(fut, callback))
-
-    def _bg_start_update(self):
-        return self.snapd_connection.post(
-            'v2/snaps/{}'.format(self.snap_name), {'action': 'refresh'})
-
-    def update_started(self, fut, callback):
+        # snapd restarts us as part of the refresh, so the state has to
+        # be written out first.
+        await self.run_in_thread(self.application.journal.flush)
+        try:
+            snapshot = self.base_model.snapshot()
+            await self.run_in_thread(
+                lambda: self.application.save_snapshot(snapshot))
+        except Exception:
+            # The new version will just have to probe again.
+            log.exception("writing model snapshot failed")
         try:
-            response = fut.result()
-            response.raise_for_status()
+            result = await self.snapd.post(
+                'v2/snaps/{}'.format(self.snap_name), {'action': 'refresh'})
         except requests.exceptions.RequestException as e:
             log.exception("requesting update")
             self.update_state = CheckState.FAILED
             self.update_failure = e
-            return
-        result = response.json()
+            return None
         log.debug("%s", result)
-        callback(result['change'])
-
-    def get_progress(self, change, callback):
-        self.run_in_bg(
-            lambda: self._bg_get_progress(change),
-            lambda fut: self.got_progress(fut, callback))
+        return result['change']
 
-    def _bg_get_progress(self, change):
-        return self.snapd_connection.get('v2/changes/{}'.format(change))
-
-    def got_progress(self, fut, callback):
+    async def get_progress(self, change):
+        """Return snapd's view of the change, or None if that fails."""
         try:
-            response = fut.result()
-            response.raise_for_status()
+            result = await self.snapd.get('v2/changes/{}'.format(change))
         except requests.exceptions.RequestException as e:
             log.exception("checking for progress")
             self.update_state = CheckState.FAILED
             self.update_failure = e
-            return
-        result = response.json()
-        callback(result['result'])
+            return None
+        return result['result']
 
     def default(self, index=1):
         from subiquity.ui.views.refresh import RefreshView
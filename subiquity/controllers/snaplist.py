@@ -17,115 +17,87 @@ import logging
 
 import requests.exceptions
 
+from subiquitycore.async_helpers import schedule_task
 from subiquitycore.controller import BaseController
 from subiquitycore.core import Skip
 
 from subiquity.models.snaplist import SnapSelection
-from subiquity.ui.views.snaplist import SnapListView
+from subiquity.snapd import AsyncSnapd
 
 log = logging.getLogger('subiquity.controllers.snaplist')
 
 
 class SnapdSnapInfoLoader:
 
-    def __init__(self, model, run_in_bg, connection, store_section):
+    def __init__(self, model, snapd, store_section):
         self.model = model
-        self.run_in_bg = run_in_bg
+        self.snapd = snapd
         self.store_section = store_section
 
-        self._running = False
+        self.main_task = None
         self.snap_list_fetched = False
         self.failed = False
 
-        self.connection = connection
-        self.pending_info_snaps = []
-        self.ongoing = {}  # {snap:[callbacks]}
+        self.pending_snaps = []
+        self.tasks = {}  # {snap:task}, with None for the list of snaps
 
     def start(self):
-        self._running = True
         log.debug("loading list of snaps")
-
-        def cb(snap_list):
-            if not self._running:
-                return
-            self.snap_list_fetched = True
-            self.pending_info_snaps = snap_list
-            log.debug("fetched list of %s snaps", len(self.pending_info_snaps))
-            self._fetch_next_info()
-        self.ongoing[None] = [cb]
-        self.run_in_bg(self._bg_fetch_list, self._fetched_list)
+        self.tasks[None] = schedule_task(self._load_list())
+        self.main_task = schedule_task(self._start())
+
+    async def _start(self):
+        await self.tasks[None]
+        self.pending_snaps = self.model.get_snap_list()
+        log.debug("fetched list of %s snaps", len(self.pending_snaps))
+        while self.pending_snaps:
+            snap = self.pending_snaps.pop(0)
+            task = self.tasks[snap] = schedule_task(
+                self._fetch_info_for_snap(snap))
+            await task
 
     def stop(self):
-        self._running = False
-
-    def _bg_fetch_list(self):
-        return self.connection.get('v2/find', section=self.store_section)
+        if self.main_task is not None:
+            self.main_task.cancel()
+        for task in self.tasks.values():
+            task.cancel()
 
-    def _fetched_list(self, fut):
-        if not self._running:
-            return
+    async def _load_list(self):
         try:
-            response = fut.result()
-            response.raise_for_status()
+            data = await self.snapd.get(
+                'v2/find', section=self.store_section)
         except requests.exceptions.RequestException:
             log.exception("loading list of snaps failed")
             self.failed = True
-            self._running = False
-        else:
-            self.model.load_find_data(response.json())
-        for cb in self.ongoing.pop(None):
-            cb(self.model.get_snap_list())
-
-    def get_snap_list(self, callback):
-        if self.snap_list_fetched:
-            callback(self.model.get_snap_list())
-        elif None in self.ongoing:
-            self.ongoing[None].append(callback)
-        else:
-            self.start()
-            self.ongoing[None].append(callback)
-
-    def get_snap_info(self, snap, callback):
-        if len(snap.channels) > 0:
-            callback()
-            return
-        if snap in self.ongoing:
-            self.ongoing[snap].append(callback)
             return
-        if snap in self.pending_info_snaps:
-            self.pending_info_snaps.remove(snap)
-        self._fetch_info_for_snap(snap, callback)
+        self.model.load_find_data(data)
+        self.snap_list_fetched = True
 
-    def _fetch_info_for_snap(self, snap, callback):
-        self.ongoing[snap] = [callback]
+    def get_snap_list_task(self):
+        task = self.tasks.get(None)
+        # Start again if the last attempt failed.
+        if task is None or (task.done() and not self.snap_list_fetched):
+            self.start()
+        return self.tasks[None]
+
+    def get_snap_info_task(self, snap):
+        task = self.tasks.get(snap)
+        if task is None or (task.done() and len(snap.channels) == 0):
+            if snap in self.pending_snaps:
+                self.pending_snaps.remove(snap)
+            task = self.tasks[snap] = schedule_task(
+                self._fetch_info_for_snap(snap))
+        return task
+
+    async def _fetch_info_for_snap(self, snap):
         log.debug('starting fetch for %s', snap.name)
-        self.run_in_bg(
-            lambda: self._bg_fetch_next_info(snap),
-            lambda fut: self._fetched_info(snap, fut))
-
-    def _fetch_next_info(self):
-        if not self.pending_info_snaps:
-            return
-        snap = self.pending_info_snaps.pop(0)
-        self._fetch_info_for_snap(snap, self._fetch_next_info)
-
-    def _bg_fetch_next_info(self, snap):
-        return self.connection.get('v2/find', name=snap.name)
-
-    def _fetched_info(self, snap, fut):
-        if not self._running:
-            return
         try:
-            response = fut.result()
-            response.raise_for_status()
+            data = await self.snapd.get('v2/find', name=snap.name)
         except requests.exceptions.RequestException:
             log.exception("loading snap info failed")
             # XXX something better here?
-        else:
-            data = response.json()
-            self.model.load_info_data(data)
-        for cb in self.ongoing.pop(snap):
-            cb()
+            return
+        self.model.load_info_data(data)
 
 
 class SnapListController(BaseController):
@@ -136,12 +108,12 @@ class SnapListController(BaseController):
 
     def _make_loader(self):
         return SnapdSnapInfoLoader(
-            self.model, self.run_in_bg, self.snapd_connection,
-            self.opts.snap_section)
+            self.model, self.snapd, self.opts.snap_section)
 
     def __init__(self, common):
         super().__init__(common)
         self.model = self.base_model.snaplist
+        self.snapd = AsyncSnapd(self.snapd_connection, self.pool)
         self.loader = self._make_loader()
         self.answers = self.all_answers.get('SnapList', {})
 
@@ -167,13 +139,14 @@ class SnapListController(BaseController):
                 to_install[snap_name] = SnapSelection(**selection)
             self.done(to_install)
             return
+        from subiquity.ui.views.snaplist import SnapListView
         self.ui.set_body(SnapListView(self.model, self))
 
-    def get_snap_list(self, callback):
-        self.loader.get_snap_list(callback)
+    def get_snap_list_task(self):
+        return self.loader.get_snap_list_task()
 
-    def get_snap_info(self, snap, callback):
-        self.loader.get_snap_info(snap, callback)
+    def get_snap_info_task(self, snap):
+        return self.loader.get_snap_info_task(snap)
 
     def done(self, snaps_to_install):
         log.debug(
@@ -18,7 +18,6 @@ import logging
 from subiquitycore.controller import BaseController
 from subiquitycore import utils
 
-from subiquity.ui.views.ssh import SSHView
 
 log = logging.getLogger('subiquity.controllers.ssh')
 
@@ -36,22 +35,57 @@ class SSHController(BaseController):
         self.model = self.base_model.ssh
         self.answers = self.all_answers.get('SSH', {})
 
+    def _answers_result(self):
+        return {
+            "install_server": self.answers.get("install_server", False),
+            "authorized_keys": self.answers.get("authorized_keys", []),
+            "pwauth": self.answers.get("pwauth", True),
+        }
+
     def default(self):
+        from subiquity.ui.views.ssh import SSHView
         self.ui.set_body(SSHView(self.model, self))
         if self.answers:
+            self.done(self._answers_result())
+        elif 'ssh-import-id' in self.all_answers.get('Identity', {}):
+            import_id = self.all_answers['Identity']['ssh-import-id']
             d = {
-                "install_server": self.answers.get("install_server", False),
-                "authorized_keys": self.answers.get("authorized_keys", []),
-                "pwauth": self.answers.get("pwauth", True),
+                "install_server": True,
+                "pwauth": True,
             }
-            self.done(d)
+            self.fetch_ssh_keys(d, import_id)
+
+    def apply_answers(self):
+        if self.answers:
+            self._apply(self._answers_result())
+            return True
         elif 'ssh-import-id' in self.all_answers.get('Identity', {}):
             import_id = self.all_answers['Identity']['ssh-import-id']
             d = {
                 "install_server": True,
                 "pwauth": True,
             }
-            self.fetch_ssh_keys(d, import_id)
+            # Nothing waits for the keys except the install itself, so
+            # fetch them in the background and move on.
+            self._fetching_proc = utils.start_command(
+                ['ssh-import-id', '-o-', import_id])
+            self.run_in_bg(
+                lambda: self._bg_fetch_ssh_keys(
+                    d, self._fetching_proc, import_id),
+                self._fetched_ssh_keys_headless,
+                lane='network')
+            return True
+        return False
+
+    def _fetched_ssh_keys_headless(self, fut):
+        # There is no one to show a failure to, so let it crash the
+        # install like any other error in an unattended install.
+        result = fut.result()
+        if isinstance(result, FetchSSHKeysFailure):
+            raise result
+        user_spec, ssh_import_id, key_material, fingerprints = result
+        user_spec['authorized_keys'] = key_material.splitlines()
+        self._apply(user_spec)
 
     def cancel(self):
         self.signal.emit_signal('prev-screen')
@@ -89,6 +123,7 @@ class SSHController(BaseController):
         return user_spec, ssh_import_id, key_material, fingerprints
 
     def _fetched_ssh_keys(self, fut):
+        from subiquity.ui.views.ssh import SSHView
         if not isinstance(self.ui.frame.body, SSHView):
             # This can happen if curtin failed while the keys where being
             # fetched and we jump to the log view.
@@ -123,13 +158,17 @@ class SSHController(BaseController):
         self.run_in_bg(
             lambda: self._bg_fetch_ssh_keys(user_spec, self._fetching_proc,
                                             ssh_import_id),
-            self._fetched_ssh_keys)
+            self._fetched_ssh_keys,
+            lane='network')
 
     def done(self, result):
         log.debug("SSHController.done next-screen result=%s", result)
+        self._apply(result)
+        self.signal.emit_signal('next-screen')
+
+    def _apply(self, result):
         self.model.install_server = result['install_server']
         self.model.authorized_keys = result.get('authorized_keys', [])
         self.model.pwauth = result.get('pwauth', True)
         self.model.ssh_import_id = result.get('ssh_import_id', None)
         self.signal.emit_signal('installprogress:ssh-config-done')
-        self.signal.emit_signal('next-screen')
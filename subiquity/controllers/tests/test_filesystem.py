@@ -15,9 +15,11 @@
 
 from collections import defaultdict
 import unittest
+from unittest import mock
 
 from subiquity.controllers.filesystem import (
     FilesystemController,
+    ProbeState,
     )
 from subiquity.models.tests.test_filesystem import (
     make_disk,
@@ -27,6 +29,7 @@ from subiquity.models.filesystem import (
     Bootloader,
     DeviceAction,
     )
+from subiquity.models.planner import GuidedPlanner
 
 
 class Thing:
@@ -34,12 +37,15 @@ class Thing:
     pass
 
 
-def make_controller(bootloader=None):
+def make_controller(bootloader=None, answers=None):
     common = defaultdict(type(None))
     bm = Thing()
     bm.filesystem = make_model(bootloader)
     common['base_model'] = bm
     common['answers'] = {}
+    if answers is not None:
+        common['answers']['Filesystem'] = answers
+    common['signal'] = mock.Mock()
     opts = Thing()
     opts.dry_run = True
     opts.bootloader = None
@@ -239,3 +245,119 @@ class TestFilesystemController(unittest.TestCase):
             disk1, disk1p2, {'fstype': 'ext4', 'mount': '/'})
         efi_mnt = controller.model._mount_for_path("/boot/efi")
         self.assertEqual(efi_mnt.device.volume, disk1p1)
+
+    def test_guided_raid1_layout(self):
+        controller = make_controller(Bootloader.UEFI)
+        disk1 = make_disk(controller.model)
+        disk2 = make_disk(controller.model)
+        plan = GuidedPlanner(controller.model).multi_disk_plan("direct")
+        controller.guided_multi_disk_layout(plan)
+        [raid] = controller.model.all_raids()
+        self.assertEqual(raid.raidlevel, "raid1")
+        self.assertEqual(
+            {p.device for p in raid.devices}, {disk1, disk2})
+        self.assertEqual(raid.fs().mount().path, "/")
+        self.assertTrue(controller.model.can_install())
+
+    def test_guided_multi_disk_lvm_layout(self):
+        controller = make_controller(Bootloader.BIOS)
+        disks = [make_disk(controller.model) for i in range(3)]
+        plan = GuidedPlanner(controller.model).multi_disk_plan("lvm")
+        controller.guided_multi_disk_layout(plan)
+        [vg] = controller.model.all_volgroups()
+        self.assertEqual({p.device for p in vg.devices}, set(disks))
+        self.assertTrue(controller.model.is_root_mounted())
+        self.assertTrue(controller.model.can_install())
+        self.assertEqual(controller.model.grub_install_device, plan.disks[0])
+
+
+class TestFilesystemAnswers(unittest.TestCase):
+
+    def make_probed_controller(self, answers):
+        controller = make_controller(Bootloader.UEFI, answers)
+        controller._probe_state = ProbeState.DONE
+        return controller
+
+    def test_apply_guided_direct(self):
+        controller = self.make_probed_controller(
+            {'guided': True, 'guided-index': 'best'})
+        make_disk(controller.model)
+        self.assertTrue(controller.apply_answers())
+        self.assertTrue(controller.model.can_install())
+        controller.signal.emit_signal.assert_called_once_with(
+            'installprogress:filesystem-config-done')
+
+    def test_apply_guided_lvm(self):
+        controller = self.make_probed_controller(
+            {'guided': True, 'guided-method': 'lvm'})
+        disk = make_disk(controller.model)
+        self.assertTrue(controller.apply_answers())
+        self.assertEqual(
+            [p.fs().fstype for p in disk.partitions()[:2]],
+            ['fat32', 'ext4'])
+        [vg] = controller.model.all_volgroups()
+        self.assertEqual(vg.name, 'ubuntu-vg')
+        self.assertTrue(controller.model.is_root_mounted())
+
+    def test_manual_answers_need_ui(self):
+        controller = self.make_probed_controller(
+            {'manual': [{'action': 'done'}]})
+        make_disk(controller.model)
+        self.assertFalse(controller.apply_answers())
+        controller = self.make_probed_controller({'guided': True})
+        controller._probe_state = ProbeState.PROBING
+        self.assertFalse(controller.apply_answers())
+        controller.signal.emit_signal.assert_not_called()
+
+
+class TestFilesystemPrefetch(unittest.TestCase):
+
+    def make_probed_controller(self):
+        controller = make_controller(Bootloader.NONE)
+        controller._probe_state = ProbeState.DONE
+        return controller
+
+    def test_prefetched_view_used(self):
+        controller = self.make_probed_controller()
+        view = object()
+        controller.prefetch_view('manual', lambda: view)
+        self.assertIs(controller.take_view('manual', object), view)
+        # A view is only handed out once.
+        self.assertIsNot(controller.take_view('manual', object), view)
+
+    def test_stale_view_discarded(self):
+        controller = self.make_probed_controller()
+        view = object()
+        controller.prefetch_view('manual', lambda: view)
+        make_disk(controller.model)
+        self.assertIsNot(controller.take_view('manual', object), view)
+
+    def test_no_prefetch_before_probe(self):
+        controller = make_controller(Bootloader.NONE)
+        controller._probe_state = ProbeState.PROBING
+        make_view = mock.Mock()
+        controller.prefetch_view('manual', make_view)
+        make_view.assert_not_called()
+
+    def show_guided(self, answers=None):
+        controller = make_controller(Bootloader.NONE, answers)
+        controller._probe_state = ProbeState.DONE
+        controller.loop = mock.Mock()
+        controller.ui = mock.Mock()
+        controller.take_view = mock.Mock()
+        controller._run_iterator = mock.Mock()
+        controller.default()
+        return controller
+
+    def test_manual_view_prefetched_when_shown(self):
+        controller = self.show_guided()
+        controller.loop.set_alarm_in.assert_called_once_with(
+            0.1, controller._prefetch_manual)
+        controller.manual()
+        controller.loop.remove_alarm.assert_called_once_with(
+            controller.loop.set_alarm_in.return_value)
+
+    def test_no_manual_prefetch_when_answered(self):
+        controller = self.show_guided({'manual': [{'action': 'done'}]})
+        controller.loop.set_alarm_in.assert_not_called()
+        controller.loop.remove_alarm.assert_not_called()
@@ -0,0 +1,62 @@
+# Copyright 2019 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from collections import defaultdict
+import unittest
+from unittest import mock
+
+from subiquity.controllers.identity import IdentityController
+
+
+valid_answers = {
+    'realname': 'Real Name',
+    'hostname': 'host-name',
+    'username': 'username',
+    'password': '<crypted>',
+    }
+
+
+def make_controller(answers):
+    common = defaultdict(type(None))
+    common['base_model'] = mock.Mock()
+    common['answers'] = {'Identity': answers}
+    common['signal'] = mock.Mock()
+    return IdentityController(common)
+
+
+class TestApplyAnswers(unittest.TestCase):
+
+    def test_valid(self):
+        controller = make_controller(valid_answers)
+        self.assertTrue(controller.apply_answers())
+        controller.model.add_user.assert_called_once_with(valid_answers)
+
+    def test_incomplete(self):
+        answers = valid_answers.copy()
+        del answers['password']
+        controller = make_controller(answers)
+        self.assertFalse(controller.apply_answers())
+        controller.model.add_user.assert_not_called()
+
+    def test_reserved_username(self):
+        controller = make_controller(dict(valid_answers, username='root'))
+        with self.assertRaisesRegex(Exception, "reserved"):
+            controller.apply_answers()
+        controller.model.add_user.assert_not_called()
+
+    def test_realname_too_long(self):
+        controller = make_controller(dict(valid_answers, realname='x' * 200))
+        with self.assertRaisesRegex(Exception, "realname"):
+            controller.apply_answers()
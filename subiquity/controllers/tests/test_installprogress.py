@@ -0,0 +1,345 @@
+# Copyright 2019 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from collections import defaultdict
+from concurrent.futures import Future
+import datetime
+import unittest
+from unittest import mock
+
+from subiquity.controllers.installprogress import (
+    collect_tasks,
+    InstallProgressController,
+    JournalBatcher,
+    StateMachine,
+    task,
+    TaskGroup,
+    )
+from subiquity.install_profile import InstallProfile
+
+
+class FakeLoop:
+    # Only fires alarms when asked to.
+    def __init__(self):
+        self.alarms = []
+
+    def set_alarm_in(self, secs, callback):
+        handle = (secs, callback)
+        self.alarms.append(handle)
+        return handle
+
+    def remove_alarm(self, handle):
+        if handle in self.alarms:
+            self.alarms.remove(handle)
+
+    def fire_alarms(self):
+        alarms, self.alarms = self.alarms, []
+        for secs, callback in alarms:
+            callback(self, None)
+
+
+def entry(message):
+    return {
+        'MESSAGE': message,
+        '__REALTIME_TIMESTAMP': datetime.datetime.now(),
+        }
+
+
+class TestJournalBatcher(unittest.TestCase):
+
+    def make_batcher(self, fps=10):
+        self.loop = FakeLoop()
+        self.batches = []
+        return JournalBatcher(self.loop, self.batches.append, fps)
+
+    def messages(self):
+        return [[e['MESSAGE'] for e in batch] for batch in self.batches]
+
+    def test_first_batch_immediate(self):
+        batcher = self.make_batcher()
+        batcher.add([entry('a'), entry('b')])
+        self.assertEqual(self.messages(), [['a', 'b']])
+        self.assertEqual(self.loop.alarms, [])
+
+    def test_throttled(self):
+        batcher = self.make_batcher()
+        batcher.add([entry('a')])
+        batcher.add([entry('b')])
+        batcher.add([entry('c'), entry('d')])
+        self.assertEqual(self.messages(), [['a']])
+        self.assertEqual(len(self.loop.alarms), 1)
+        self.loop.fire_alarms()
+        self.assertEqual(self.messages(), [['a'], ['b', 'c', 'd']])
+        self.assertEqual((batcher.entries, batcher.batches), (4, 2))
+
+    def test_flush(self):
+        batcher = self.make_batcher()
+        batcher.add([entry('a')])
+        batcher.add([entry('b')])
+        batcher.flush()
+        self.assertEqual(self.messages(), [['a'], ['b']])
+        self.assertEqual(self.loop.alarms, [])
+        batcher.add([])
+        self.assertEqual(len(self.batches), 2)
+
+    def test_unthrottled(self):
+        batcher = self.make_batcher(fps=0)
+        batcher.add([entry('a')])
+        batcher.add([entry('b')])
+        self.assertEqual(self.messages(), [['a'], ['b']])
+
+    def test_summary(self):
+        batcher = self.make_batcher()
+        batcher.add([entry('a'), {'MESSAGE': 'no timestamp'}])
+        self.assertIn("2 journal entries in 1 batches", batcher.summary())
+
+
+class Tasks:
+    # Stands in for the controller: records what has run and holds on
+    # to background tasks until the test finishes them.
+
+    def __init__(self):
+        self.log = []
+        self.bg = {}
+        self.errors = []
+
+    def run_in_bg(self, func, callback, lane='default'):
+        self.bg[func._name] = (func, callback)
+
+    def finish(self, name):
+        func, callback = self.bg.pop(name)
+        fut = Future()
+        try:
+            fut.set_result(func())
+        except Exception as e:
+            fut.set_exception(e)
+        callback(fut)
+
+    def _install_event_start(self, message, nest=True):
+        self.log.append(('start', message, nest))
+
+    def _install_event_finish(self, nest=True, stop_spinner=True):
+        self.log.append(('finish', nest, stop_spinner))
+
+    def curtin_error(self, log_text=None):
+        self.errors.append(log_text)
+
+    @task
+    def first(self):
+        self.log.append('first')
+
+    @task(group='g', label="a")
+    def _bg_a(self):
+        self.log.append('a')
+
+    @task(group='g', label="b")
+    def _bg_b(self):
+        self.log.append('b')
+
+    @task(group='g', after=('b',))
+    def _bg_c(self):
+        self.log.append('c')
+
+    @task
+    def last(self):
+        self.log.append('last')
+
+
+class FailingTasks(Tasks):
+
+    @task
+    def first(self):
+        pass
+
+    @task(group='g')
+    def _bg_a(self):
+        raise Exception("a failed")
+
+    @task(group='g')
+    def _bg_b(self):
+        self.log.append('b')
+
+    @task(group='g', after=('a',))
+    def _bg_c(self):
+        self.log.append('c')
+
+
+class TestTaskGroups(unittest.TestCase):
+
+    def test_collect_tasks(self):
+        tasks = collect_tasks(Tasks())
+        self.assertEqual(
+            [(func._name, transitions) for func, transitions in tasks],
+            [
+                ('first', {'success': 'g'}),
+                ('g', {'success': 'last'}),
+                ('last', {}),
+            ])
+        group = tasks[1][0]
+        self.assertIsInstance(group, TaskGroup)
+        self.assertEqual([f._name for f in group.tasks], ['a', 'b', 'c'])
+
+    def test_filtered_dependency_ignored(self):
+        tasks = collect_tasks(Tasks(), lambda f: f._name != 'b')
+        group = tasks[1][0]
+        self.assertEqual(group.deps(group.tasks[1]), set())
+
+    def test_dependency_must_come_first(self):
+        inst = Tasks()
+        funcs = [inst._bg_c, inst._bg_b]
+        with self.assertRaises(Exception):
+            TaskGroup('g', funcs)
+
+    def test_group_runs_concurrently(self):
+        inst = Tasks()
+        sm = StateMachine(inst, collect_tasks(inst))
+        sm.run()
+        self.assertEqual(set(inst.bg), {'a', 'b'})
+        self.assertEqual(
+            inst.log,
+            ['first', ('start', "a", False), ('start', "b", False)])
+        inst.finish('b')
+        self.assertEqual(set(inst.bg), {'a', 'c'})
+        self.assertEqual(inst.log[-1], ('finish', False, False))
+        inst.finish('c')
+        self.assertNotIn('last', inst.log)
+        inst.finish('a')
+        self.assertEqual(inst.log[-2:], [('finish', False, True), 'last'])
+        self.assertEqual(inst.errors, [])
+
+    def test_group_failure(self):
+        inst = FailingTasks()
+        sm = StateMachine(inst, collect_tasks(inst))
+        sm.run()
+        inst.finish('a')
+        self.assertEqual(set(inst.bg), {'b'})
+        self.assertEqual(inst.errors, [])
+        inst.finish('b')
+        self.assertEqual(inst.bg, {})
+        self.assertEqual(len(inst.errors), 1)
+        self.assertIn("a failed", inst.errors[0])
+        self.assertNotIn('c', inst.log)
+
+
+def make_controller():
+    common = defaultdict(type(None))
+    common['answers'] = {}
+    common['loop'] = FakeLoop()
+    controller = InstallProgressController(common)
+    controller.progress_view = mock.Mock()
+    controller.footer_spinner = mock.Mock()
+    controller.footer_description = mock.Mock()
+    controller.footer_eta = mock.Mock()
+    controller.install_profile = InstallProfile()
+    return controller
+
+
+class TestDrainCurtinEvents(unittest.TestCase):
+
+    def test_nothing_to_drain(self):
+        controller = make_controller()
+        self.assertIsNone(controller.drain_curtin_events())
+        self.assertEqual(controller.loop.alarms, [])
+
+    def test_drained_by_finish(self):
+        controller = make_controller()
+        controller._install_event_start("a")
+        controller._install_event_start("b")
+        fut = controller.drain_curtin_events()
+        controller._install_event_finish()
+        self.assertFalse(fut.done())
+        controller._install_event_finish()
+        self.assertTrue(fut.done())
+        self.assertEqual(controller.loop.alarms, [])
+
+    def test_timeout(self):
+        controller = make_controller()
+        controller._install_event_start("a")
+        fut = controller.drain_curtin_events()
+        controller.loop.fire_alarms()
+        self.assertTrue(fut.done())
+        controller._install_event_finish()
+
+    def test_state_machine_waits(self):
+        controller = make_controller()
+        controller._install_event_start("a")
+        inst = Tasks()
+        sm = StateMachine(inst, [
+            (controller.drain_curtin_events, {'success': 'last'}),
+            (inst.last, {}),
+            ])
+        sm.run()
+        self.assertEqual(inst.log, [])
+        controller._install_event_finish()
+        self.assertEqual(inst.log, ['last'])
+
+    def test_next_task_spinner_keeps_running(self):
+        controller = make_controller()
+        controller._install_event_start("a")
+
+        class Next:
+            @task
+            def start_next(self):
+                controller._install_event_start("next")
+
+        inst = Next()
+        sm = StateMachine(controller, [
+            (controller.drain_curtin_events, {'success': 'start_next'}),
+            (inst.start_next, {}),
+            ])
+        sm.run()
+        controller._install_event_finish()
+        self.assertEqual(
+            controller.footer_spinner.method_calls[-1], mock.call.start())
+
+
+class TestInstallProfiling(unittest.TestCase):
+
+    def test_curtin_events_recorded(self):
+        controller = make_controller()
+        for event_type in 'start', 'finish':
+            controller.curtin_event({
+                'CURTIN_EVENT_TYPE': event_type,
+                'CURTIN_NAME': 'cmd-install/stage-extract',
+                'CURTIN_MESSAGE': 'writing install sources to disk',
+                '__MONOTONIC_TIMESTAMP': '0',
+                })
+        stage = controller.install_profile.top_stages()[0]
+        self.assertEqual(stage['duration'], 0)
+        controller.footer_eta.set_text.assert_not_called()
+
+    def test_eta_shown(self):
+        controller = make_controller()
+        history = InstallProfile()
+        history.start('cmd-install/stage-extract', 'x', 0)
+        history.finish('cmd-install/stage-extract', 'x', 'SUCCESS', 600)
+        fut = Future()
+        fut.set_result([history])
+        controller._history_loaded(fut)
+        controller.footer_eta.set_text.assert_called_once_with(
+            "about 10 min left")
+
+
+class TestStop(unittest.TestCase):
+
+    def test_stop_closes_view(self):
+        controller = make_controller()
+        controller.stop()
+        controller.progress_view.close.assert_called_once_with()
+
+    def test_stop_before_install(self):
+        controller = make_controller()
+        controller.progress_view = None
+        controller.stop()
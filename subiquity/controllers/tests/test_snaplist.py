@@ -0,0 +1,65 @@
+# Copyright 2019 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import os
+import unittest
+
+from subiquitycore.executor import LanedExecutor
+
+from subiquity.controllers.snaplist import SnapdSnapInfoLoader
+from subiquity.models.snaplist import SnapListModel
+from subiquity.snapd import AsyncSnapd, FakeSnapdConnection
+
+
+snap_data_dir = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))),
+    "examples", "snaps")
+
+
+class TestSnapdSnapInfoLoader(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.model = SnapListModel()
+        snapd = AsyncSnapd(
+            FakeSnapdConnection(snap_data_dir), LanedExecutor(2))
+        self.loader = SnapdSnapInfoLoader(self.model, snapd, 'server')
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def test_loads_list_then_info(self):
+        self.loader.start()
+        self.loop.run_until_complete(self.loader.get_snap_list_task())
+        self.assertTrue(self.loader.snap_list_fetched)
+        snaps = self.model.get_snap_list()
+        self.assertNotEqual(snaps, [])
+        self.loop.run_until_complete(self.loader.main_task)
+        for snap in snaps:
+            self.assertNotEqual(snap.channels, [], snap.name)
+
+    def test_info_requested_before_its_turn(self):
+        self.loop.run_until_complete(self.loader.get_snap_list_task())
+        snap = self.model.get_snap_list()[-1]
+        task = self.loader.get_snap_info_task(snap)
+        self.assertNotIn(snap, self.loader.pending_snaps)
+        self.loop.run_until_complete(task)
+        self.assertNotEqual(snap.channels, [])
+        self.assertIs(self.loader.get_snap_info_task(snap), task)
+        self.loop.run_until_complete(self.loader.main_task)
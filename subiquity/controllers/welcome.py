@@ -18,8 +18,6 @@ import os
 
 from subiquitycore.controller import BaseController
 
-from subiquity.ui.views import WelcomeView
-
 
 log = logging.getLogger('subiquity.controllers.welcome')
 
@@ -41,6 +39,7 @@ class WelcomeController(BaseController):
                 self.model.switch_language(code)
 
     def default(self):
+        from subiquity.ui.views.welcome import WelcomeView
         view = WelcomeView(self.model, self)
         self.ui.set_body(view)
         if 'lang' in self.answers:
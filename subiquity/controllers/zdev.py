@@ -24,7 +24,6 @@ from urwid import Text
 from subiquitycore.controller import BaseController
 from subiquitycore.ui.utils import Color
 from subiquitycore.utils import run_command
-from subiquity.ui.views import ZdevView
 
 
 log = logging.getLogger("subiquitycore.controller.zdev")
@@ -644,6 +643,7 @@ class ZdevController(BaseController):
     def default(self):
         if 'accept-default' in self.answers:
             self.done()
+        from subiquity.ui.views.zdev import ZdevView
         self.ui.set_body(ZdevView(self))
 
     def cancel(self):
@@ -16,10 +16,15 @@
 import logging
 import os
 import platform
+import time
 
 from subiquitycore.core import Application
 
-from subiquity.models.subiquity import SubiquityModel
+from subiquity.models.subiquity import (
+    read_snapshot,
+    SubiquityModel,
+    write_snapshot,
+    )
 from subiquity.snapd import (
     FakeSnapdConnection,
     SnapdConnection,
@@ -41,7 +46,23 @@ class Subiquity(Application):
         root = '/'
         if common['opts'].dry_run:
             root = os.path.abspath('.subiquity')
-        return SubiquityModel(root, common['opts'].sources)
+        model = SubiquityModel(root, common['opts'].sources)
+        if common['updated']:
+            start = time.monotonic()
+            snapshot = read_snapshot(self.snapshot_path)
+            if snapshot is not None:
+                try:
+                    model.restore_snapshot(snapshot)
+                except Exception:
+                    # The model may be half restored, so start again and
+                    # probe as if there had been no snapshot.
+                    log.exception("restoring model from snapshot failed")
+                    os.unlink(self.snapshot_path)
+                    return SubiquityModel(root, common['opts'].sources)
+                log.debug(
+                    "restored model from snapshot in %.3fs",
+                    time.monotonic() - start)
+        return model
 
     controllers = [
             "Welcome",
@@ -64,6 +85,9 @@ class Subiquity(Application):
             self.controllers.remove("Zdev")
 
         super().__init__(ui, opts)
+        self.snapshot_path = os.path.join(self.state_dir, 'model-snapshot')
+        if not self.common['updated'] and os.path.exists(self.snapshot_path):
+            os.unlink(self.snapshot_path)
         self.common['ui'].progress_completion += 1
         self.common['block_log_dir'] = block_log_dir
         if opts.snaps_from_examples:
@@ -81,6 +105,10 @@ class Subiquity(Application):
             ('network-change', self._network_change),
             ])
 
+    def save_snapshot(self, snapshot):
+        """Write out a SubiquityModel.snapshot() for after a refresh."""
+        write_snapshot(self.snapshot_path, snapshot)
+
     def _network_change(self):
         self.common['signal'].emit_signal('snapd-network-change')
 
@@ -92,4 +120,5 @@ class Subiquity(Application):
             lambda: conn.configure_proxy(proxy_model),
             lambda fut: (
                 fut.result(), signal.emit_signal('snapd-network-change')),
+            lane='store',
             )
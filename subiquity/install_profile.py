@@ -0,0 +1,254 @@
+# Copyright 2019 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Timing profiles of installs
+
+An InstallProfile records when each of the events curtin reports (see
+InstallProgressController.curtin_event) started and how long it took.
+A profile is saved with the installer's logs, and profiles of earlier
+installs are used to estimate how long the current one has left (see
+ETAEstimator) and can be compared with
+scripts/compare-install-profiles.py.
+
+"""
+
+import collections
+import datetime
+import json
+import logging
+import os
+import platform
+import statistics
+import time
+
+log = logging.getLogger('subiquity.install_profile')
+
+
+PROFILE_VERSION = 1
+
+# The depth (number of /s in the name) of the events that are curtin's
+# stages, e.g. cmd-install/stage-extract.
+STAGE_DEPTH = 1
+
+
+def event_time(event):
+    """Return the monotonic time, in seconds, a journal entry was logged."""
+    ts = event.get('__MONOTONIC_TIMESTAMP')
+    if ts is None:
+        return time.monotonic()
+    if isinstance(ts, tuple):
+        # python-systemd's Reader returns (timedelta, boot id).
+        ts = ts[0]
+    if isinstance(ts, datetime.timedelta):
+        return ts.total_seconds()
+    # journalctl -o json writes microseconds, as a string.
+    return int(ts) / 1e6
+
+
+def machine_info():
+    info = {
+        'arch': platform.machine(),
+        'cpus': os.cpu_count(),
+        }
+    try:
+        with open('/proc/meminfo') as fp:
+            for line in fp:
+                if line.startswith('MemTotal:'):
+                    info['memory_kb'] = int(line.split()[1])
+                    break
+    except OSError:
+        pass
+    return info
+
+
+def depth(stage):
+    return stage['name'].count('/')
+
+
+class InstallProfile:
+
+    def __init__(self, machine=None):
+        self.machine = machine or {}
+        # Each stage is a dict with keys name, message, start (seconds
+        # since the first event), duration and result. duration and
+        # result are None until the stage finishes.
+        self.stages = []
+        self._open = []  # indexes into stages of unfinished stages
+        self._origin = None
+
+    def event(self, event):
+        """Record a curtin event, as a journal entry."""
+        event_type = event.get('CURTIN_EVENT_TYPE')
+        name = event.get('CURTIN_NAME', '')
+        message = event.get('CURTIN_MESSAGE', '')
+        if event_type == 'start':
+            self.start(name, message, event_time(event))
+        elif event_type == 'finish':
+            self.finish(
+                name, message, event.get('CURTIN_RESULT'), event_time(event))
+
+    def start(self, name, message, t):
+        if self._origin is None:
+            self._origin = t
+        self._open.append(len(self.stages))
+        self.stages.append({
+            'name': name,
+            'message': message,
+            'start': t - self._origin,
+            'duration': None,
+            'result': None,
+            })
+
+    def finish(self, name, message, result, t):
+        for i in reversed(range(len(self._open))):
+            stage = self.stages[self._open[i]]
+            if stage['name'] == name and stage['message'] == message:
+                del self._open[i]
+                stage['duration'] = self.elapsed(t) - stage['start']
+                stage['result'] = result
+                return
+        log.debug("finish of %s %r that did not start", name, message)
+
+    def elapsed(self, t):
+        """Seconds from the first event to monotonic time t."""
+        if self._origin is None:
+            return 0.0
+        return t - self._origin
+
+    @property
+    def total(self):
+        return max(
+            (s['start'] + s['duration']
+             for s in self.stages if s['duration'] is not None),
+            default=0.0)
+
+    def top_stages(self):
+        return [s for s in self.stages if depth(s) == STAGE_DEPTH]
+
+    def as_dict(self):
+        return {
+            'version': PROFILE_VERSION,
+            'machine': self.machine,
+            'total': self.total,
+            'stages': self.stages,
+            }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version') != PROFILE_VERSION:
+            raise Exception(
+                "unknown profile version {!r}".format(data.get('version')))
+        profile = cls(data['machine'])
+        profile.stages = data['stages']
+        return profile
+
+    @classmethod
+    def from_events(cls, events):
+        """Make a profile from journal entries, e.g. a journal export."""
+        profile = cls()
+        for event in events:
+            if event.get('SYSLOG_IDENTIFIER', '').startswith('curtin_event'):
+                profile.event(event)
+        return profile
+
+    def save(self, path):
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as fp:
+            json.dump(self.as_dict(), fp, indent=1)
+        os.rename(tmp, path)
+
+
+def load_profile(path):
+    """Load a profile saved by InstallProfile.save or a journal export.
+
+    A journal export is what "journalctl -o json" writes, one entry per
+    line, such as examples/curtin-events.json.
+    """
+    with open(path) as fp:
+        content = fp.read()
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return InstallProfile.from_events(
+            json.loads(line) for line in content.splitlines() if line.strip())
+    if 'stages' in data:
+        return InstallProfile.from_dict(data)
+    return InstallProfile.from_events([data])
+
+
+def load_history(paths):
+    """Load the profiles at paths, skipping any that are missing or bad."""
+    history = []
+    for path in paths:
+        try:
+            history.append(load_profile(path))
+        except FileNotFoundError:
+            pass
+        except Exception:
+            log.exception("loading profile %s failed", path)
+    return history
+
+
+def stage_durations(profile, max_depth=None):
+    """Return an ordered dict mapping (name, message) to total duration.
+
+    Stages that have not finished are left out.
+    """
+    r = collections.OrderedDict()
+    for stage in profile.stages:
+        if stage['duration'] is None:
+            continue
+        if max_depth is not None and depth(stage) > max_depth:
+            continue
+        key = stage['name'], stage['message']
+        r[key] = r.get(key, 0.0) + stage['duration']
+    return r
+
+
+class ETAEstimator:
+    """Estimate how long an install has left from earlier profiles.
+
+    Each of curtin's stages is expected to take the median of the time
+    it took in the earlier installs, so the time left is the expected
+    time of the stages that have not started plus what is left of the
+    expected time of the ones that are running.
+    """
+
+    def __init__(self, history):
+        durations = collections.OrderedDict()
+        for profile in history:
+            for stage in profile.top_stages():
+                if stage['duration'] is not None:
+                    durations.setdefault(stage['name'], []).append(
+                        stage['duration'])
+        self.expected = collections.OrderedDict(
+            (name, statistics.median(d)) for name, d in durations.items())
+
+    def remaining(self, profile, t):
+        """Return the seconds left at monotonic time t, or None."""
+        if not self.expected:
+            return None
+        started = {}
+        for stage in profile.top_stages():
+            started[stage['name']] = stage
+        left = 0.0
+        for name, expected in self.expected.items():
+            stage = started.get(name)
+            if stage is None:
+                left += expected
+            elif stage['duration'] is None:
+                left += max(
+                    0.0, expected - (profile.elapsed(t) - stage['start']))
+        return left
@@ -17,12 +17,14 @@ from abc import ABC, abstractmethod
 import attr
 import collections
 import enum
+import functools
+import heapq
 import itertools
 import logging
 import math
 import os
-import pathlib
 import platform
+import time
 
 from curtin.util import human2bytes
 from curtin import storage_config
@@ -33,11 +35,8 @@ log = logging.getLogger('subiquity.models.filesystem')
 
 
 def _set_backlinks(obj):
-    for field in attr.fields(type(obj)):
-        backlink = field.metadata.get('backlink')
-        if backlink is None:
-            continue
-        v = getattr(obj, field.name)
+    for name, backlink in obj._fields.backlinked:
+        v = getattr(obj, name)
         if v is None:
             continue
         if not isinstance(v, (list, set)):
@@ -50,14 +49,12 @@ def _set_backlinks(obj):
                 b.add(obj)
             else:
                 setattr(vv, backlink, obj)
+    _changed(obj)
 
 
 def _remove_backlinks(obj):
-    for field in attr.fields(type(obj)):
-        backlink = field.metadata.get('backlink')
-        if backlink is None:
-            continue
-        v = getattr(obj, field.name)
+    for name, backlink in obj._fields.backlinked:
+        v = getattr(obj, name)
         if v is None:
             continue
         if not isinstance(v, (list, set)):
@@ -70,6 +67,114 @@ def _remove_backlinks(obj):
                 b.remove(obj)
             else:
                 setattr(vv, backlink, None)
+    _changed(obj)
+
+
+def _changed(obj):
+    # Tell the model that obj has changed, so that any derived values
+    # computed from the old state are thrown away. _m is not set yet while
+    # attrs is still running __init__, which is fine: an object is not
+    # part of the model until its backlinks are set.
+    m = getattr(obj, '_m', None)
+    if m is not None:
+        m._changed()
+
+
+def _fsobj_setattr(obj, name, value):
+    object.__setattr__(obj, name, value)
+    _changed(obj)
+
+
+def _cached(meth):
+    # Memoize meth (a method or property getter of a storage object) until
+    # the next change to the model. The model is a mock in some tests, in
+    # which case this just calls meth every time.
+    #
+    # attrs recreates slotted classes and only fixes up the __class__ cell
+    # of the functions it can see, so meth cannot use a bare super().
+    key = meth.__qualname__
+
+    @functools.wraps(meth)
+    def wrapper(self, *args):
+        if not isinstance(getattr(self._m, '_generation', None), int):
+            return meth(self, *args)
+        cache = self._m._derived_cache(self)
+        try:
+            r = cache[key, args]
+        except KeyError:
+            r = cache[key, args] = meth(self, *args)
+        else:
+            if self._m.check_derived_cache:
+                fresh = meth(self, *args)
+                assert r == fresh, (
+                    "stale cached {} for {}: {!r} != {!r}".format(
+                        key, self.id, r, fresh))
+        return r
+    return wrapper
+
+
+class _Fields:
+    # What the functions that walk over the fields of a storage object
+    # need to know about a class, worked out once when the class is
+    # defined rather than from attr.fields() on every call.
+
+    def __init__(self, cls):
+        self.all = []  # [(name, kind)], kind is 'ref', 'reflist' or None
+        self.refs = []  # [(name, is_list)], in field order
+        self.backlinked = []  # [(name, backlink)]
+        self.backlinks = []  # [name]
+        serializers = []
+        for f in attr.fields(cls):
+            kind = None
+            if f.metadata.get('ref', False):
+                kind = 'ref'
+                self.refs.append((f.name, False))
+            elif f.metadata.get('reflist', False):
+                kind = 'reflist'
+                self.refs.append((f.name, True))
+            self.all.append((f.name, kind))
+            if 'backlink' in f.metadata:
+                self.backlinked.append((f.name, f.metadata['backlink']))
+            if f.metadata.get('is_backlink', False):
+                self.backlinks.append(f.name)
+            if not f.name.startswith('_'):
+                serializers.append(self._serializer(cls, f))
+        self.asdict = self._make_asdict(serializers)
+
+    @staticmethod
+    def _serializer(cls, field):
+        # Return a function that adds field of an instance to a dict.
+        name = field.name
+        if hasattr(cls, 'serialize_' + name):
+            serialize = getattr(cls, 'serialize_' + name)
+
+            def f(inst, r):
+                r[name] = serialize(inst)
+        elif field.metadata.get('ref', False):
+            def f(inst, r):
+                v = getattr(inst, name)
+                if v is not None:
+                    r[name] = v.id
+        elif field.metadata.get('reflist', False):
+            def f(inst, r):
+                v = getattr(inst, name)
+                if v is not None:
+                    r[name] = [elem.id for elem in v]
+        else:
+            def f(inst, r):
+                v = getattr(inst, name)
+                if v is not None:
+                    r[name] = v
+        return f
+
+    @staticmethod
+    def _make_asdict(serializers):
+        def asdict(inst):
+            r = collections.OrderedDict()
+            for serializer in serializers:
+                serializer(inst, r)
+            return r
+        return asdict
 
 
 _type_to_cls = {}
@@ -78,31 +183,31 @@ _type_to_cls = {}
 def fsobj(typ):
     def wrapper(c):
         c.__attrs_post_init__ = _set_backlinks
+        c.__setattr__ = _fsobj_setattr
         c.type = attributes.const(typ)
         c.id = attributes.idfield(typ)
-        c._m = attr.ib(repr=None, default=None)
-        c = attr.s(cmp=False)(c)
+        c._m = attr.ib(repr=False, default=None)
+        c = attr.s(cmp=False, slots=True)(c)
+        c._fields = _Fields(c)
         _type_to_cls[typ] = c
         return c
     return wrapper
 
 
 def dependencies(obj):
-    for f in attr.fields(type(obj)):
-        v = getattr(obj, f.name)
+    for name, is_list in obj._fields.refs:
+        v = getattr(obj, name)
         if not v:
             continue
-        elif f.metadata.get('ref', False):
-            yield v
-        elif f.metadata.get('reflist', False):
+        elif is_list:
             yield from v
+        else:
+            yield v
 
 
 def reverse_dependencies(obj):
-    for f in attr.fields(type(obj)):
-        if not f.metadata.get('is_backlink', False):
-            continue
-        v = getattr(obj, f.name)
+    for name in obj._fields.backlinks:
+        v = getattr(obj, name)
         if isinstance(v, (list, set)):
             yield from v
         elif v is not None:
@@ -140,6 +245,7 @@ raidlevels_by_value = _raidlevels_by_value()
 HUMAN_UNITS = ['B', 'K', 'M', 'G', 'T', 'P']
 
 
+@functools.lru_cache(maxsize=1024)
 def humanize_size(size):
     if size == 0:
         return "0B"
@@ -197,26 +303,33 @@ def dehumanize_size(size):
 RAID_OVERHEAD = 8 * (1 << 20)
 
 
-def get_raid_size(level, devices):
-    if len(devices) == 0:
+def _raid_size(level, count, min_size):
+    # min_size is the size of the smallest device, count how many there are.
+    if count == 0:
         return 0
-    min_size = min(dev.size for dev in devices) - RAID_OVERHEAD
+    min_size -= RAID_OVERHEAD
     if min_size <= 0:
         return 0
     if level == "raid0":
-        return min_size * len(devices)
+        return min_size * count
     elif level == "raid1":
         return min_size
     elif level == "raid5":
-        return (min_size - RAID_OVERHEAD) * (len(devices) - 1)
+        return (min_size - RAID_OVERHEAD) * (count - 1)
     elif level == "raid6":
-        return (min_size - RAID_OVERHEAD) * (len(devices) - 2)
+        return (min_size - RAID_OVERHEAD) * (count - 2)
     elif level == "raid10":
-        return min_size * (len(devices) // 2)
+        return min_size * (count // 2)
     else:
         raise ValueError("unknown raid level %s" % level)
 
 
+def get_raid_size(level, devices):
+    if len(devices) == 0:
+        return 0
+    return _raid_size(level, len(devices), min(dev.size for dev in devices))
+
+
 # These are only defaults but curtin does not let you change/specify
 # them at this time.
 LVM_OVERHEAD = (1 << 20)
@@ -232,6 +345,30 @@ def get_lvm_size(devices, size_overrides={}):
     return r
 
 
+def get_compound_sizes(devices):
+    """Return the size of every possible RAID and of a VG made of devices.
+
+    The result maps each RAID level value in raidlevels, and "lvm", to a
+    size. The sizes of the devices are only looked at once, whichever
+    layout ends up being chosen.
+    """
+    count = 0
+    min_size = None
+    lvm_size = 0
+    for d in devices:
+        size = d.size
+        count += 1
+        if min_size is None or size < min_size:
+            min_size = size
+        lvm_size += align_down(size - LVM_OVERHEAD, LVM_CHUNK_SIZE)
+    r = {
+        level.value: _raid_size(level.value, count, min_size)
+        for level in raidlevels
+        }
+    r["lvm"] = lvm_size
+    return r
+
+
 class attributes:
     # Just a namespace to hang our wrappers around attr.ib() off.
 
@@ -285,23 +422,7 @@ class attributes:
 
 
 def asdict(inst):
-    r = collections.OrderedDict()
-    for field in attr.fields(type(inst)):
-        if field.name.startswith('_'):
-            continue
-        m = getattr(inst, 'serialize_' + field.name, None)
-        if m:
-            r[field.name] = m()
-        else:
-            v = getattr(inst, field.name)
-            if v is not None:
-                if field.metadata.get('ref', False):
-                    r[field.name] = v.id
-                elif field.metadata.get('reflist', False):
-                    r[field.name] = [elem.id for elem in v]
-                else:
-                    r[field.name] = v
-    return r
+    return inst._fields.asdict(inst)
 
 
 # This code is not going to make much sense unless you have read
@@ -380,7 +501,7 @@ def _generic_can_DELETE(obj):
             cdname=cd.label)
 
 
-@attr.s(cmp=False)
+@attr.s(cmp=False, slots=True)
 class _Formattable(ABC):
     # Base class for anything that can be formatted and mounted,
     # e.g. a disk or a RAID or a partition.
@@ -391,6 +512,7 @@ class _Formattable(ABC):
         pass
 
     @property
+    @_cached
     def annotations(self):
         preserve = getattr(self, 'preserve', None)
         if preserve is None:
@@ -406,6 +528,7 @@ class _Formattable(ABC):
     # Raid or LVM_VolGroup for now, but one day ZPool, BCache...
     _constructed_device = attributes.backlink()
 
+    @_cached
     def usage_labels(self):
         cd = self.constructed_device()
         if cd is not None:
@@ -462,6 +585,7 @@ class _Formattable(ABC):
     def supported_actions(self):
         pass
 
+    @_cached
     def action_possible(self, action):
         assert action in self.supported_actions
         r = getattr(self, "_can_" + action.name)
@@ -488,7 +612,7 @@ class _Formattable(ABC):
 GPT_OVERHEAD = 2 * (1 << 20)
 
 
-@attr.s(cmp=False)
+@attr.s(cmp=False, slots=True)
 class _Device(_Formattable, ABC):
     # Anything that can have partitions, e.g. a disk or a RAID.
 
@@ -503,7 +627,12 @@ class _Device(_Formattable, ABC):
     def partitions(self):
         return self._partitions
 
+    @_cached
+    def _partition_numbers(self):
+        return {p: i for i, p in enumerate(self._partitions, 1)}
+
     @property
+    @_cached
     def used(self):
         if self._is_entirely_used():
             return self.size
@@ -517,9 +646,11 @@ class _Device(_Formattable, ABC):
         return self.used == 0
 
     @property
+    @_cached
     def free_for_partitions(self):
         return self.size - self.used - GPT_OVERHEAD
 
+    @_cached
     def available(self):
         # A _Device is available if:
         # 1) it is not part of a device like a RAID or LVM or zpool or ...
@@ -595,14 +726,26 @@ class Disk(_Device):
     grub_device = attr.ib(default=False)
 
     _info = attr.ib(default=None)
+    # The blockdev entry from the probe data for a probed disk. The
+    # StorageInfo for it is only created if something asks for it.
+    _blockdev = attr.ib(default=None, repr=False)
+
+    def _get_info(self):
+        if self._info is None and self._blockdev is not None:
+            # Filling in the info does not change anything about the disk,
+            # so bypass _fsobj_setattr.
+            object.__setattr__(
+                self, '_info', StorageInfo({self.path: self._blockdev}))
+        return self._info
 
     def info_for_display(self):
-        bus = self._info.raw.get('ID_BUS', None)
-        major = self._info.raw.get('MAJOR', None)
+        info = self._get_info()
+        bus = info.raw.get('ID_BUS', None)
+        major = info.raw.get('MAJOR', None)
         if bus is None and major == '253':
             bus = 'virtio'
 
-        devpath = self._info.raw.get('DEVPATH', self.path)
+        devpath = info.raw.get('DEVPATH', self.path)
         # XXX probert should be doing this!!
         rotational = '1'
         try:
@@ -621,7 +764,7 @@ class Disk(_Device):
             'serial': self.serial,
             'size': self.size,
             'humansize': humanize_size(self.size),
-            'vendor': self._info.vendor,
+            'vendor': info.vendor,
             'rotational': 'true' if rotational == '1' else 'false',
         }
         if dinfo['serial'] is None:
@@ -634,6 +777,8 @@ class Disk(_Device):
 
     @property
     def size(self):
+        if self._info is None and self._blockdev is not None:
+            return align_down(int(self._blockdev['attrs']['size']))
         return align_down(self._info.size)
 
     @property
@@ -677,6 +822,7 @@ class Disk(_Device):
             return self._potential_boot_partition() is not None
 
     @property
+    @_cached
     def supported_actions(self):
         actions = [
             DeviceAction.INFO,
@@ -728,6 +874,7 @@ class Disk(_Device):
             return self._fs is None and self._constructed_device is None
 
     @property
+    @_cached
     def ok_for_raid(self):
         if self._fs is not None:
             if self._fs.preserve:
@@ -752,8 +899,9 @@ class Partition(_Formattable):
     preserve = attr.ib(default=False)
 
     @property
+    @_cached
     def annotations(self):
-        r = super().annotations
+        r = list(_Formattable.annotations.fget(self))
         if self.flag == "prep":
             r.append("PReP")
         elif self.flag == "boot":
@@ -762,10 +910,11 @@ class Partition(_Formattable):
             r.append("bios_grub")
         return r
 
+    @_cached
     def usage_labels(self):
         if self.flag == "prep" or self.flag == "bios_grub":
             return []
-        return super().usage_labels()
+        return _Formattable.usage_labels(self)
 
     def desc(self):
         return _("partition of {}").format(self.device.desc())
@@ -778,6 +927,7 @@ class Partition(_Formattable):
     def short_label(self):
         return _("partition {}").format(self._number)
 
+    @_cached
     def available(self):
         if self.flag in ['bios_grub', 'prep']:
             return False
@@ -789,7 +939,7 @@ class Partition(_Formattable):
 
     @property
     def _number(self):
-        return self.device._partitions.index(self) + 1
+        return self.device._partition_numbers()[self]
 
     supported_actions = [
         DeviceAction.EDIT,
@@ -811,6 +961,7 @@ class Partition(_Formattable):
         return _generic_can_DELETE(self)
 
     @property
+    @_cached
     def ok_for_raid(self):
         if self.flag in ('boot', 'bios_grub', 'prep'):
             return False
@@ -836,10 +987,12 @@ class Raid(_Device):
     ptable = attributes.ptable()
 
     @property
+    @_cached
     def size(self):
         return get_raid_size(self.raidlevel, self.devices)
 
     @property
+    @_cached
     def free_for_partitions(self):
         # For some reason, the overhead on RAID devices seems to be
         # higher (may be related to alignment of underlying
@@ -879,6 +1032,7 @@ class Raid(_Device):
     _can_REMOVE = property(_generic_can_REMOVE)
 
     @property
+    @_cached
     def ok_for_raid(self):
         if self._fs is not None:
             if self._fs.preserve:
@@ -904,16 +1058,19 @@ class LVM_VolGroup(_Device):
     preserve = attr.ib(default=False)
 
     @property
+    @_cached
     def size(self):
         return get_lvm_size(self.devices)
 
     @property
+    @_cached
     def free_for_partitions(self):
         return self.size - self.used
 
     @property
+    @_cached
     def annotations(self):
-        r = super().annotations
+        r = list(_Device.annotations.fget(self))
         member = next(iter(self.devices))
         if member.type == "dm_crypt":
             r.append("encrypted")
@@ -965,6 +1122,7 @@ class LVM_LogicalVolume(_Formattable):
     def serialize_size(self):
         return "{}B".format(self.size)
 
+    @_cached
     def available(self):
         if self._constructed_device is not None:
             return False
@@ -1015,6 +1173,9 @@ class DM_Crypt:
     preserve = attr.ib(default=False)
 
     _constructed_device = attributes.backlink()
+    # A probed dm_crypt can be formatted directly.
+    _fs = attributes.backlink()
+    _original_fs = attributes.backlink()
 
     def constructed_device(self):
         return self._constructed_device
@@ -1068,6 +1229,86 @@ class Mount:
         return True
 
 
+class _MountTrie:
+    # The mounts in the model, indexed by path as a tree of path
+    # components, so that finding the mount at a path or the closest
+    # mount above a path takes time proportional to the depth of the
+    # path rather than to the number of mounts. Mounts that do not have
+    # an absolute path (i.e. swap) are not indexed.
+
+    __slots__ = ('mount', 'children')
+
+    def __init__(self):
+        self.mount = None
+        self.children = {}
+
+    @staticmethod
+    def _components(path):
+        if not path or not path.startswith('/'):
+            return None
+        return [c for c in path.split('/') if c]
+
+    def add(self, mount):
+        components = self._components(mount.path)
+        if components is None:
+            return
+        node = self
+        for c in components:
+            child = node.children.get(c)
+            if child is None:
+                child = node.children[c] = _MountTrie()
+            node = child
+        node.mount = mount
+
+    def remove(self, mount):
+        components = self._components(mount.path)
+        if components is None:
+            return
+        nodes = [self]
+        for c in components:
+            node = nodes[-1].children.get(c)
+            if node is None:
+                return
+            nodes.append(node)
+        if nodes[-1].mount is not mount:
+            return
+        nodes[-1].mount = None
+        # Prune the branch back to the last node that is still needed.
+        for c, parent, node in reversed(
+                list(zip(components, nodes, nodes[1:]))):
+            if node.mount is not None or node.children:
+                break
+            del parent.children[c]
+
+    def get(self, path):
+        components = self._components(path)
+        if components is None:
+            return None
+        node = self
+        for c in components:
+            node = node.children.get(c)
+            if node is None:
+                return None
+        return node.mount
+
+    def parent(self, path):
+        # Return the mount closest above path, not counting a mount at path.
+        components = self._components(path)
+        if not components:
+            return None
+        r = None
+        node = self
+        for c in components[:-1]:
+            if node.mount is not None:
+                r = node.mount
+            node = node.children.get(c)
+            if node is None:
+                return r
+        if node.mount is not None:
+            r = node.mount
+        return r
+
+
 def align_up(size, block_size=1 << 20):
     return (size + block_size - 1) & ~(block_size - 1)
 
@@ -1087,6 +1328,10 @@ class FilesystemModel(object):
 
     lower_size_limit = 128 * (1 << 20)
 
+    # Set to check every memoized property of a storage object against a
+    # freshly computed value, to catch changes that do not invalidate.
+    check_derived_cache = 'SUBIQUITY_DEBUG_STORAGE_CACHE' in os.environ
+
     @classmethod
     def is_mounted_filesystem(self, fstype):
         if fstype in [None, 'swap']:
@@ -1107,20 +1352,120 @@ class FilesystemModel(object):
             return Bootloader.BIOS
 
     def __init__(self):
+        # Bumped on every change to the model or the objects in it. Values
+        # derived from the objects are cached until it changes.
+        self._generation = 0
+        self._derived = {}
+        self._derived_generation = 0
+        self._derived_gettext = None
         self.bootloader = self._probe_bootloader()
         self._probe_data = None
+        self._probe_config = None
         self.reset()
 
     def reset(self):
         if self._probe_data is not None:
-            config = storage_config.extract_storage_config(self._probe_data)
-            self._actions = self._actions_from_config(
-                config["storage"]["config"],
-                self._probe_data['blockdev'])
+            actions = self._actions_from_config(
+                self._probe_config, self._probe_data['blockdev'])
         else:
-            self._actions = []
+            actions = []
+        self._set_actions(actions)
         self.grub_install_device = None
 
+    def _set_actions(self, actions):
+        self._actions = []
+        # Secondary indexes over _actions, so that lookups do not have to
+        # scan every action. They are kept up to date by _add_action and
+        # _remove_action, which is why everything that changes the set of
+        # actions has to go through those.
+        self._by_type = collections.defaultdict(dict)  # {type: {obj: None}}
+        self._compound_devices = {}  # {obj: None}, in order of creation
+        self._disks_by_path = {}
+        self._by_name = {}  # {type: {name: obj}}, built on demand
+        self._sorted_disks = None  # built on demand
+        self._mounts = _MountTrie()
+        for obj in actions:
+            self._add_action(obj)
+
+    def _changed(self):
+        self._generation += 1
+
+    @property
+    def generation(self):
+        # Changes whenever the model does.
+        return self._generation
+
+    def _derived_cache(self, obj):
+        # Some derived values (annotations, usage_labels, ...) are
+        # translated text, so switching language makes them stale too.
+        if self._derived_generation != self._generation or \
+           self._derived_gettext is not _:
+            self._derived = {}
+            self._derived_generation = self._generation
+            self._derived_gettext = _
+        cache = self._derived.get(obj)
+        if cache is None:
+            cache = self._derived[obj] = {}
+        return cache
+
+    @property
+    def bootloader(self):
+        return self._bootloader
+
+    @bootloader.setter
+    def bootloader(self, bootloader):
+        self._bootloader = bootloader
+        self._changed()
+
+    @property
+    def grub_install_device(self):
+        return self._grub_install_device
+
+    @grub_install_device.setter
+    def grub_install_device(self, device):
+        self._grub_install_device = device
+        self._changed()
+
+    def _add_action(self, obj):
+        self._changed()
+        self._actions.append(obj)
+        self._by_type[obj.type][obj] = None
+        if obj.type == 'disk':
+            self._sorted_disks = None
+            if obj.path is not None:
+                self._disks_by_path[obj.path] = obj
+        elif isinstance(obj, _Device):
+            self._compound_devices[obj] = None
+        elif obj.type == 'mount':
+            self._mounts.add(obj)
+        self._by_name.pop(obj.type, None)
+
+    def _remove_action(self, obj):
+        self._changed()
+        self._actions.remove(obj)
+        del self._by_type[obj.type][obj]
+        if obj.type == 'disk':
+            self._sorted_disks = None
+            if self._disks_by_path.get(obj.path) is obj:
+                del self._disks_by_path[obj.path]
+        elif isinstance(obj, _Device):
+            del self._compound_devices[obj]
+        elif obj.type == 'mount':
+            self._mounts.remove(obj)
+        self._by_name.pop(obj.type, None)
+
+    def _find_by_name(self, typ, name):
+        # Names can be edited after an object is created, so a hit has to
+        # be checked and a miss means we rebuild the index for that type.
+        names = self._by_name.get(typ)
+        if names is not None:
+            obj = names.get(name)
+            if obj is not None and obj.name == name:
+                return obj
+        names = self._by_name[typ] = {
+            obj.name: obj for obj in self._by_type[typ]}
+        return names.get(name)
+
     def _actions_from_config(self, config, blockdevs):
         """Convert curtin storage config into action instances.
 
@@ -1156,15 +1501,14 @@ class FilesystemModel(object):
                 # (e.g. bcache)
                 continue
             kw = {}
-            for f in attr.fields(c):
-                n = f.name
+            for n, kind in c._fields.all:
                 if n not in action:
                     continue
                 v = action[n]
                 try:
-                    if f.metadata.get('ref', False):
+                    if kind == 'ref':
                         kw[n] = byid[v]
-                    elif f.metadata.get('reflist', False):
+                    elif kind == 'reflist':
                         kw[n] = [byid[id] for id in v]
                     else:
                         kw[n] = v
@@ -1174,23 +1518,19 @@ class FilesystemModel(object):
                     # (e.g. a bcache's filesystem).
                     continue
             if kw['type'] == 'disk':
-                path = kw['path']
-                kw['info'] = StorageInfo({path: blockdevs[path]})
+                kw['blockdev'] = blockdevs[kw['path']]
             kw['preserve'] = True
             obj = byid[action['id']] = c(m=self, **kw)
             if action['type'] == "format":
                 obj.volume._original_fs = obj
             objs.append(obj)
 
-        while True:
-            log.debug("exclusions %s", {e.id for e in exclusions})
-            next_exclusions = exclusions.copy()
-            for e in exclusions:
-                next_exclusions.update(itertools.chain(
-                    dependencies(e), reverse_dependencies(e)))
-            if len(exclusions) == len(next_exclusions):
-                break
-            exclusions = next_exclusions
+        start = time.monotonic()
+        exclusions = self._connected_objects(objs, exclusions)
+        log.debug(
+            "excluded %d of %d objects reachable from mounted devices in "
+            "%.3fs: %s", len(exclusions), len(objs),
+            time.monotonic() - start, sorted(e.id for e in exclusions))
 
         objs = [o for o in objs if o not in exclusions]
 
@@ -1202,59 +1542,118 @@ class FilesystemModel(object):
 
         return objs
 
+    def _connected_objects(self, objs, roots):
+        # Return everything in objs that can be reached from roots by
+        # following references in either direction.
+        neighbours = {
+            o: list(itertools.chain(dependencies(o), reverse_dependencies(o)))
+            for o in objs
+            }
+        seen = set(roots)
+        work = collections.deque(seen)
+        while work:
+            for n in neighbours.get(work.popleft(), ()):
+                if n not in seen:
+                    seen.add(n)
+                    work.append(n)
+        return seen
+
+    def _render_dependencies(self, obj):
+        yield from dependencies(obj)
+        if isinstance(obj, Mount):
+            # The mount action for the closest parent of this one has to be
+            # emitted first (and so on up the tree).
+            parent = self._mounts.parent(obj.path)
+            if parent is not None:
+                yield parent
+
     def _render_actions(self):
         # The curtin storage config has the constraint that an action must be
         # preceded by all the things that it depends on.  We handle this by
-        # repeatedly iterating over all actions and checking if we can emit
-        # each action by checking if all of the actions it depends on have been
-        # emitted.  Eventually this will either emit all actions or stop making
-        # progress -- which means there is a cycle in the definitions,
+        # sorting the actions topologically: each action counts how many of
+        # the actions it depends on are yet to be emitted and is emitted when
+        # that count drops to zero. Of the actions that are ready to go, the
+        # one that comes first in _actions is emitted first, so if _actions
+        # is already in a valid order it is rendered unchanged. If not every
+        # action can be emitted there is a cycle in the definitions,
         # something the UI should have prevented <wink>.
+        work = self._actions
+        index = {obj: i for i, obj in enumerate(work)}
+
+        deps = [[] for obj in work]
+        dependents = [[] for obj in work]
+        waiting_on = [0] * len(work)
+        missing = {}
+        for i, obj in enumerate(work):
+            for dep in self._render_dependencies(obj):
+                j = index.get(dep)
+                if j is None:
+                    missing.setdefault(i, []).append(dep)
+                    continue
+                deps[i].append(j)
+                dependents[j].append(i)
+                waiting_on[i] += 1
+
+        ready = [
+            i for i in range(len(work))
+            if waiting_on[i] == 0 and i not in missing]
+        heapq.heapify(ready)
         r = []
-        emitted_ids = set()
-
-        def emit(obj):
-            r.append(asdict(obj))
-            emitted_ids.add(obj.id)
-
-        def can_emit(obj):
-            for dep in dependencies(obj):
-                if dep.id not in emitted_ids:
-                    return False
-            if isinstance(obj, Mount):
-                # Any mount actions for a parent of this one have to be emitted
-                # first.
-                for parent in pathlib.Path(obj.path).parents:
-                    parent = str(parent)
-                    if parent in mountpoints:
-                        if mountpoints[parent] not in emitted_ids:
-                            log.debug(
-                                "cannot emit action to mount %s until that "
-                                "for %s is emitted", obj.path, parent)
-                            return False
-            return True
-
-        mountpoints = {m.path: m.id for m in self.all_mounts()}
-        log.debug('mountpoints %s', mountpoints)
-
-        work = self._actions[:]
-
-        while work:
-            next_work = []
-            for obj in work:
-                if can_emit(obj):
-                    emit(obj)
-                else:
-                    next_work.append(obj)
-            if len(next_work) == len(work):
-                msg = ["rendering block devices made no progress processing:"]
-                for w in work:
-                    msg.append(" - " + str(w))
-                raise Exception("\n".join(msg))
-            work = next_work
+        while ready:
+            i = heapq.heappop(ready)
+            r.append(asdict(work[i]))
+            waiting_on[i] = -1
+            for j in dependents[i]:
+                waiting_on[j] -= 1
+                if waiting_on[j] == 0 and j not in missing:
+                    heapq.heappush(ready, j)
+
+        if len(r) != len(work):
+            raise Exception(self._describe_render_failure(
+                work, deps, dependents, waiting_on, missing))
 
         return r
 
+    def _describe_render_failure(self, work, deps, dependents, waiting_on,
+                                 missing):
+        msg = ["rendering block devices made no progress processing:"]
+        # Actions that depend (directly or not) on an action that is not in
+        # _actions at all can never be emitted.
+        blocked = set(missing)
+        todo = list(missing)
+        while todo:
+            for j in dependents[todo.pop()]:
+                if j not in blocked:
+                    blocked.add(j)
+                    todo.append(j)
+        for i, objs in sorted(missing.items()):
+            msg.append(
+                " - {} depends on {} which is not being rendered".format(
+                    work[i].id, ", ".join(obj.id for obj in objs)))
+        # Every other action that was not emitted is waiting on another such
+        # action, so following those links from any of them must lead into a
+        # cycle.
+        stuck = [
+            i for i in range(len(work))
+            if waiting_on[i] != -1 and i not in blocked]
+        if stuck:
+            path = []
+            seen = {}
+            i = stuck[0]
+            while i not in seen:
+                seen[i] = len(path)
+                path.append(i)
+                i = next(
+                    j for j in deps[i]
+                    if waiting_on[j] != -1 and j not in blocked)
+            cycle = path[seen[i]:] + [i]
+            msg.append(" - dependency cycle: {}".format(
+                " -> ".join(work[j].id for j in cycle)))
+        for i in range(len(work)):
+            if waiting_on[i] != -1:
+                msg.append(" - " + str(work[i]))
+        return "\n".join(msg)
+
     def render(self):
         config = {
             'storage': {
@@ -1275,50 +1674,142 @@ class FilesystemModel(object):
                 }
         return config
 
+    @property
+    def probe_data(self):
+        return self._probe_data
+
+    def snapshot(self):
+        """Return the state of the model as something json can encode.
+
+        restore_snapshot() turns this back into an equivalent model
+        without the probe data having to be extracted again.
+        """
+        # Objects are created from their dicts in the order they are
+        # rendered, which has everything an object refers to before it.
+        actions = self._render_actions()
+        # The original filesystem of a volume is kept around even when it
+        # has been removed, so that it can be put back.
+        original_fs = {}
+        removed_fs = []
+        for obj in self._actions:
+            fs = getattr(obj, '_original_fs', None)
+            if fs is None:
+                continue
+            original_fs[obj.id] = fs.id
+            if fs not in self._by_type['format']:
+                removed_fs.append(asdict(fs))
+        grub_id = None
+        if self.grub_install_device is not None:
+            grub_id = self.grub_install_device.id
+        return {
+            'bootloader': self.bootloader.name,
+            'probe_data': self._probe_data,
+            'probe_config': self._probe_config,
+            'actions': actions,
+            'order': [obj.id for obj in self._actions],
+            'original_fs': original_fs,
+            'removed_fs': removed_fs,
+            'grub_install_device': grub_id,
+            }
+
+    def restore_snapshot(self, data):
+        self.bootloader = Bootloader[data['bootloader']]
+        self._probe_data = data['probe_data']
+        self._probe_config = data['probe_config']
+        blockdevs = {}
+        if self._probe_data is not None:
+            blockdevs = self._probe_data['blockdev']
+        # Objects created in the UI get ids from a counter that starts
+        # again in this process, so only the ids that came from probing
+        # are kept and the others are generated afresh.
+        probed_ids = {action['id'] for action in self._probe_config or ()}
+        byid = {}  # {id in snapshot: obj}
+        order = {id: i for i, id in enumerate(data['order'])}
+        position = {}  # {obj: index in _actions}
+
+        def make(action):
+            c = _type_to_cls[action['type']]
+            kw = {}
+            for n, kind in c._fields.all:
+                if n not in action:
+                    continue
+                v = action[n]
+                if kind == 'ref':
+                    v = byid[v]
+                elif kind == 'reflist':
+                    v = [byid[id] for id in v]
+                kw[n] = v
+            if kw['id'] not in probed_ids:
+                del kw['id']
+            if c is Disk:
+                kw['blockdev'] = blockdevs.get(kw.get('path'))
+            obj = byid[action['id']] = c(m=self, **kw)
+            position[obj] = order.get(action['id'])
+            return obj
+
+        objs = [make(action) for action in data['actions']]
+        for action in data['removed_fs']:
+            # Creating the filesystem links it to its volume, which is
+            # not wanted for one that has been removed.
+            volume = byid[action['volume']]
+            current = volume._fs
+            make(action)
+            volume._fs = current
+        for volume_id, fs_id in data['original_fs'].items():
+            byid[volume_id]._original_fs = byid[fs_id]
+        objs.sort(key=position.get)
+        self._set_actions(objs)
+        grub_id = data['grub_install_device']
+        self.grub_install_device = byid[grub_id] if grub_id else None
+
     def load_probe_data(self, probe_data):
+        # Extracting the config is not cheap and the result only depends on
+        # the probe data, so do it once here rather than on every reset.
+        # Nothing modifies the config, so it can be shared by the objects
+        # each reset creates.
         self._probe_data = probe_data
+        config = storage_config.extract_storage_config(probe_data)
+        self._probe_config = config["storage"]["config"]
         self.reset()
 
     def disk_by_path(self, path):
-        for a in self._actions:
-            if a.type == 'disk' and a.path == path:
-                return a
-        raise KeyError("no disk with path {} found".format(path))
+        disk = self._disks_by_path.get(path)
+        if disk is None:
+            raise KeyError("no disk with path {} found".format(path))
+        return disk
+
+    def raid_by_name(self, name):
+        return self._find_by_name('raid', name)
+
+    def volgroup_by_name(self, name):
+        return self._find_by_name('lvm_volgroup', name)
 
     def all_filesystems(self):
-        return [a for a in self._actions if a.type == 'format']
+        return list(self._by_type['format'])
 
     def all_mounts(self):
-        return [a for a in self._actions if a.type == 'mount']
+        return list(self._by_type['mount'])
 
     def all_devices(self):
         # return:
         #  compound devices, newest first
         #  disk devices, sorted by label
-        disks = []
-        compounds = []
-        for a in self._actions:
-            if a.type == 'disk':
-                disks.append(a)
-            elif isinstance(a, _Device):
-                compounds.append(a)
-        compounds.reverse()
-        disks.sort(key=lambda x: x.label)
-        return compounds + disks
+        return list(self._compound_devices)[::-1] + self.all_disks()
 
     def all_partitions(self):
-        return [a for a in self._actions if a.type == 'partition']
+        return list(self._by_type['partition'])
 
     def all_disks(self):
-        return sorted(
-            [a for a in self._actions if a.type == 'disk'],
-            key=lambda x: x.label)
+        if self._sorted_disks is None:
+            self._sorted_disks = sorted(
+                self._by_type['disk'], key=lambda x: x.label)
+        return self._sorted_disks[:]
 
     def all_raids(self):
-        return [a for a in self._actions if a.type == 'raid']
+        return list(self._by_type['raid'])
 
     def all_volgroups(self):
-        return [a for a in self._actions if a.type == 'lvm_volgroup']
+        return list(self._by_type['lvm_volgroup'])
 
     def add_partition(self, disk, size, flag="", wipe=None):
         if size > disk.free_for_partitions:
@@ -1332,14 +1823,14 @@ class FilesystemModel(object):
         if flag in ("boot", "bios_grub", "prep"):
             disk._partitions.insert(0, disk._partitions.pop())
         disk.ptable = 'gpt'
-        self._actions.append(p)
+        self._add_action(p)
         return p
 
     def remove_partition(self, part):
         if part._fs or part._constructed_device:
             raise Exception("can only remove empty partition")
         _remove_backlinks(part)
-        self._actions.remove(part)
+        self._remove_action(part)
         if len(part.device._partitions) == 0:
             part.device.ptable = None
 
@@ -1350,47 +1841,47 @@ class FilesystemModel(object):
             raidlevel=raidlevel,
             devices=devices,
             spare_devices=spare_devices)
-        self._actions.append(r)
+        self._add_action(r)
         return r
 
     def remove_raid(self, raid):
         if raid._fs or raid._constructed_device or len(raid.partitions()):
             raise Exception("can only remove empty RAID")
         _remove_backlinks(raid)
-        self._actions.remove(raid)
+        self._remove_action(raid)
 
     def add_volgroup(self, name, devices):
         vg = LVM_VolGroup(m=self, name=name, devices=devices)
-        self._actions.append(vg)
+        self._add_action(vg)
         return vg
 
     def remove_volgroup(self, vg):
         if len(vg._partitions):
             raise Exception("can only remove empty VG")
         _remove_backlinks(vg)
-        self._actions.remove(vg)
+        self._remove_action(vg)
 
     def add_logical_volume(self, vg, name, size):
         lv = LVM_LogicalVolume(m=self, volgroup=vg, name=name, size=size)
-        self._actions.append(lv)
+        self._add_action(lv)
         return lv
 
     def remove_logical_volume(self, lv):
         if lv._fs:
             raise Exception("can only remove empty LV")
         _remove_backlinks(lv)
-        self._actions.remove(lv)
+        self._remove_action(lv)
 
     def add_dm_crypt(self, volume, key):
         if not volume.available:
             raise Exception("{} is not available".format(volume))
-        dm_crypt = DM_Crypt(volume=volume, key=key)
-        self._actions.append(dm_crypt)
+        dm_crypt = DM_Crypt(m=self, volume=volume, key=key)
+        self._add_action(dm_crypt)
         return dm_crypt
 
     def remove_dm_crypt(self, dm_crypt):
         _remove_backlinks(dm_crypt)
-        self._actions.remove(dm_crypt)
+        self._remove_action(dm_crypt)
 
     def add_filesystem(self, volume, fstype):
         log.debug("adding %s to %s", fstype, volume)
@@ -1402,29 +1893,29 @@ class FilesystemModel(object):
         if volume._fs is not None:
             raise Exception("%s is already formatted")
         fs = Filesystem(m=self, volume=volume, fstype=fstype)
-        self._actions.append(fs)
+        self._add_action(fs)
         return fs
 
     def re_add_filesystem(self, fs):
         _set_backlinks(fs)
-        self._actions.append(fs)
+        self._add_action(fs)
 
     def remove_filesystem(self, fs):
         if fs._mount:
             raise Exception("can only remove unmounted filesystem")
         _remove_backlinks(fs)
-        self._actions.remove(fs)
+        self._remove_action(fs)
 
     def add_mount(self, fs, path):
         if fs._mount is not None:
             raise Exception("%s is already mounted")
         m = Mount(m=self, device=fs, path=path)
-        self._actions.append(m)
+        self._add_action(m)
         return m
 
     def remove_mount(self, mount):
         _remove_backlinks(mount)
-        self._actions.remove(mount)
+        self._remove_action(mount)
 
     def needs_bootloader_partition(self):
         '''true if no disk have a boot partition, and one is needed'''
@@ -1440,10 +1931,7 @@ class FilesystemModel(object):
                 "unknown bootloader type {}".format(self.bootloader))
 
     def _mount_for_path(self, path):
-        for mount in self.all_mounts():
-            if mount.path == path:
-                return mount
-        return None
+        return self._mounts.get(path)
 
     def is_root_mounted(self):
         return self._mount_for_path('/') is not None
@@ -0,0 +1,148 @@
+# Copyright 2019 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Guided storage planner
+
+Works out which of the machine's disks the guided storage options could
+use, and how much space each way of using them would leave for the
+installed system.
+
+"""
+
+import collections
+import logging
+
+from subiquity.models.filesystem import (
+    Bootloader,
+    dehumanize_size,
+    get_compound_sizes,
+    GPT_OVERHEAD,
+    )
+
+
+log = logging.getLogger('subiquity.models.planner')
+
+BIOS_GRUB_SIZE_BYTES = 1 * 1024 * 1024    # 1MiB
+PREP_GRUB_SIZE_BYTES = 8 * 1024 * 1024    # 8MiB
+UEFI_GRUB_SIZE_BYTES = 512 * 1024 * 1024  # 512MiB EFI partition
+
+# Guided partitioning is not offered for disks smaller than this.
+GUIDED_MIN_DISK_SIZE = dehumanize_size("6G")
+# The guided LVM layout puts /boot on a partition of its own this size.
+GUIDED_LVM_BOOT_SIZE = dehumanize_size("1G")
+
+
+def boot_partition_size(bootloader, disk_size):
+    if bootloader == Bootloader.UEFI:
+        if UEFI_GRUB_SIZE_BYTES*2 >= disk_size:
+            return disk_size // 2
+        return UEFI_GRUB_SIZE_BYTES
+    elif bootloader == Bootloader.PREP:
+        return PREP_GRUB_SIZE_BYTES
+    elif bootloader == Bootloader.BIOS:
+        return BIOS_GRUB_SIZE_BYTES
+    else:
+        return 0
+
+
+# A guided layout of disk, leaving size for the installed system.
+GuidedPlan = collections.namedtuple('GuidedPlan', ['disk', 'size'])
+
+
+# A guided layout across disks: "raid1" for a mirror of two disks and
+# "lvm" for one volume group across all of them. The partitions needed
+# to boot (and /boot, for "lvm") go on the first disk. size is what is
+# left for the installed system.
+MultiDiskPlan = collections.namedtuple(
+    'MultiDiskPlan', ['kind', 'disks', 'size'])
+
+
+# Looks enough like a device for get_compound_sizes.
+_Space = collections.namedtuple('_Space', ['size'])
+
+
+def can_boot_after_reformat(model, disk):
+    """Whether disk could be made the boot disk once reformatted.
+
+    The guided layouts put the bootloader's partition on the disk they
+    install to. Reformatting removes the disk's partitions and any
+    filesystem on it, so the only thing that can stop it being the boot
+    disk then is being a member of a RAID or volume group.
+    """
+    if model.bootloader == Bootloader.NONE:
+        return True
+    return disk.constructed_device() is None
+
+
+class GuidedPlanner:
+
+    def __init__(self, model):
+        self.model = model
+        # Look at every disk once, up front: how much space would be
+        # left on it after it is reformatted and the partitions needed
+        # to boot from it are created, for those disks that are big
+        # enough and could be booted from.
+        self.free = {}  # {disk: free space}
+        for disk in model.all_disks():
+            size = disk.size
+            if size < GUIDED_MIN_DISK_SIZE:
+                continue
+            if not can_boot_after_reformat(model, disk):
+                log.debug("%s cannot be made bootable", disk.label)
+                continue
+            boot = boot_partition_size(model.bootloader, size)
+            self.free[disk] = size - GPT_OVERHEAD - boot
+        # all_disks() is sorted by label, and sorted() is stable, so disks
+        # of the same size are ranked in the same order each time.
+        self.by_size = sorted(
+            self.free, key=lambda disk: self.free[disk], reverse=True)
+
+    def disk_plans(self, method="direct"):
+        # Return the single disk layouts for method, best first.
+        overhead = 0
+        if method == "lvm":
+            overhead = GUIDED_LVM_BOOT_SIZE
+        return [
+            GuidedPlan(disk, self.free[disk] - overhead)
+            for disk in self.by_size
+            if self.free[disk] > overhead
+            ]
+
+    def multi_disk_plan(self, method="direct"):
+        # Return the layout across disks for method: the direct option
+        # mirrors the two roomiest disks and the LVM option spans them
+        # all. None if there are not enough disks.
+        if len(self.by_size) < 2:
+            return None
+        if method == "lvm":
+            kind, disks, overhead = "lvm", self.by_size, GUIDED_LVM_BOOT_SIZE
+        else:
+            kind, disks, overhead = "raid1", self.by_size[:2], 0
+        # Only the first disk has partitions for booting.
+        spaces = [_Space(self.free[disks[0]] - overhead)]
+        spaces.extend(_Space(disk.size - GPT_OVERHEAD) for disk in disks[1:])
+        size = get_compound_sizes(spaces)[kind]
+        if size <= 0:
+            return None
+        return MultiDiskPlan(kind, tuple(disks), size)
+
+    def best_disk(self, method="direct"):
+        plans = self.disk_plans(method)
+        log.debug(
+            "guided %s plans: %s", method,
+            [(plan.disk.label, plan.size) for plan in plans[:10]])
+        if not plans:
+            return None
+        return plans[0].disk
@@ -14,10 +14,14 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from collections import OrderedDict
+import gzip
+import json
 import logging
 import os
 import sys
 import uuid
+
+import attr
 import yaml
 
 from curtin.config import merge_config
@@ -28,11 +32,11 @@ from subiquitycore.file_util import write_file
 from subiquitycore.utils import run_command
 
 from .filesystem import FilesystemModel
-from .keyboard import KeyboardModel
+from .keyboard import KeyboardModel, KeyboardSetting
 from .locale import LocaleModel
 from .proxy import ProxyModel
 from .mirror import MirrorModel
-from .snaplist import SnapListModel
+from .snaplist import SnapListModel, SnapSelection
 from .ssh import SSHModel
 
 
@@ -49,6 +53,42 @@ def setup_yaml():
 
 setup_yaml()
 
+# Bump this when the format of SubiquityModel.snapshot() changes. A
+# snapshot with a different version is ignored.
+SNAPSHOT_VERSION = 1
+
+
+def write_snapshot(path, snapshot):
+    # The snapshot includes the user's (crypted) password.
+    fd = os.open(path + '.tmp', os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'wb') as raw:
+        with gzip.open(raw, 'wt', compresslevel=1) as fp:
+            json.dump(
+                {'version': SNAPSHOT_VERSION, 'model': snapshot}, fp,
+                separators=(',', ':'))
+    os.rename(path + '.tmp', path)
+
+
+def read_snapshot(path):
+    """Return the snapshot written by write_snapshot, or None.
+
+    None is returned if there is no snapshot or it cannot be used.
+    """
+    try:
+        with gzip.open(path, 'rt') as fp:
+            data = json.load(fp)
+    except FileNotFoundError:
+        return None
+    except (OSError, EOFError, ValueError):
+        log.exception("reading snapshot %s failed", path)
+        return None
+    if data.get('version') != SNAPSHOT_VERSION:
+        log.debug(
+            "ignoring snapshot with version %s", data.get('version'))
+        return None
+    return data['model']
+
+
 HOSTS_CONTENT = """\
 127.0.0.1 localhost
 127.0.1.1 {hostname}
@@ -92,6 +132,53 @@ class SubiquityModel:
         self.ssh = SSHModel()
         self.snaplist = SnapListModel()
 
+    def snapshot(self):
+        """Return the state of the model as something json can encode.
+
+        This is written out before a refresh so that the new version can
+        carry on from the same place without probing the storage again.
+        The network model is not included: it is rebuilt from what the
+        kernel reports (and the netplan config that has been applied).
+        """
+        identity = None
+        if self.identity.user is not None:
+            identity = attr.asdict(self.identity.user)
+            identity['hostname'] = self.identity.hostname
+        return {
+            'locale': self.locale.selected_language,
+            'keyboard': attr.asdict(self.keyboard.setting),
+            'proxy': self.proxy.proxy,
+            'mirror': self.mirror.mirror,
+            'filesystem': self.filesystem.snapshot(),
+            'identity': identity,
+            'ssh': {
+                'install_server': self.ssh.install_server,
+                'authorized_keys': self.ssh.authorized_keys,
+                'pwauth': self.ssh.pwauth,
+                'ssh_import_id': self.ssh.ssh_import_id,
+                },
+            'snaplist': {
+                name: attr.asdict(selection)
+                for name, selection in self.snaplist.to_install.items()
+                },
+            }
+
+    def restore_snapshot(self, data):
+        if data['locale'] is not None:
+            self.locale.switch_language(data['locale'])
+        self.keyboard.setting = KeyboardSetting(**data['keyboard'])
+        self.proxy.proxy = data['proxy']
+        self.mirror.mirror = data['mirror']
+        self.filesystem.restore_snapshot(data['filesystem'])
+        if data['identity'] is not None:
+            self.identity.add_user(data['identity'])
+        for k, v in data['ssh'].items():
+            setattr(self.ssh, k, v)
+        self.snaplist.to_install = {
+            name: SnapSelection(**selection)
+            for name, selection in data['snaplist'].items()
+            }
+
     def get_target_groups(self):
         command = ['chroot', self.target, 'getent', 'group']
         if self.root != '/':
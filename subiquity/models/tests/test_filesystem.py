@@ -13,8 +13,11 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import builtins
 from collections import namedtuple
+import json
 import unittest
+from unittest import mock
 
 from subiquity.models.filesystem import (
     Bootloader,
@@ -22,8 +25,12 @@ from subiquity.models.filesystem import (
     DeviceAction,
     Disk,
     FilesystemModel,
+    get_compound_sizes,
+    get_lvm_size,
+    get_raid_size,
     humanize_size,
     Partition,
+    raidlevels,
     )
 
 
@@ -105,6 +112,20 @@ class TestDehumanizeSize(unittest.TestCase):
                 self.assertEqual(expected_error, actual_error)
 
 
+class TestCompoundSizes(unittest.TestCase):
+
+    def test_matches_single_level_sizes(self):
+        FakeDev = namedtuple('FakeDev', ['size'])
+        for sizes in [], [1 << 30], [1 << 30, 2 << 30, 3 << 30, 5 << 30]:
+            devices = [FakeDev(size) for size in sizes]
+            with self.subTest(sizes=sizes):
+                r = get_compound_sizes(devices)
+                for level in raidlevels:
+                    self.assertEqual(
+                        r[level.value], get_raid_size(level.value, devices))
+                self.assertEqual(r['lvm'], get_lvm_size(devices))
+
+
 FakeStorageInfo = namedtuple(
     'FakeStorageInfo', ['name', 'size', 'free', 'serial', 'model'])
 FakeStorageInfo.__new__.__defaults__ = (None,) * len(FakeStorageInfo._fields)
@@ -119,11 +140,11 @@ def make_model(bootloader=None):
 
 def make_disk(model, **kw):
     serial = 'serial%s' % len(model._actions)
-    model._actions.append(Disk(
+    disk = Disk(
         m=model, serial=serial,
         info=FakeStorageInfo(size=100*(2**30)),
-        **kw))
-    disk = model._actions[-1]
+        **kw)
+    model._add_action(disk)
     return disk
 
 
@@ -138,7 +159,7 @@ def make_partition(model, device=None, *, size=None, **kw):
     if size is None:
         size = device.free_for_partitions//2
     partition = Partition(m=model, device=device, size=size, **kw)
-    model._actions.append(partition)
+    model._add_action(partition)
     return partition
 
 
@@ -739,3 +760,323 @@ class TestFilesystemModel(unittest.TestCase):
     def test_lv_action_MAKE_BOOT(self):
         model, lv = make_model_and_lv()
         self.assertActionNotSupported(lv, DeviceAction.MAKE_BOOT)
+
+
+class TestModelIndexes(unittest.TestCase):
+
+    def test_all_xxx_track_add_and_remove(self):
+        model = make_model()
+        disk = make_disk(model)
+        part = make_partition(model, disk)
+        fs = model.add_filesystem(part, 'ext4')
+        mount = model.add_mount(fs, '/')
+        self.assertEqual(model.all_partitions(), [part])
+        self.assertEqual(model.all_filesystems(), [fs])
+        self.assertEqual(model.all_mounts(), [mount])
+        model.remove_mount(mount)
+        model.remove_filesystem(fs)
+        model.remove_partition(part)
+        self.assertEqual(model.all_partitions(), [])
+        self.assertEqual(model.all_filesystems(), [])
+        self.assertEqual(model.all_mounts(), [])
+
+    def test_all_devices_order(self):
+        model = make_model()
+        disk1 = make_disk(model)
+        disk2 = make_disk(model)
+        raid = model.add_raid('md0', 'raid1', {disk1, disk2}, set())
+        vg = model.add_volgroup('vg0', {raid})
+        self.assertEqual(model.all_disks(), [disk1, disk2])
+        self.assertEqual(model.all_devices(), [vg, raid, disk1, disk2])
+        model.remove_volgroup(vg)
+        self.assertEqual(model.all_devices(), [raid, disk1, disk2])
+
+    def test_all_disks_is_a_copy(self):
+        model = make_model()
+        disk = make_disk(model)
+        model.all_disks().clear()
+        self.assertEqual(model.all_disks(), [disk])
+
+    def test_disk_by_path(self):
+        model = make_model()
+        disk = make_disk(model, path='/dev/vda')
+        self.assertIs(model.disk_by_path('/dev/vda'), disk)
+        with self.assertRaises(KeyError):
+            model.disk_by_path('/dev/vdb')
+
+    def test_by_name_follows_renames(self):
+        model = make_model()
+        raid = make_raid(model)
+        vg = make_vg(model)
+        self.assertIs(model.raid_by_name(raid.name), raid)
+        self.assertIs(model.volgroup_by_name(vg.name), vg)
+        raid.name = 'md-renamed'
+        self.assertIs(model.raid_by_name('md-renamed'), raid)
+        self.assertIsNone(model.volgroup_by_name('md-renamed'))
+        model.remove_raid(raid)
+        self.assertIsNone(model.raid_by_name('md-renamed'))
+
+
+class TestDerivedCache(unittest.TestCase):
+
+    def test_add_and_remove_invalidate(self):
+        model, disk = make_model_and_disk()
+        free = disk.free_for_partitions
+        part = model.add_partition(disk, size=free//2)
+        self.assertEqual(disk.used, part.size)
+        self.assertEqual(disk.free_for_partitions, free - part.size)
+        model.remove_partition(part)
+        self.assertEqual(disk.used, 0)
+        self.assertEqual(disk.free_for_partitions, free)
+
+    def test_setattr_invalidates(self):
+        model, part = make_model_and_partition()
+        self.assertEqual(part.annotations, ['new'])
+        part.preserve = True
+        self.assertEqual(part.annotations, ['existing'])
+        self.assertTrue(part.ok_for_raid)
+        part.flag = "boot"
+        self.assertFalse(part.ok_for_raid)
+
+    def test_bootloader_invalidates(self):
+        model, disk = make_model_and_disk(Bootloader.NONE)
+        self.assertNotIn(DeviceAction.MAKE_BOOT, disk.supported_actions)
+        model.bootloader = Bootloader.BIOS
+        self.assertIn(DeviceAction.MAKE_BOOT, disk.supported_actions)
+        self.assertEqual(
+            disk.action_possible(DeviceAction.MAKE_BOOT), (True, None))
+        model.grub_install_device = disk
+        self.assertEqual(
+            disk.action_possible(DeviceAction.MAKE_BOOT), (False, None))
+
+    def test_language_switch_invalidates(self):
+        model, part = make_model_and_partition()
+        self.assertEqual(part.annotations, ['new'])
+        self.addCleanup(setattr, builtins, '_', builtins._)
+        builtins._ = lambda message: "_(%s)" % message
+        self.assertEqual(part.annotations, ['_(new)'])
+
+    def test_check_derived_cache(self):
+        model = make_model()
+        model.check_derived_cache = True
+        raid = make_raid(model)
+        size = raid.size
+        self.assertEqual(raid.size, size)
+        # Changing a reflist in place does not tell the model anything.
+        raid.devices.clear()
+        with self.assertRaises(AssertionError):
+            raid.size
+
+
+class TestActionsFromConfig(unittest.TestCase):
+
+    config = [
+        {'type': 'disk', 'id': 'disk-a', 'path': '/dev/vda'},
+        {'type': 'partition', 'id': 'part-a1', 'device': 'disk-a',
+         'size': 1 << 30},
+        {'type': 'partition', 'id': 'part-a2', 'device': 'disk-a',
+         'size': 1 << 30},
+        {'type': 'format', 'id': 'fs-a1', 'volume': 'part-a1',
+         'fstype': 'ext4'},
+        {'type': 'mount', 'id': 'mount-a1', 'device': 'fs-a1',
+         'path': '/cdrom'},
+        {'type': 'disk', 'id': 'disk-b', 'path': '/dev/vdb'},
+        {'type': 'partition', 'id': 'part-b1', 'device': 'disk-b',
+         'size': 1 << 30},
+        ]
+    blockdevs = {
+        '/dev/vda': {'attrs': {'size': str(10 << 30)}},
+        '/dev/vdb': {'attrs': {'size': str(10 << 30)}},
+        }
+
+    def test_mounted_devices_excluded(self):
+        model = make_model()
+        objs = model._actions_from_config(self.config, self.blockdevs)
+        self.assertEqual([o.id for o in objs], ['disk-b', 'part-b1'])
+
+    @mock.patch('subiquity.models.filesystem.StorageInfo')
+    def test_disk_info_is_lazy(self, StorageInfo):
+        model = make_model()
+        [disk] = model._actions_from_config(self.config[:1], self.blockdevs)
+        self.assertEqual(disk.size, 10 << 30)
+        StorageInfo.assert_not_called()
+        self.assertIs(disk._get_info(), StorageInfo.return_value)
+        self.assertIs(disk._get_info(), StorageInfo.return_value)
+        StorageInfo.assert_called_once_with(
+            {'/dev/vda': self.blockdevs['/dev/vda']})
+
+    @mock.patch('subiquity.models.filesystem.storage_config')
+    def test_reset_reuses_extracted_config(self, storage_config):
+        extract = storage_config.extract_storage_config
+        extract.return_value = {'storage': {'config': self.config}}
+        model = make_model()
+        model.load_probe_data({'blockdev': self.blockdevs})
+        [disk] = model.all_disks()
+        model.remove_partition(disk.partitions()[0])
+        model.reset()
+        [new_disk] = model.all_disks()
+        self.assertIsNot(new_disk, disk)
+        self.assertEqual(len(new_disk.partitions()), 1)
+        self.assertIs(new_disk._blockdev, disk._blockdev)
+        extract.assert_called_once_with({'blockdev': self.blockdevs})
+
+
+class TestMountIndex(unittest.TestCase):
+
+    def make_mounts(self, model, *paths):
+        mounts = []
+        for path in paths:
+            fs = model.add_filesystem(make_disk(model), 'ext4')
+            mounts.append(model.add_mount(fs, path))
+        return mounts
+
+    def test_mount_for_path(self):
+        model = make_model()
+        root, home = self.make_mounts(model, '/', '/home')
+        self.assertIs(model._mount_for_path('/'), root)
+        self.assertIs(model._mount_for_path('/home'), home)
+        self.assertIs(model._mount_for_path('/home/'), home)
+        self.assertIsNone(model._mount_for_path('/srv'))
+        model.remove_mount(home)
+        self.assertIsNone(model._mount_for_path('/home'))
+        self.assertIs(model._mount_for_path('/'), root)
+
+    def test_parent(self):
+        model = make_model()
+        root, srv, data = self.make_mounts(model, '/', '/srv', '/srv/a/data')
+        mounts = model._mounts
+        self.assertIsNone(mounts.parent('/'))
+        self.assertIs(mounts.parent('/srv'), root)
+        self.assertIs(mounts.parent('/srv/a/data'), srv)
+        self.assertIs(mounts.parent('/srv/a/data/x'), data)
+        model.remove_mount(srv)
+        self.assertIs(mounts.parent('/srv/a/data'), root)
+
+    def test_swap_not_indexed(self):
+        model = make_model()
+        fs = model.add_filesystem(make_disk(model), 'swap')
+        model.add_mount(fs, '')
+        self.assertIsNone(model._mount_for_path(''))
+        self.assertEqual(model._mounts.children, {})
+
+
+class TestRenderActions(unittest.TestCase):
+
+    def ids(self, config):
+        return [action['id'] for action in config]
+
+    def test_valid_order_is_preserved(self):
+        model, disk = make_model_and_disk()
+        part1 = model.add_partition(disk, size=disk.free_for_partitions//2)
+        part2 = model.add_partition(disk, size=disk.free_for_partitions)
+        fs = model.add_filesystem(part2, 'ext4')
+        mount = model.add_mount(fs, '/')
+        self.assertEqual(
+            self.ids(model._render_actions()),
+            [disk.id, part1.id, part2.id, fs.id, mount.id])
+
+    def test_dependencies_come_first(self):
+        model, disk = make_model_and_disk()
+        part = model.add_partition(disk, size=disk.free_for_partitions)
+        fs = model.add_filesystem(part, 'ext4')
+        model._remove_action(disk)
+        model._add_action(disk)
+        self.assertEqual(
+            self.ids(model._render_actions()), [disk.id, part.id, fs.id])
+
+    def test_parent_mounts_come_first(self):
+        model, disk = make_model_and_disk()
+        part1 = model.add_partition(disk, size=disk.free_for_partitions//2)
+        part2 = model.add_partition(disk, size=disk.free_for_partitions)
+        fs1 = model.add_filesystem(part1, 'ext4')
+        fs2 = model.add_filesystem(part2, 'ext4')
+        home = model.add_mount(fs1, '/home')
+        root = model.add_mount(fs2, '/')
+        ids = self.ids(model._render_actions())
+        self.assertLess(ids.index(root.id), ids.index(home.id))
+
+    def test_cycle_is_reported(self):
+        model = make_model()
+        raid = make_raid(model)
+        part = make_partition(model, raid)
+        raid.devices.add(part)
+        with self.assertRaises(Exception) as cm:
+            model._render_actions()
+        self.assertIn(
+            "dependency cycle: {} -> {} -> {}".format(
+                raid.id, part.id, raid.id),
+            str(cm.exception))
+
+
+def make_probed_model():
+    # A model as load_probe_data would leave it, without needing curtin
+    # to extract the config.
+    model = make_model(Bootloader.NONE)
+    blockdev = {'attrs': {'size': str(20 << 30)}}
+    model._probe_data = {'blockdev': {'/dev/sda': blockdev}}
+    model._probe_config = [
+        {'type': 'disk', 'id': 'disk-sda', 'path': '/dev/sda',
+         'serial': 'sda', 'ptable': 'gpt'},
+        {'type': 'partition', 'id': 'partition-sda1', 'device': 'disk-sda',
+         'size': 10 << 30},
+        {'type': 'format', 'id': 'format-0', 'volume': 'partition-sda1',
+         'fstype': 'ext4'},
+        ]
+    model.reset()
+    return model
+
+
+def without_ids(config):
+    # Replace ids, and references to them, with positions in the config.
+    actions = config['storage']['config']
+    index = {action['id']: i for i, action in enumerate(actions)}
+    return [
+        {k: index.get(v, v) if isinstance(v, str) else v
+         for k, v in action.items()}
+        for action in actions]
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def round_trip(self, model):
+        data = json.loads(json.dumps(model.snapshot()))
+        restored = FilesystemModel()
+        restored.restore_snapshot(data)
+        return restored
+
+    def test_probed(self):
+        model = make_probed_model()
+        restored = self.round_trip(model)
+        self.assertEqual(restored.render(), model.render())
+        [disk] = restored.all_disks()
+        self.assertEqual(disk.id, 'disk-sda')
+        self.assertEqual(disk.size, 20 << 30)
+        [part] = disk.partitions()
+        self.assertIs(part.fs(), part.original_fs())
+        self.assertTrue(part.fs().preserve)
+
+    def test_edited(self):
+        model = make_probed_model()
+        [disk] = model.all_disks()
+        [part1] = disk.partitions()
+        original = part1.fs()
+        model.remove_filesystem(original)
+        model.add_filesystem(part1, 'xfs')
+        part2 = model.add_partition(disk, 5 << 30)
+        model.add_mount(model.add_filesystem(part2, 'ext4'), '/')
+        model.grub_install_device = disk
+        restored = self.round_trip(model)
+        self.assertEqual(without_ids(restored.render()),
+                         without_ids(model.render()))
+        [disk] = restored.all_disks()
+        part1, part2 = disk.partitions()
+        self.assertEqual(part1.fs().fstype, 'xfs')
+        self.assertEqual(part1.original_fs().fstype, 'ext4')
+        self.assertIsNot(part1.original_fs(), part1.fs())
+        self.assertTrue(restored.is_root_mounted())
+        self.assertIs(restored.grub_install_device, disk)
+        # Objects created after the restore do not clash with restored
+        # ones.
+        part3 = restored.add_partition(disk, 1 << 30)
+        others = [obj.id for obj in restored._actions if obj is not part3]
+        self.assertNotIn(part3.id, others)
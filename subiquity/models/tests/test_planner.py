@@ -0,0 +1,104 @@
+# Copyright 2019 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from subiquity.models.filesystem import (
+    Bootloader,
+    Disk,
+    GPT_OVERHEAD,
+    )
+from subiquity.models.planner import (
+    BIOS_GRUB_SIZE_BYTES,
+    GUIDED_LVM_BOOT_SIZE,
+    GuidedPlanner,
+    )
+from subiquity.models.tests.test_filesystem import (
+    FakeStorageInfo,
+    make_model,
+    )
+
+
+def make_disk(model, size_gb):
+    disk = Disk(
+        m=model, serial='serial%s' % len(model._actions),
+        info=FakeStorageInfo(size=size_gb << 30))
+    model._add_action(disk)
+    return disk
+
+
+class TestGuidedPlanner(unittest.TestCase):
+
+    def test_disks_ranked_by_free_space(self):
+        model = make_model(Bootloader.BIOS)
+        small = make_disk(model, 10)
+        big = make_disk(model, 100)
+        make_disk(model, 1)  # too small to be considered
+        medium = make_disk(model, 50)
+        plans = GuidedPlanner(model).disk_plans()
+        self.assertEqual(
+            [plan.disk for plan in plans], [big, medium, small])
+        self.assertEqual(
+            plans[0].size, big.size - GPT_OVERHEAD - BIOS_GRUB_SIZE_BYTES)
+
+    def test_lvm_leaves_room_for_boot(self):
+        model = make_model(Bootloader.NONE)
+        disk = make_disk(model, 10)
+        [direct] = GuidedPlanner(model).disk_plans("direct")
+        [lvm] = GuidedPlanner(model).disk_plans("lvm")
+        self.assertEqual(direct.size, disk.size - GPT_OVERHEAD)
+        self.assertEqual(lvm.size, direct.size - GUIDED_LVM_BOOT_SIZE)
+
+    def test_best_disk(self):
+        model = make_model(Bootloader.UEFI)
+        self.assertIsNone(GuidedPlanner(model).best_disk())
+        make_disk(model, 20)
+        disk = make_disk(model, 40)
+        self.assertIs(GuidedPlanner(model).best_disk(), disk)
+
+    def test_raid_member_cannot_boot(self):
+        model = make_model(Bootloader.BIOS)
+        disk = make_disk(model, 20)
+        member1 = make_disk(model, 40)
+        member2 = make_disk(model, 40)
+        model.add_raid("md0", "raid1", {member1, member2}, set())
+        planner = GuidedPlanner(model)
+        self.assertEqual(list(planner.free), [disk])
+        self.assertIs(planner.best_disk(), disk)
+
+    def test_no_bootloader_any_disk(self):
+        model = make_model(Bootloader.NONE)
+        make_disk(model, 20)
+        member = make_disk(model, 40)
+        model.add_raid("md0", "raid1", {member}, set())
+        self.assertIs(GuidedPlanner(model).best_disk(), member)
+
+    def test_multi_disk_plan(self):
+        model = make_model(Bootloader.BIOS)
+        disk1 = make_disk(model, 10)
+        planner = GuidedPlanner(model)
+        self.assertIsNone(planner.multi_disk_plan("direct"))
+        disk2 = make_disk(model, 20)
+        disk3 = make_disk(model, 30)
+        planner = GuidedPlanner(model)
+        raid1 = planner.multi_disk_plan("direct")
+        self.assertEqual(raid1.kind, "raid1")
+        self.assertEqual(raid1.disks, (disk3, disk2))
+        self.assertLess(raid1.size, planner.free[disk2])
+        lvm = planner.multi_disk_plan("lvm")
+        self.assertEqual(lvm.kind, "lvm")
+        self.assertEqual(lvm.disks, (disk3, disk2, disk1))
+        self.assertLess(lvm.size, sum(planner.free.values()))
+        self.assertGreater(lvm.size, planner.disk_plans("lvm")[0].size)
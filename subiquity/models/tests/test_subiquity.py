@@ -14,9 +14,18 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import fnmatch
+import gzip
+import json
+import os
+import tempfile
 import unittest
 
-from subiquity.models.subiquity import SubiquityModel
+from subiquity.models.snaplist import SnapSelection
+from subiquity.models.subiquity import (
+    read_snapshot,
+    SubiquityModel,
+    write_snapshot,
+    )
 
 
 class TestSubiquityModel(unittest.TestCase):
@@ -135,3 +144,42 @@ class TestSubiquityModel(unittest.TestCase):
         self.assertEqual(len(val), 1)
         val = val[0]
         self.assertEqual(val['uri'], mirror_val)
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = os.path.join(tmpdir.name, 'model-snapshot')
+
+    def test_round_trip(self):
+        model = SubiquityModel('test')
+        model.proxy.proxy = 'http://my-proxy'
+        model.mirror.mirror = 'http://my-mirror'
+        model.identity.add_user({
+            'realname': 'Ubuntu', 'username': 'ubuntu',
+            'password': 'crypted', 'hostname': 'host'})
+        model.snaplist.to_install = {
+            'hello': SnapSelection(channel='stable', is_classic=False)}
+        write_snapshot(self.path, model.snapshot())
+        restored = SubiquityModel('test')
+        restored.restore_snapshot(read_snapshot(self.path))
+        self.assertEqual(restored.proxy.proxy, 'http://my-proxy')
+        self.assertEqual(restored.mirror.mirror, 'http://my-mirror')
+        self.assertEqual(restored.identity.user, model.identity.user)
+        self.assertEqual(restored.identity.hostname, 'host')
+        self.assertEqual(
+            restored.snaplist.to_install['hello'].channel, 'stable')
+        self.assertEqual(restored.keyboard.setting, model.keyboard.setting)
+
+    def test_other_version_ignored(self):
+        with gzip.open(self.path, 'wt') as fp:
+            json.dump({'version': -1, 'model': {}}, fp)
+        self.assertIsNone(read_snapshot(self.path))
+
+    def test_missing_or_corrupt(self):
+        self.assertIsNone(read_snapshot(self.path))
+        with open(self.path, 'w') as fp:
+            fp.write('not gzip')
+        self.assertIsNone(read_snapshot(self.path))
@@ -13,6 +13,7 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import asyncio
 import glob
 import json
 import logging
@@ -23,19 +24,55 @@ from urllib.parse import (
     urlencode,
     )
 
+from subiquitycore.async_helpers import run_in_thread
 from subiquitycore.utils import run_command
 
+import requests.exceptions
 import requests_unixsocket
 
 
 log = logging.getLogger('subiquity.snapd')
 
-# Every method in this module blocks. Do not call them from the main thread!
+# Every method in this module blocks, apart from the coroutines (those of
+# AsyncSnapd and the arequest methods). Do not call them from the main
+# thread!
+
+
+async def _read_http_response(reader):
+    # Return the status, reason and body of the HTTP/1.1 response read
+    # from reader.
+    status_line = (await reader.readline()).decode('latin-1').split(None, 2)
+    if len(status_line) < 2 or not status_line[0].startswith('HTTP/'):
+        raise ValueError("bad status line {!r}".format(status_line))
+    status = int(status_line[1])
+    reason = status_line[2].strip() if len(status_line) > 2 else ''
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode('latin-1')
+        if line in ('\r\n', '\n', ''):
+            break
+        name, value = line.split(':', 1)
+        headers[name.strip().lower()] = value.strip()
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readline()
+        body = b''.join(chunks)
+    elif 'content-length' in headers:
+        body = await reader.readexactly(int(headers['content-length']))
+    else:
+        body = await reader.read()
+    return status, reason, body
 
 
 class SnapdConnection:
     def __init__(self, root, sock):
         self.root = root
+        self.sock = sock
         self.url_base = "http+unix://{}/".format(quote_plus(sock))
         self.session = requests_unixsocket.Session()
 
@@ -51,6 +88,33 @@ class SnapdConnection:
             self.url_base + path, data=json.dumps(body),
             timeout=60)
 
+    async def arequest(self, method, path, body=None, **args):
+        """Make a request on the event loop.
+
+        Return the status, reason and (undecoded) body of the response.
+        """
+        if args:
+            path += '?' + urlencode(args)
+        lines = [
+            '{} /{} HTTP/1.1'.format(method, path),
+            'Host: localhost',
+            'Connection: close',
+            ]
+        data = b''
+        if body is not None:
+            data = json.dumps(body).encode('utf-8')
+            lines.extend([
+                'Content-Type: application/json',
+                'Content-Length: {}'.format(len(data)),
+                ])
+        reader, writer = await asyncio.open_unix_connection(self.sock)
+        try:
+            writer.write(
+                ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + data)
+            return await _read_http_response(reader)
+        finally:
+            writer.close()
+
     def configure_proxy(self, proxy):
         log.debug("restarting snapd to pick up proxy config")
         dropin_dir = os.path.join(
@@ -69,6 +133,45 @@ class SnapdConnection:
             run_command(cmd)
 
 
+class AsyncSnapd:
+    """Make snapd requests from coroutines.
+
+    The requests are made on the event loop, so no thread waits for
+    snapd to respond. Decoding the (sometimes quite large) responses is
+    done in the store lane of the pool. Errors are raised as
+    requests.exceptions.RequestException, as the blocking connection
+    methods raise them.
+    """
+
+    timeout = 60
+
+    def __init__(self, connection, pool):
+        self.connection = connection
+        self.pool = pool
+
+    async def _request(self, method, path, body=None, **args):
+        try:
+            status, reason, content = await asyncio.wait_for(
+                self.connection.arequest(method, path, body, **args),
+                self.timeout)
+        except asyncio.TimeoutError:
+            raise requests.exceptions.Timeout(
+                "{} {} timed out".format(method, path))
+        except (OSError, ValueError, asyncio.IncompleteReadError) as e:
+            raise requests.exceptions.ConnectionError(e)
+        if status >= 400:
+            raise requests.exceptions.HTTPError(
+                "{} {} for {}".format(status, reason, path))
+        return await run_in_thread(
+            self.pool, lambda: json.loads(content.decode('utf-8')), 'store')
+
+    def get(self, path, **args):
+        return self._request('GET', path, **args)
+
+    def post(self, path, body, **args):
+        return self._request('POST', path, body, **args)
+
+
 class _FakeFileResponse:
 
     def __init__(self, path):
@@ -77,6 +180,11 @@ class _FakeFileResponse:
     def raise_for_status(self):
         pass
 
+    @property
+    def content(self):
+        with open(self.path, 'rb') as fp:
+            return fp.read()
+
     def json(self):
         with open(self.path) as fp:
             return json.load(fp)
@@ -90,6 +198,10 @@ class _FakeMemoryResponse:
     def raise_for_status(self):
         pass
 
+    @property
+    def content(self):
+        return json.dumps(self.data).encode('utf-8')
+
     def json(self):
         return self.data
 
@@ -124,6 +236,13 @@ class FakeSnapdConnection:
         log.debug("pretending to restart snapd to pick up proxy config")
         time.sleep(2)
 
+    async def arequest(self, method, path, body=None, **args):
+        if method == 'POST':
+            response = self.post(path, body, **args)
+        else:
+            response = self.get(path, **args)
+        return 200, 'OK', response.content
+
     def post(self, path, body, **args):
         if path == "v2/snaps/subiquity" and body['action'] == 'refresh':
             return _FakeMemoryResponse({
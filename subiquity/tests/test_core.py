@@ -0,0 +1,56 @@
+# Copyright 2019 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+from unittest import mock
+
+from subiquitycore.tests import SubiTestCase
+
+from subiquity.core import Subiquity
+from subiquity.models.subiquity import (
+    SubiquityModel,
+    write_snapshot,
+    )
+
+
+class TestMakeModel(SubiTestCase):
+
+    def make_model(self, snapshot):
+        app = Subiquity.__new__(Subiquity)
+        app.snapshot_path = self.tmp_path('model-snapshot')
+        write_snapshot(app.snapshot_path, snapshot)
+        common = {
+            'opts': mock.Mock(dry_run=True, sources=[]),
+            'updated': True,
+            }
+        return app, app.make_model(common)
+
+    def test_restores_snapshot(self):
+        snapshot = SubiquityModel('test').snapshot()
+        snapshot['proxy'] = 'http://my-proxy'
+        app, model = self.make_model(snapshot)
+        self.assertEqual(model.proxy.proxy, 'http://my-proxy')
+        self.assertTrue(os.path.exists(app.snapshot_path))
+
+    def test_bad_snapshot_falls_back_to_probing(self):
+        # Valid json, so read_snapshot returns it, but not a model.
+        snapshot = SubiquityModel('test').snapshot()
+        snapshot['proxy'] = 'http://my-proxy'
+        snapshot['keyboard'] = {'no-such-field': 'us'}
+        with self.assertLogs('subiquity.core', 'ERROR'):
+            app, model = self.make_model(snapshot)
+        self.assertEqual(model.proxy.proxy, '')
+        self.assertIsNone(model.filesystem.probe_data)
+        self.assertFalse(os.path.exists(app.snapshot_path))
@@ -0,0 +1,58 @@
+# Copyright 2019 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import subprocess
+import sys
+import unittest
+
+
+TOP_DIR = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+# What the installer imports before it shows the first screen.
+STARTUP_IMPORTS = ['subiquity.cmd.tui', 'subiquity.controllers']
+
+# Modules that only the views need. Importing any of them at startup
+# means a view (or most of the widget code) is being loaded before its
+# screen is shown.
+VIEW_ONLY_MODULES = (
+    'subiquity.ui.',
+    'subiquitycore.ui.views.',
+    'subiquitycore.ui.form',
+    'subiquitycore.ui.stretchy',
+    )
+
+
+def run_python(*args):
+    return subprocess.run(
+        [sys.executable] + list(args), cwd=TOP_DIR,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True, check=True)
+
+
+class TestStartupImports(unittest.TestCase):
+
+    def test_views_not_imported_at_startup(self):
+        cp = run_python(
+            '-c',
+            'import sys\n'
+            'import {}\n'
+            'print("\\n".join(sys.modules))'.format(
+                ', '.join(STARTUP_IMPORTS)))
+        views = [
+            name for name in cp.stdout.splitlines()
+            if name.startswith(VIEW_ONLY_MODULES)
+            ]
+        self.assertEqual(views, [])
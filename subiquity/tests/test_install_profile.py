@@ -0,0 +1,132 @@
+# Copyright 2019 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+import os
+
+from subiquitycore.tests import SubiTestCase
+
+from subiquity.install_profile import (
+    ETAEstimator,
+    event_time,
+    InstallProfile,
+    load_history,
+    load_profile,
+    stage_durations,
+    )
+
+
+EXAMPLE_EVENTS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+    'examples', 'curtin-events.json')
+
+
+def make_profile(*events):
+    # events are (time, 'start' or 'finish', name)
+    profile = InstallProfile()
+    for t, event_type, name in events:
+        if event_type == 'start':
+            profile.start(name, name, t)
+        else:
+            profile.finish(name, name, 'SUCCESS', t)
+    return profile
+
+
+class TestInstallProfile(SubiTestCase):
+
+    def test_nested_events(self):
+        profile = make_profile(
+            (10, 'start', 'cmd-install'),
+            (10, 'start', 'cmd-install/stage-a'),
+            (11, 'start', 'cmd-install/stage-a/x'),
+            (13, 'finish', 'cmd-install/stage-a/x'),
+            (14, 'finish', 'cmd-install/stage-a'),
+            (14, 'start', 'cmd-install/stage-b'),
+            )
+        self.assertEqual(
+            [(s['name'], s['start'], s['duration'])
+             for s in profile.top_stages()],
+            [('cmd-install/stage-a', 0, 4), ('cmd-install/stage-b', 4, None)])
+        self.assertEqual(profile.total, 4)
+        self.assertEqual(
+            list(stage_durations(profile).values()), [4, 2])
+        self.assertEqual(
+            list(stage_durations(profile, max_depth=1).values()), [4])
+
+    def test_event_time(self):
+        self.assertEqual(
+            event_time({'__MONOTONIC_TIMESTAMP': '2500000'}), 2.5)
+        self.assertEqual(
+            event_time({
+                '__MONOTONIC_TIMESTAMP': (
+                    datetime.timedelta(seconds=3), 'boot-id'),
+                }),
+            3)
+
+    def test_save_load(self):
+        profile = make_profile(
+            (0, 'start', 'cmd-install'),
+            (5, 'finish', 'cmd-install'),
+            )
+        profile.machine = {'arch': 'amd64'}
+        path = self.tmp_path('profile.json')
+        profile.save(path)
+        loaded = load_profile(path)
+        self.assertEqual(loaded.machine, {'arch': 'amd64'})
+        self.assertEqual(loaded.stages, profile.stages)
+
+    def test_journal_export(self):
+        profile = load_profile(EXAMPLE_EVENTS)
+        self.assertEqual(
+            [s['name'] for s in profile.top_stages()][:3],
+            [
+                'cmd-install/stage-early',
+                'cmd-install/stage-partitioning',
+                'cmd-install/stage-network',
+            ])
+        self.assertTrue(
+            all(s['duration'] is not None for s in profile.stages))
+
+    def test_load_history_skips_missing(self):
+        history = load_history([self.tmp_path('nothing'), EXAMPLE_EVENTS])
+        self.assertEqual(len(history), 1)
+
+
+class TestETAEstimator(SubiTestCase):
+
+    def test_no_history(self):
+        self.assertIsNone(ETAEstimator([]).remaining(InstallProfile(), 0))
+
+    def test_remaining(self):
+        history = [
+            make_profile(
+                (0, 'start', 'i/a'), (10, 'finish', 'i/a'),
+                (10, 'start', 'i/b'), (30, 'finish', 'i/b'),
+                ),
+            make_profile(
+                (0, 'start', 'i/a'), (20, 'finish', 'i/a'),
+                (20, 'start', 'i/b'), (60, 'finish', 'i/b'),
+                ),
+            ]
+        estimator = ETAEstimator(history)
+        self.assertEqual(estimator.expected, {'i/a': 15, 'i/b': 30})
+        profile = make_profile((100, 'start', 'i/a'))
+        self.assertEqual(estimator.remaining(profile, 100), 45)
+        self.assertEqual(estimator.remaining(profile, 105), 40)
+        # A stage that overruns counts as having nothing left.
+        self.assertEqual(estimator.remaining(profile, 200), 30)
+        profile.finish('i/a', 'i/a', 'SUCCESS', 112)
+        profile.start('i/b', 'i/b', 112)
+        self.assertEqual(estimator.remaining(profile, 122), 20)
@@ -0,0 +1,125 @@
+# Copyright 2019 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import json
+
+import requests.exceptions
+
+from subiquitycore.executor import LanedExecutor
+from subiquitycore.tests import SubiTestCase
+
+from subiquity.snapd import (
+    AsyncSnapd,
+    SnapdConnection,
+    )
+
+
+class FakeSnapdServer:
+    # Answers each request with the next of responses, and records the
+    # requests it got.
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    async def handle(self, reader, writer):
+        head = await reader.readuntil(b'\r\n\r\n')
+        request_line, *header_lines = head.decode('latin-1').split('\r\n')
+        headers = dict(
+            line.split(': ', 1) for line in header_lines if line)
+        body = await reader.readexactly(
+            int(headers.get('Content-Length', 0)))
+        self.requests.append((request_line, body))
+        writer.write(self.responses.pop(0))
+        writer.close()
+
+
+def http_response(status, body, chunked=False):
+    if chunked:
+        content = b''
+        for i in range(0, len(body), 7):
+            chunk = body[i:i+7]
+            content += b'%x\r\n%s\r\n' % (len(chunk), chunk)
+        content += b'0\r\n\r\n'
+        length = b'Transfer-Encoding: chunked'
+    else:
+        content = body
+        length = b'Content-Length: %d' % len(body)
+    return (
+        b'HTTP/1.1 ' + status + b'\r\n'
+        b'Content-Type: application/json\r\n' + length + b'\r\n\r\n' +
+        content)
+
+
+class TestAsyncSnapd(SubiTestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.pool = LanedExecutor(1)
+        self.snapd = self.make_snapd(self.tmp_path('snapd.socket'))
+        self.listeners = []
+
+    def tearDown(self):
+        for listener in self.listeners:
+            listener.close()
+            self.loop.run_until_complete(listener.wait_closed())
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def make_snapd(self, sock):
+        return AsyncSnapd(SnapdConnection('/', sock), self.pool)
+
+    def serve(self, *responses):
+        # Each server listens on a socket of its own.
+        sock = self.tmp_path('snapd.socket')
+        self.snapd = self.make_snapd(sock)
+        server = FakeSnapdServer(responses)
+        listener = self.loop.run_until_complete(
+            asyncio.start_unix_server(server.handle, path=sock))
+        self.listeners.append(listener)
+        return server
+
+    def test_get(self):
+        data = {'result': [{'name': 'hello'}] * 10}
+        for chunked in False, True:
+            with self.subTest(chunked=chunked):
+                server = self.serve(http_response(
+                    b'200 OK', json.dumps(data).encode(), chunked))
+                result = self.loop.run_until_complete(
+                    self.snapd.get('v2/find', select='refresh'))
+                self.assertEqual(result, data)
+                [(request_line, body)] = server.requests
+                self.assertEqual(
+                    request_line, 'GET /v2/find?select=refresh HTTP/1.1')
+
+    def test_post(self):
+        server = self.serve(http_response(b'202 Accepted', b'{"change": 7}'))
+        result = self.loop.run_until_complete(
+            self.snapd.post('v2/snaps/subiquity', {'action': 'refresh'}))
+        self.assertEqual(result, {'change': 7})
+        [(request_line, body)] = server.requests
+        self.assertEqual(request_line, 'POST /v2/snaps/subiquity HTTP/1.1')
+        self.assertEqual(json.loads(body.decode()), {'action': 'refresh'})
+
+    def test_error_status(self):
+        self.serve(http_response(b'404 Not Found', b'{}'))
+        with self.assertRaises(requests.exceptions.HTTPError):
+            self.loop.run_until_complete(self.snapd.get('v2/snaps/nope'))
+
+    def test_not_running(self):
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.loop.run_until_complete(self.snapd.get('v2/find'))
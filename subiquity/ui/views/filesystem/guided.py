@@ -39,10 +39,8 @@ from subiquitycore.ui.utils import (
     )
 from subiquitycore.view import BaseView
 
-from subiquity.models.filesystem import (
-    DeviceAction,
-    dehumanize_size,
-    )
+from subiquity.models.filesystem import humanize_size
+from subiquity.models.planner import GuidedPlanner
 
 from .helpers import summarize_device
 
@@ -117,13 +115,15 @@ class GuidedDiskSelectionView(BaseView):
         self.method = method
         cancel = cancel_btn(_("Cancel"), on_press=self.cancel)
         rows = []
+        planner = GuidedPlanner(self.model)
+        usable = planner.free
         for disk in self.model.all_disks():
             for obj, cells in summarize_device(disk):
                 wrap = Color.info_minor
                 if obj is disk:
                     start, end = '[', ']'
                     arrow = '\N{BLACK RIGHT-POINTING SMALL TRIANGLE}'
-                    if disk.size >= dehumanize_size("6G"):
+                    if disk in usable:
                         arrow = ClickableIcon(arrow)
                         connect_signal(
                             arrow, 'click', self.choose_disk, disk)
@@ -135,6 +135,10 @@ class GuidedDiskSelectionView(BaseView):
                 rows.append(wrap(TableRow(
                     [Text(start)] + cells + [arrow, Text(end)])))
             rows.append(TableRow([Text("")]))
+        plan = planner.multi_disk_plan(method)
+        if plan is not None:
+            rows.extend(self._plan_rows(plan))
+            rows.append(TableRow([Text("")]))
         super().__init__(screen(
             TableListBox(rows[:-1], spacing=2, colspecs={
                 0: ColSpec(rpad=1),
@@ -149,44 +153,38 @@ class GuidedDiskSelectionView(BaseView):
                 + "\n\n"
                 + _("Choose the disk to install to:"))))
 
+    def _plan_rows(self, plan):
+        if plan.kind == "raid1":
+            label = _("RAID1 mirror of 2 disks")
+        else:
+            label = _("Volume group across {} disks").format(len(plan.disks))
+        arrow = ClickableIcon('\N{BLACK RIGHT-POINTING SMALL TRIANGLE}')
+        connect_signal(arrow, 'click', self.choose_plan, plan)
+        disks = ", ".join(disk.label for disk in plan.disks)
+        return [
+            _wrap_button_row(TableRow([
+                Text('['),
+                (2, Text(label)),
+                Text(""),
+                Text(humanize_size(plan.size), align="right"),
+                arrow,
+                Text(']'),
+                ])),
+            Color.info_minor(TableRow([
+                Text(""),
+                (4, Text(disks)),
+                Text(""),
+                Text(""),
+                ])),
+            ]
+
     def cancel(self, btn=None):
         self.controller.default()
 
     def choose_disk(self, btn, disk):
-        self.controller.reformat(disk)
-        if self.method == "direct":
-            result = {
-                "size": disk.free_for_partitions,
-                "fstype": "ext4",
-                "mount": "/",
-                }
-            self.controller.partition_disk_handler(disk, None, result)
-        elif self.method == 'lvm':
-            if DeviceAction.MAKE_BOOT in disk.supported_actions:
-                self.controller.make_boot_disk(disk)
-            self.controller.create_partition(
-                device=disk, spec=dict(
-                    size=dehumanize_size('1G'),
-                    fstype="ext4",
-                    mount='/boot'
-                    ))
-            part = self.controller.create_partition(
-                device=disk, spec=dict(
-                    size=disk.free_for_partitions,
-                    fstype=None,
-                    ))
-            vg = self.controller.create_volgroup(
-                spec=dict(
-                    name="ubuntu-vg",
-                    devices=set([part]),
-                    ))
-            self.controller.create_logical_volume(
-                vg=vg, spec=dict(
-                    size=dehumanize_size("4G"),
-                    name="ubuntu-lv",
-                    fstype="ext4",
-                    mount="/",
-                    ))
-        else:
-            raise Exception("unknown guided method '{}'".format(self.method))
+        self.controller.guided_layout(disk, self.method)
+        self.controller.manual()
+
+    def choose_plan(self, btn, plan):
+        self.controller.guided_multi_disk_layout(plan)
         self.controller.manual()
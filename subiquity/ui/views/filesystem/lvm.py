@@ -40,7 +40,7 @@ from subiquitycore.ui.stretchy import (
     )
 
 from subiquity.models.filesystem import (
-    get_lvm_size,
+    get_compound_sizes,
     humanize_size,
     )
 from subiquity.ui.views.filesystem.compound import (
@@ -187,7 +187,8 @@ class VolGroupStretchy(Stretchy):
 
     def _change_devices(self, sender, new_devices):
         if len(sender.active_devices) >= 1:
-            self.form.size.value = humanize_size(get_lvm_size(new_devices))
+            self.form.size.value = humanize_size(
+                get_compound_sizes(new_devices)['lvm'])
         else:
             self.form.size.value = '-'
 
@@ -140,6 +140,30 @@ class LVNameEditor(StringEditor, WantsToKnowFormField):
 LVNameField = simple_field(LVNameEditor)
 
 
+class Mountpoints:
+    """What is mounted where, looked up in the model's mount index.
+
+    This behaves like a read-only {path: volume} dict as far as
+    PartitionForm and MountSelector need, ignoring the path that the
+    form is editing.
+    """
+
+    def __init__(self, model, exclude):
+        self.model = model
+        self.exclude = exclude
+
+    def get(self, path):
+        if path is None or path == self.exclude:
+            return None
+        mount = self.model._mount_for_path(path)
+        if mount is None:
+            return None
+        return mount.device.volume
+
+    def __contains__(self, path):
+        return self.get(path) is not None
+
+
 class PartitionForm(Form):
 
     def __init__(self, model, max_size, initial, lvm_names, device):
@@ -151,9 +175,7 @@ class PartitionForm(Form):
             if existing_fs:
                 self.existing_fs_type = existing_fs.fstype
         initial_path = initial.get('mount')
-        self.mountpoints = {
-            m.path: m.device.volume for m in self.model.all_mounts()
-            if m.path != initial_path}
+        self.mountpoints = Mountpoints(self.model, initial_path)
         self.max_size = max_size
         if max_size is not None:
             self.size_str = humanize_size(max_size)
@@ -41,7 +41,7 @@ from subiquitycore.ui.stretchy import (
     )
 
 from subiquity.models.filesystem import (
-    get_raid_size,
+    get_compound_sizes,
     humanize_size,
     raidlevels,
     raidlevels_by_value,
@@ -162,6 +162,8 @@ class RaidStretchy(Stretchy):
 
         form = self.form = RaidForm(
             self.parent.model, possible_components, initial, raid_names)
+        # The size of the RAID at every level, for the selected devices.
+        self.sizes = get_compound_sizes(initial['devices'])
 
         form.devices.widget.set_supports_spares(
             initial['level'].supports_spares)
@@ -182,8 +184,7 @@ class RaidStretchy(Stretchy):
     def _select_level(self, sender, new_level):
         active_device_count = len(self.form.devices.widget.active_devices)
         if active_device_count >= new_level.min_devices:
-            self.form.size.value = humanize_size(
-                get_raid_size(new_level.value, self.form.devices.value))
+            self.form.size.value = humanize_size(self.sizes[new_level.value])
         else:
             self.form.size.value = '-'
         self.form.devices.widget.set_supports_spares(new_level.supports_spares)
@@ -192,9 +193,10 @@ class RaidStretchy(Stretchy):
         self.form.devices.validate()
 
     def _change_devices(self, sender, new_devices):
+        self.sizes = get_compound_sizes(new_devices)
         if len(sender.active_devices) >= self.form.level.value.min_devices:
             self.form.size.value = humanize_size(
-                get_raid_size(self.form.level.value.value, new_devices))
+                self.sizes[self.form.level.value.value])
         else:
             self.form.size.value = '-'
 
@@ -6,7 +6,15 @@ import urwid
 from subiquitycore.testing import view_helpers
 
 from subiquity.controllers.filesystem import FilesystemController
-from subiquity.ui.views.filesystem.guided import GuidedFilesystemView
+from subiquity.models.filesystem import Bootloader
+from subiquity.models.tests.test_filesystem import (
+    make_disk,
+    make_model,
+    )
+from subiquity.ui.views.filesystem.guided import (
+    GuidedDiskSelectionView,
+    GuidedFilesystemView,
+    )
 
 
 class GuidedFilesystemViewTests(unittest.TestCase):
@@ -43,3 +51,35 @@ class GuidedFilesystemViewTests(unittest.TestCase):
         button = view_helpers.find_button_matching(view, "^Back$")
         view_helpers.click(button)
         view.controller.cancel.assert_called_once_with()
+
+
+class GuidedDiskSelectionViewTests(unittest.TestCase):
+
+    def make_view(self, disk_count, method):
+        model = make_model(Bootloader.BIOS)
+        for i in range(disk_count):
+            make_disk(model)
+        controller = mock.create_autospec(spec=FilesystemController)
+        return GuidedDiskSelectionView(model, controller, method)
+
+    def find_text(self, view, text):
+        return view_helpers.find_with_pred(
+            view, lambda w: isinstance(w, urwid.Text) and w.text == text)
+
+    def test_multi_disk_plan_offered(self):
+        view = self.make_view(1, 'direct')
+        self.assertIsNone(self.find_text(view, "RAID1 mirror of 2 disks"))
+        view = self.make_view(2, 'direct')
+        self.assertIsNotNone(self.find_text(view, "RAID1 mirror of 2 disks"))
+        view.render((80, 40))
+        view = self.make_view(3, 'lvm')
+        self.assertIsNotNone(
+            self.find_text(view, "Volume group across 3 disks"))
+
+    def test_choose_plan(self):
+        view = self.make_view(2, 'direct')
+        plan = object()
+        view.choose_plan(None, plan)
+        view.controller.guided_multi_disk_layout.assert_called_once_with(
+            plan)
+        view.controller.manual.assert_called_once_with()
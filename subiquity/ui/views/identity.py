@@ -70,6 +70,22 @@ class UsernameEditor(StringEditor, WantsToKnowFormField):
             return super().valid_char(ch)
 
 
+def read_reserved_usernames():
+    reserved_usernames_path = (
+        os.path.join(os.environ.get("SNAP", "."), "reserved-usernames"))
+    reserved_usernames = set()
+    if os.path.exists(reserved_usernames_path):
+        with open(reserved_usernames_path) as fp:
+            for line in fp:
+                line = line.strip()
+                if line.startswith('#') or not line:
+                    continue
+                reserved_usernames.add(line)
+    else:
+        reserved_usernames.add('root')
+    return reserved_usernames
+
+
 RealnameField = simple_field(RealnameEditor)
 UsernameField = simple_field(UsernameEditor)
 PasswordField = simple_field(PasswordEditor)
@@ -154,19 +170,6 @@ class IdentityView(BaseView):
         self.controller = controller
         self.signal = controller.signal
 
-        reserved_usernames_path = (
-            os.path.join(os.environ.get("SNAP", "."), "reserved-usernames"))
-        reserved_usernames = set()
-        if os.path.exists(reserved_usernames_path):
-            with open(reserved_usernames_path) as fp:
-                for line in fp:
-                    line = line.strip()
-                    if line.startswith('#') or not line:
-                        continue
-                    reserved_usernames.add(line)
-        else:
-            reserved_usernames.add('root')
-
         if model.user:
             initial = {
                 'realname': model.user.realname,
@@ -176,7 +179,7 @@ class IdentityView(BaseView):
         else:
             initial = {}
 
-        self.form = IdentityForm(reserved_usernames, initial)
+        self.form = IdentityForm(read_reserved_usernames(), initial)
 
         connect_signal(self.form, 'submit', self.done)
         setup_password_validation(self.form, _("passwords"))
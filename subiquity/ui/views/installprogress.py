@@ -16,13 +16,20 @@
 import logging
 from urwid import (
     LineBox,
+    ListBox as UrwidListBox,
     Text,
     )
 
 from subiquitycore.view import BaseView
 from subiquitycore.ui.buttons import cancel_btn, ok_btn, other_btn
-from subiquitycore.ui.container import Columns, ListBox, Pile
+from subiquitycore.ui.container import (
+    Columns,
+    ListBox,
+    Pile,
+    ScrollBarListBox,
+    )
 from subiquitycore.ui.form import Toggleable
+from subiquitycore.ui.logwalker import FileLogWalker
 from subiquitycore.ui.spinner import Spinner
 from subiquitycore.ui.utils import button_pile, Padding
 from subiquitycore.ui.width import widget_width
@@ -62,7 +69,12 @@ class ProgressView(BaseView):
         ]
         self.event_pile = Pile(event_body)
 
-        self.log_listbox = ListBox()
+        # curtin produces tens of thousands of lines of output, so they
+        # are kept in a file and only the lines on screen are widgets.
+        # The lines are not selectable, so there is no need for the
+        # focus handling of our ListBox, which looks at every line.
+        self.log_walker = FileLogWalker()
+        self.log_listbox = ScrollBarListBox(UrwidListBox(self.log_walker))
         log_linebox = MyLineBox(self.log_listbox, _("Full installer output"))
         log_body = [
             ('weight', 1, log_linebox),
@@ -94,7 +106,17 @@ class ProgressView(BaseView):
         self._add_line(self.event_listbox, new_line)
 
     def add_log_line(self, text):
-        self._add_line(self.log_listbox, Text(text))
+        self.add_log_lines([text])
+
+    def add_log_lines(self, lines):
+        lb = self.log_listbox.base_widget
+        walker = self.log_walker
+        at_end = len(walker) == 0 or walker.focus == walker.last_position()
+        for line in lines:
+            walker.append(line)
+        if at_end:
+            lb.set_focus(walker.last_position())
+            lb.set_focus_valign('bottom')
 
     def set_status(self, text):
         self.event_linebox.set_title(text)
@@ -142,3 +164,7 @@ class ProgressView(BaseView):
 
     def close_log(self, btn):
         self._w = self.event_pile
+
+    def close(self):
+        # Release the file the full log is kept in.
+        self.log_walker.close()
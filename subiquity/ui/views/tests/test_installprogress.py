@@ -12,7 +12,9 @@ class IdentityViewTests(unittest.TestCase):
     def make_view(self):
         controller = mock.create_autospec(spec=InstallProgressController)
         controller.loop = None
-        return ProgressView(controller)
+        view = ProgressView(controller)
+        self.addCleanup(view.close)
+        return view
 
     def test_initial_focus(self):
         view = self.make_view()
@@ -31,3 +33,10 @@ class IdentityViewTests(unittest.TestCase):
         self.assertIsNot(btn, None)
         view_helpers.click(btn)
         view.controller.click_reboot.assert_called_once_with()
+
+    def test_close(self):
+        view = self.make_view()
+        view.add_log_line("line")
+        view.log_walker[0]
+        view.close()
+        self.assertTrue(view.log_walker._fp.closed)
@@ -0,0 +1,60 @@
+# Copyright 2019 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Helpers for controllers written as coroutines
+
+The urwid main loop runs on the asyncio event loop, so a controller can
+schedule a coroutine with schedule_task() and, in it, await work run in
+the pool with run_in_thread() or a subprocess with
+subiquitycore.utils.arun_command().
+
+"""
+
+import asyncio
+import logging
+
+log = logging.getLogger('subiquitycore.async_helpers')
+
+
+def _task_done(task):
+    if task.cancelled():
+        return
+    exc = task.exception()
+    if exc is not None:
+        # Like an exception in a callback run by the main loop, this
+        # stops the main loop and is raised from it, rather than being
+        # logged when the task is garbage collected.
+        asyncio.get_event_loop().call_exception_handler({
+            'message': "exception in task {}".format(task),
+            'exception': exc,
+            'task': task,
+            })
+
+
+def schedule_task(coro):
+    """Run coro on the event loop, returning a Task for its result.
+
+    An exception raised by coro is treated like one raised by any other
+    callback, i.e. it crashes the process, so be careful!
+    """
+    task = asyncio.ensure_future(coro)
+    task.add_done_callback(_task_done)
+    return task
+
+
+def run_in_thread(pool, func, lane='default'):
+    """Return an awaitable for the result of func() run in a thread of pool.
+    """
+    return asyncio.wrap_future(pool.submit(func, lane))
@@ -16,6 +16,9 @@
 
 from abc import ABC, abstractmethod
 import logging
+import time
+
+from subiquitycore.async_helpers import run_in_thread
 
 log = logging.getLogger("subiquitycore.controller")
 
@@ -42,6 +45,15 @@ class BaseController(ABC):
         self.application = common['application']
         if 'snapd_connection' in common:
             self.snapd_connection = common['snapd_connection']
+        self._prefetched = {}
+        self.answers_applied = False
+
+    def run_in_thread(self, func, lane='default'):
+        """Return an awaitable for the result of func() run in a thread.
+
+        This is the coroutine version of run_in_bg.
+        """
+        return run_in_thread(self.pool, func, lane)
 
     def register_signals(self):
         """Defines signals associated with controller from model."""
@@ -53,6 +65,10 @@ class BaseController(ABC):
     def start(self):
         pass
 
+    def stop(self):
+        """Called when the application exits, to release resources."""
+        pass
+
     @abstractmethod
     def cancel(self):
         pass
@@ -61,6 +77,70 @@ class BaseController(ABC):
     def default(self):
         pass
 
+    def apply_answers(self):
+        """Apply the answers for this screen directly to the model.
+
+        This is called instead of default() when the answers ask for a
+        headless install.  Return True if the screen has been answered
+        and can be skipped or False to show it as usual (which is also
+        what happens when the answers only make sense to the UI).
+
+        Once this has returned True, the application sets
+        answers_applied and skips the screen without calling this again.
+        """
+        return False
+
+    # Building some views takes long enough to be noticed, so they can
+    # be built while the previous screen is showing: the application
+    # calls prefetch() on the controller of the next screen once the
+    # current one has been shown, which calls prefetch_view() for the
+    # views it expects to show, and default() gets them with take_view().
+    # Views are widgets and have to be built on the UI thread, which is
+    # mostly idle while the user reads a screen.
+
+    def prefetch_key(self):
+        """Return a value that changes when the views would be built
+        differently, or None if views should not be prefetched."""
+        return None
+
+    def prefetch(self):
+        pass
+
+    def _view_key(self):
+        key = self.prefetch_key()
+        if key is None:
+            return None
+        # A view's text is translated when it is built, so a view built
+        # before the language was switched is stale too.
+        return (_, key)
+
+    def prefetch_view(self, name, make_view):
+        key = self._view_key()
+        if key is None:
+            return
+        cached = self._prefetched.get(name)
+        if cached is not None and cached[0] == key:
+            return
+        start = time.monotonic()
+        self._prefetched[name] = (key, make_view())
+        log.debug(
+            "prefetched %s view for %s in %.3fs",
+            name, type(self).__name__, time.monotonic() - start)
+
+    def take_view(self, name, make_view):
+        """Return the prefetched view called name, or a new one if there
+        is none or the model has changed since it was built."""
+        cached = self._prefetched.pop(name, None)
+        if cached is not None:
+            if cached[0] == self._view_key():
+                log.debug(
+                    "using prefetched %s view for %s",
+                    name, type(self).__name__)
+                return cached[1]
+            log.debug(
+                "discarding stale %s view for %s", name, type(self).__name__)
+        return make_view()
+
     def serialize(self):
         return None
 
@@ -30,9 +30,6 @@ from subiquitycore.tasksequence import (
     TaskSequence,
     TaskWatcher,
     )
-from subiquitycore.ui.views.network import (
-    NetworkView,
-    )
 from subiquitycore.controller import BaseController
 from subiquitycore.utils import run_command
 from subiquitycore.file_util import write_file
@@ -243,11 +240,14 @@ class NetworkController(BaseController):
     def start_scan(self, dev):
         self.observer.trigger_scan(dev.ifindex)
 
+    def update_has_network(self):
+        self.model.has_network = bool(
+            self.network_event_receiver.default_routes)
+
     def done(self):
         log.debug("NetworkController.done next-screen")
         self.view = None
-        self.model.has_network = bool(
-            self.network_event_receiver.default_routes)
+        self.update_has_network()
         self.signal.emit_signal('next-screen')
 
     def cancel(self):
@@ -343,6 +343,7 @@ class NetworkController(BaseController):
     def default(self):
         if not self.view_shown:
             self.update_initial_configs()
+        from subiquitycore.ui.views.network import NetworkView
         self.view = NetworkView(self.model, self)
         if not self.view_shown:
             self.apply_config(silent=True)
@@ -350,6 +351,20 @@ class NetworkController(BaseController):
         self.network_event_receiver.view = self.view
         self.ui.set_body(self.view)
 
+    def apply_answers(self):
+        # Actions are replayed through the view, so only accepting the
+        # default config can be done headlessly.
+        if not self.answers.get('accept-default', False):
+            return False
+        if not self.view_shown:
+            # has_network is only known once netplan has been applied,
+            # and the install starts as soon as the screens after this
+            # one are answered, so show the screen while the config is
+            # applied: ApplyWatcher moves on (via done()) when it is.
+            return False
+        self.update_has_network()
+        return True
+
     @property
     def netplan_path(self):
         if self.opts.project == "subiquity":
@@ -431,7 +446,9 @@ class NetworkController(BaseController):
 
         if not silent:
             self.view.show_apply_spinner()
-        ts = TaskSequence(self.run_in_bg, tasks, ApplyWatcher(self.view, self))
+        ts = TaskSequence(
+            partial(self.run_in_bg, lane='network'),
+            tasks, ApplyWatcher(self.view, self))
         ts.run()
         if dhcp_device_versions:
             self.dhcp_check_handle = self.loop.set_alarm_in(
@@ -13,20 +13,25 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from concurrent import futures
+import asyncio
 import fcntl
 import json
 import logging
 import os
+import signal
 import struct
 import sys
 import termios
+import threading
+import time
 import tty
 
 import urwid
 import yaml
 
 from subiquitycore.controller import RepeatedController
+from subiquitycore.executor import LanedExecutor
+from subiquitycore.journal import parse_fsync_policy, StateJournal
 from subiquitycore.signals import Signal
 from subiquitycore.prober import Prober, ProberException
 
@@ -42,6 +47,66 @@ class Skip(Exception):
     """Raise this from a controller's default method to skip a screen."""
 
 
+class CompletionQueue:
+    """Run callbacks for finished background work on the UI thread.
+
+    Worker threads add finished futures to a queue and write to a single
+    pipe watched by the main loop, which then runs every callback that
+    is waiting. Only the first completion after a drain writes to the
+    pipe, so a burst of completions costs one wakeup.
+    """
+
+    def __init__(self, loop):
+        self._lock = threading.Lock()
+        self._pending = []
+        self._wakeup_fd = loop.watch_pipe(self._drain)
+        # Counters, see stats().
+        self.completed = 0
+        self.drains = 0
+        self.max_depth = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def put(self, callback, fut):
+        """Arrange for callback(fut) to be called on the UI thread.
+
+        Can be called from any thread.
+        """
+        with self._lock:
+            self._pending.append((callback, fut, time.monotonic()))
+            wakeup = len(self._pending) == 1
+        if wakeup:
+            os.write(self._wakeup_fd, b'x')
+
+    def _drain(self, ignored):
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return
+        self.drains += 1
+        self.max_depth = max(self.max_depth, len(batch))
+        for callback, fut, queued in batch:
+            latency = time.monotonic() - queued
+            self.completed += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+            callback(fut)
+        if len(batch) > 1:
+            log.debug("ran %d background callbacks in one batch", len(batch))
+
+    def stats(self):
+        mean = 0.0
+        if self.completed:
+            mean = self.total_latency / self.completed
+        return {
+            'completed': self.completed,
+            'drains': self.drains,
+            'max_depth': self.max_depth,
+            'mean_latency': mean,
+            'max_latency': self.max_latency,
+            }
+
+
 # From uapi/linux/kd.h:
 KDGKBTYPE = 0x4B33  # get keyboard type
 
@@ -258,7 +323,7 @@ class Application:
         if opts.dry_run:
             self.root = '.subiquity'
         self.state_dir = os.path.join(self.root, 'run', self.project)
-        os.makedirs(os.path.join(self.state_dir, 'states'), exist_ok=True)
+        os.makedirs(self.state_dir, exist_ok=True)
 
         answers = {}
         if opts.answers is not None:
@@ -283,8 +348,9 @@ class Application:
             "signal": Signal(),
             "prober": prober,
             "loop": None,
-            "pool": futures.ThreadPoolExecutor(10),
+            "pool": LanedExecutor(10),
             "answers": answers,
+            "headless": bool(answers.get('headless', False)),
             "input_filter": input_filter,
             "scale_factor": scale,
             "run_in_bg": self.run_in_bg,
@@ -297,24 +363,40 @@ class Application:
         ui.progress_completion = len(self.controllers)
         self.common['controllers'] = dict.fromkeys(self.controllers)
         self.controller_index = -1
-
-    def run_in_bg(self, func, callback):
+        self._completions = None
+        # The state of each controller and the last screen shown, so
+        # that the install can carry on where it was after a refresh.
+        self.journal = StateJournal(
+            os.path.join(self.state_dir, 'state-journal'),
+            self.common['pool'],
+            parse_fsync_policy(
+                os.environ.get('SUBIQUITY_STATE_FSYNC', 'always')))
+        if not updated:
+            self.journal.reset()
+
+    def run_in_bg(self, func, callback, lane='default'):
         """Run func() in a thread and call callback on UI thread.
 
         callback will be passed a concurrent.futures.Future containing
         the result of func(). The result of callback is discarded. An
         exception will crash the process so be careful!
-        """
-        fut = self.common['pool'].submit(func)
 
-        def in_main_thread(ignored):
-            callback(fut)
-
-        pipe = self.common['loop'].watch_pipe(in_main_thread)
-
-        def in_random_thread(ignored):
-            os.write(pipe, b'x')
-        fut.add_done_callback(in_random_thread)
+        lane is the lane of the pool to run func() in, see
+        subiquitycore.executor. Slow work should not go in the default
+        lane.
+        """
+        if self._completions is None:
+            self._completions = CompletionQueue(self.common['loop'])
+        fut = self.common['pool'].submit(func, lane)
+        completions = self._completions
+        fut.add_done_callback(lambda fut: completions.put(callback, fut))
+
+    def dump_bg_stats(self):
+        """Log what the background threads are up to (on SIGUSR1)."""
+        self.common['pool'].dump()
+        if self._completions is not None:
+            log.debug(
+                "background callback stats: %s", self._completions.stats())
 
     def _connect_base_signals(self):
         """ Connect signals used in the core controller
@@ -339,10 +421,33 @@ class Application:
             return
         cur_controller_name = self.controllers[self.controller_index]
         cur_controller = self.common['controllers'][cur_controller_name]
-        state_path = os.path.join(
-            self.state_dir, 'states', cur_controller_name)
-        with open(state_path, 'w') as fp:
-            json.dump(cur_controller.serialize(), fp)
+        self.journal.put(
+            'states/' + cur_controller_name, cur_controller.serialize())
+
+    def load_state(self):
+        """Return the state saved by save_state before a refresh.
+
+        The keys are 'states/<controller name>' and 'last-screen'.
+        """
+        if os.path.exists(self.journal.path):
+            return self.journal.load()
+        # A version from before the journal was introduced saved the
+        # state in a file per controller.
+        state = {}
+        states_dir = os.path.join(self.state_dir, 'states')
+        if os.path.isdir(states_dir):
+            for name in os.listdir(states_dir):
+                with open(os.path.join(states_dir, name)) as fp:
+                    state['states/' + name] = json.load(fp)
+        state_path = os.path.join(self.state_dir, 'last-screen')
+        if os.path.exists(state_path):
+            with open(state_path) as fp:
+                state['last-screen'] = fp.read().strip()
+        log.debug("loaded %d items of legacy state", len(state))
+        self.journal.reset()
+        for key, value in state.items():
+            self.journal.put(key, value)
+        return state
 
     def select_screen(self, index):
         self.controller_index = index
@@ -350,10 +455,31 @@ class Application:
         controller_name = self.controllers[self.controller_index]
         log.debug("moving to screen %s", controller_name)
         controller = self.common['controllers'][controller_name]
+        if self.common['headless'] and self._answered(controller):
+            log.debug("answered screen %s headlessly", controller_name)
+            self.save_state()
+            raise Skip()
         controller.default()
-        state_path = os.path.join(self.state_dir, 'last-screen')
-        with open(state_path, 'w') as fp:
-            fp.write(controller_name)
+        self.journal.put('last-screen', controller_name)
+        if index + 1 < len(self.controllers):
+            # Give the screen a chance to be drawn first.
+            self.common['loop'].set_alarm_in(
+                0.1, lambda loop, ud: self._prefetch_next(index))
+
+    def _answered(self, controller):
+        # Answers are only applied once: going back over a screen that
+        # has been answered must not apply them again (for Filesystem,
+        # that would start the install a second time).
+        if not controller.answers_applied:
+            controller.answers_applied = controller.apply_answers()
+        return controller.answers_applied
+
+    def _prefetch_next(self, index):
+        if self.controller_index != index:
+            # Moved on already.
+            return
+        controller_name = self.controllers[index + 1]
+        self.common['controllers'][controller_name].prefetch()
 
     def next_screen(self, *args):
         self.save_state()
@@ -472,7 +598,9 @@ class Application:
             self.common['loop'] = urwid.MainLoop(
                 self.common['ui'], palette=palette, screen=screen,
                 handle_mouse=False, pop_ups=True,
-                input_filter=self.common['input_filter'].filter)
+                input_filter=self.common['input_filter'].filter,
+                event_loop=urwid.AsyncioEventLoop(
+                    loop=asyncio.get_event_loop()))
 
             log.debug("Running event loop: {}".format(
                 self.common['loop'].event_loop))
@@ -502,20 +630,13 @@ class Application:
             initial_controller_index = 0
 
             if self.common['updated']:
+                state = self.load_state()
                 for k in self.controllers:
-                    state_path = os.path.join(self.state_dir, 'states', k)
-                    if not os.path.exists(state_path):
-                        continue
-                    with open(state_path) as fp:
-                        self.common['controllers'][k].deserialize(
-                            json.load(fp))
-
-                last_screen = None
-                state_path = os.path.join(self.state_dir, 'last-screen')
-                if os.path.exists(state_path):
-                    with open(state_path) as fp:
-                        last_screen = fp.read().strip()
+                    key = 'states/' + k
+                    if key in state:
+                        self.common['controllers'][k].deserialize(state[key])
 
+                last_screen = state.get('last-screen')
                 if last_screen in self.controllers:
                     initial_controller_index = self.controllers.index(
                         last_screen)
@@ -529,6 +650,8 @@ class Application:
             self.common['loop'].set_alarm_in(
                 0.05, select_initial_screen, initial_controller_index)
             self._connect_base_signals()
+            asyncio.get_event_loop().add_signal_handler(
+                signal.SIGUSR1, self.dump_bg_stats)
 
             for k in self.controllers:
                 self.common['controllers'][k].start()
@@ -538,8 +661,8 @@ class Application:
             log.exception("Exception in controller.run():")
             raise
         finally:
-            # concurrent.futures.ThreadPoolExecutor tries to join all
-            # threads before exiting. We don't want that and this
-            # ghastly hack prevents it.
-            from concurrent.futures import thread
-            thread._threads_queues = {}
+            for controller in self.common['controllers'].values():
+                if controller is not None:
+                    controller.stop()
+            self.journal.close()
+            self.dump_bg_stats()
@@ -0,0 +1,167 @@
+# Copyright 2019 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" A thread pool with lanes
+
+Background work is submitted to a named lane. Each lane has a limit on
+how many of its jobs can run at once and a priority, and when a worker
+thread becomes free it takes the oldest job from the highest priority
+lane that is under its limit. Keeping the limits of the lanes that do
+slow work (probing storage, talking to the store, ...) below the number
+of workers means that something is always left for the default lane,
+which is where short, UI driven, work goes.
+
+"""
+
+import collections
+from concurrent import futures
+import logging
+import threading
+import time
+
+log = logging.getLogger('subiquitycore.executor')
+
+
+Lane = collections.namedtuple('Lane', ['name', 'max_workers', 'priority'])
+
+
+# Lower priorities are run first.
+DEFAULT_LANES = [
+    Lane('default', 10, 0),
+    Lane('network', 2, 1),
+    Lane('install', 3, 1),
+    Lane('store', 2, 2),
+    Lane('probe', 2, 3),
+    ]
+
+
+class _LaneState:
+
+    def __init__(self, lane):
+        self.lane = lane
+        self.pending = collections.deque()
+        self.running = 0
+        self.submitted = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+        self.max_run = 0.0
+
+    def stats(self):
+        mean_wait = mean_run = 0.0
+        if self.completed:
+            mean_wait = self.total_wait / self.completed
+            mean_run = self.total_run / self.completed
+        return {
+            'queued': len(self.pending),
+            'running': self.running,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'mean_wait': mean_wait,
+            'max_wait': self.max_wait,
+            'mean_run': mean_run,
+            'max_run': self.max_run,
+            }
+
+
+class LanedExecutor:
+
+    def __init__(self, max_workers=10, lanes=DEFAULT_LANES):
+        self._cond = threading.Condition()
+        self._lanes = {lane.name: _LaneState(lane) for lane in lanes}
+        self._by_priority = sorted(
+            self._lanes.values(), key=lambda state: state.lane.priority)
+        self._max_workers = max_workers
+        self._threads = []
+        self._idle = 0
+
+    def submit(self, func, lane='default'):
+        """Run func() in a worker thread, returning a Future for its result.
+        """
+        fut = futures.Future()
+        with self._cond:
+            state = self._lanes[lane]
+            state.pending.append((func, fut, time.monotonic()))
+            state.submitted += 1
+            if self._idle == 0 and len(self._threads) < self._max_workers:
+                t = threading.Thread(
+                    target=self._worker, name='worker-{}'.format(
+                        len(self._threads)))
+                t.daemon = True
+                self._threads.append(t)
+                t.start()
+            else:
+                self._cond.notify()
+        return fut
+
+    def _next_job(self):
+        # Called with self._cond held.
+        for state in self._by_priority:
+            if state.pending and state.running < state.lane.max_workers:
+                state.running += 1
+                return state, state.pending.popleft()
+        return None, None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                state, job = self._next_job()
+                while job is None:
+                    self._idle += 1
+                    self._cond.wait()
+                    self._idle -= 1
+                    state, job = self._next_job()
+            func, fut, queued = job
+            start = time.monotonic()
+            if fut.set_running_or_notify_cancel():
+                try:
+                    result = func()
+                except BaseException as e:
+                    fut.set_exception(e)
+                else:
+                    fut.set_result(result)
+            end = time.monotonic()
+            wait, run = start - queued, end - start
+            log.debug(
+                "%s lane job %s waited %.3fs ran %.3fs",
+                state.lane.name, getattr(func, '__name__', func), wait, run)
+            with self._cond:
+                state.running -= 1
+                state.completed += 1
+                state.total_wait += wait
+                state.max_wait = max(state.max_wait, wait)
+                state.total_run += run
+                state.max_run = max(state.max_run, run)
+                # This thread may take a job from another lane next, so
+                # wake an idle one in case this lane has more waiting.
+                self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                name: state.stats() for name, state in self._lanes.items()}
+
+    def dump(self):
+        stats = self.stats()
+        lines = ["executor lanes ({} threads):".format(len(self._threads))]
+        for name in sorted(stats):
+            lines.append(
+                " {name}: queued {queued} running {running} "
+                "completed {completed}/{submitted} "
+                "wait mean {mean_wait:.3f}s max {max_wait:.3f}s "
+                "run mean {mean_run:.3f}s max {max_run:.3f}s".format(
+                    name=name, **stats[name]))
+        log.debug("\n".join(lines))
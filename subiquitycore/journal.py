@@ -0,0 +1,186 @@
+# Copyright 2019 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" An append-only journal of key/value state
+
+Each put() appends a line of JSON to the journal file and a later line
+for a key replaces an earlier one, so reading the state back is one
+pass over the file. The value is encoded when put() is called but the
+writing is done in the pool: puts made while a write is waiting are
+written together, in order. When the file has many more records than
+keys it is rewritten with just the latest record for each key.
+
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger('subiquitycore.journal')
+
+
+# The journal is compacted when it has more than this many records and
+# more than COMPACT_RATIO records per key.
+COMPACT_MIN_RECORDS = 64
+COMPACT_RATIO = 4
+
+
+def parse_fsync_policy(policy):
+    """Turn "always", "never" or a number of seconds into an interval.
+
+    The journal fsyncs after every batch with an interval of 0, at
+    most once every interval seconds otherwise and never for None.
+    """
+    if policy == 'always':
+        return 0
+    elif policy == 'never':
+        return None
+    try:
+        interval = float(policy)
+    except ValueError:
+        raise Exception("unknown fsync policy {!r}".format(policy))
+    if interval < 0:
+        raise Exception("unknown fsync policy {!r}".format(policy))
+    return interval
+
+
+class StateJournal:
+
+    def __init__(self, path, pool, fsync_interval=0):
+        self.path = path
+        self.pool = pool
+        self.fsync_interval = fsync_interval
+        # _lock protects _pending, _write_lock everything to do with
+        # the file, and is taken first.
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pending = []  # [(key, encoded record)]
+        self._latest = {}  # {key: encoded record}, as written
+        self._records = 0  # records in the file
+        self._last_fsync = 0.0
+        self._fp = None
+        self.batches = 0
+        self.compactions = 0
+
+    def load(self):
+        """Read the journal, returning the latest value of every key.
+
+        New records are then appended to what was read.
+        """
+        state = {}
+        with self._write_lock:
+            self._close()
+            self._latest = {}
+            self._records = 0
+            try:
+                fp = open(self.path)
+            except FileNotFoundError:
+                return state
+            with fp:
+                for line in fp:
+                    try:
+                        key, value = json.loads(line)
+                    except ValueError:
+                        # Most likely the last record was cut short by a
+                        # crash, skip it.
+                        log.warning("skipping bad record in %s", self.path)
+                        continue
+                    state[key] = value
+                    self._latest[key] = line.rstrip('\n')
+                    self._records += 1
+        return state
+
+    def reset(self):
+        """Forget everything in the journal."""
+        with self._write_lock:
+            with self._lock:
+                self._pending = []
+            self._close()
+            self._latest = {}
+            self._records = 0
+            with open(self.path, 'w'):
+                pass
+
+    def put(self, key, value):
+        record = json.dumps([key, value])
+        with self._lock:
+            self._pending.append((key, record))
+            schedule = len(self._pending) == 1
+        if schedule:
+            self.pool.submit(self._bg_flush)
+
+    def _bg_flush(self):
+        try:
+            self.flush()
+        except Exception:
+            log.exception("writing %s failed", self.path)
+
+    def flush(self):
+        """Write out everything that has been put so far."""
+        with self._write_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return
+            if self._fp is None:
+                self._fp = open(self.path, 'a')
+            self._fp.write(
+                ''.join(record + '\n' for key, record in batch))
+            self._fp.flush()
+            for key, record in batch:
+                self._latest[key] = record
+            self._records += len(batch)
+            self.batches += 1
+            self._maybe_fsync(self._fp)
+            if self._records > max(
+                    COMPACT_MIN_RECORDS, COMPACT_RATIO * len(self._latest)):
+                self._compact()
+
+    def _maybe_fsync(self, fp, force=False):
+        if self.fsync_interval is None:
+            return
+        now = time.monotonic()
+        if force or now - self._last_fsync >= self.fsync_interval:
+            os.fsync(fp.fileno())
+            self._last_fsync = now
+
+    def _compact(self):
+        log.debug(
+            "compacting %s from %d to %d records",
+            self.path, self._records, len(self._latest))
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as fp:
+            fp.write(
+                ''.join(record + '\n' for record in self._latest.values()))
+            fp.flush()
+            # Unless fsyncing is off altogether, the new file must be on
+            # disk before it replaces the old one.
+            self._maybe_fsync(fp, force=self.fsync_interval is not None)
+        self._close()
+        os.rename(tmp, self.path)
+        self._records = len(self._latest)
+        self.compactions += 1
+
+    def _close(self):
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+    def close(self):
+        self.flush()
+        with self._write_lock:
+            self._close()
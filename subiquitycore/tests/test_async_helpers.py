@@ -0,0 +1,58 @@
+# Copyright 2019 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+
+from subiquitycore.async_helpers import run_in_thread, schedule_task
+from subiquitycore.executor import LanedExecutor
+from subiquitycore.tests import SubiTestCase
+from subiquitycore.utils import arun_command
+
+
+class TestAsyncHelpers(SubiTestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def test_run_in_thread(self):
+        pool = LanedExecutor(1)
+        result = self.loop.run_until_complete(
+            run_in_thread(pool, lambda: 42, 'probe'))
+        self.assertEqual(result, 42)
+
+    def test_task_exception_goes_to_handler(self):
+        contexts = []
+        self.loop.set_exception_handler(
+            lambda loop, context: contexts.append(context))
+
+        async def fail():
+            1/0
+
+        task = schedule_task(fail())
+        self.loop.run_until_complete(asyncio.wait([task]))
+        self.loop.run_until_complete(asyncio.sleep(0))
+        [context] = contexts
+        self.assertIsInstance(context['exception'], ZeroDivisionError)
+
+    def test_arun_command(self):
+        cp = self.loop.run_until_complete(
+            arun_command(['cat'], input='hello'))
+        self.assertEqual(cp.returncode, 0)
+        self.assertEqual(cp.stdout, 'hello')
@@ -0,0 +1,141 @@
+# Copyright 2019 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from collections import defaultdict
+from concurrent import futures
+import os
+import threading
+from unittest import mock
+
+from subiquitycore.controller import BaseController
+from subiquitycore.core import Application, CompletionQueue
+from subiquitycore.tests import SubiTestCase
+
+
+class FakeLoop:
+    def __init__(self):
+        self.watches = []
+
+    def watch_pipe(self, callback):
+        r, w = os.pipe()
+        self.watches.append((r, callback))
+        return w
+
+    def run_pending(self):
+        for r, callback in self.watches:
+            callback(os.read(r, 4096))
+
+
+def done_future(result):
+    fut = futures.Future()
+    fut.set_result(result)
+    return fut
+
+
+class TestCompletionQueue(SubiTestCase):
+
+    def setUp(self):
+        self.loop = FakeLoop()
+        self.queue = CompletionQueue(self.loop)
+
+    def tearDown(self):
+        for r, callback in self.loop.watches:
+            os.close(r)
+
+    def test_burst_is_one_wakeup(self):
+        results = []
+        for i in range(10):
+            self.queue.put(
+                lambda fut: results.append(fut.result()), done_future(i))
+        [(r, callback)] = self.loop.watches
+        self.assertEqual(os.read(r, 4096), b'x')
+        callback(b'x')
+        self.assertEqual(results, list(range(10)))
+        stats = self.queue.stats()
+        self.assertEqual(stats['completed'], 10)
+        self.assertEqual(stats['drains'], 1)
+        self.assertEqual(stats['max_depth'], 10)
+
+    def test_put_from_threads(self):
+        results = []
+        threads = [
+            threading.Thread(
+                target=self.queue.put,
+                args=(lambda fut: results.append(fut.result()),
+                      done_future(i)))
+            for i in range(20)
+            ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.loop.run_pending()
+        self.assertEqual(sorted(results), list(range(20)))
+        self.assertEqual(len(self.loop.watches), 1)
+
+
+class FakeController(BaseController):
+
+    def __init__(self, common, answered):
+        super().__init__(common)
+        self.answered = answered
+        self.applied = 0
+        self.shown = 0
+
+    def apply_answers(self):
+        self.applied += 1
+        return self.answered
+
+    def default(self):
+        self.shown += 1
+
+    def cancel(self):
+        pass
+
+    def serialize(self):
+        return None
+
+
+def make_headless_app(answered):
+    app = Application.__new__(Application)
+    common = defaultdict(type(None))
+    common['ui'] = mock.Mock()
+    common['loop'] = mock.Mock()
+    common['headless'] = True
+    app.common = common
+    app.controllers = list(answered)
+    common['controllers'] = {
+        name: FakeController(common, a) for name, a in answered.items()}
+    app.controller_index = -1
+    app.journal = mock.Mock()
+    return app
+
+
+class TestHeadless(SubiTestCase):
+
+    def test_answers_applied_once(self):
+        app = make_headless_app({'A': False, 'B': True, 'C': False})
+        a, b, c = [app.common['controllers'][n] for n in 'ABC']
+        app.next_screen()
+        app.next_screen()
+        self.assertEqual(app.controller_index, 2)
+        self.assertEqual((b.applied, b.shown), (1, 0))
+        app.prev_screen()
+        self.assertEqual(app.controller_index, 0)
+        self.assertEqual((b.applied, b.shown), (1, 0))
+        app.next_screen()
+        self.assertEqual(app.controller_index, 2)
+        self.assertEqual((b.applied, b.shown), (1, 0))
+        self.assertEqual((c.applied, c.shown), (2, 2))
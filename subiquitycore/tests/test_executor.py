@@ -0,0 +1,57 @@
+# Copyright 2019 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+
+from subiquitycore.executor import Lane, LanedExecutor
+from subiquitycore.tests import SubiTestCase
+
+
+class TestLanedExecutor(SubiTestCase):
+
+    def test_result_and_exception(self):
+        executor = LanedExecutor(2)
+        self.assertEqual(executor.submit(lambda: 1).result(timeout=5), 1)
+        fut = executor.submit(lambda: 1/0, 'probe')
+        self.assertIsInstance(fut.exception(timeout=5), ZeroDivisionError)
+        stats = executor.stats()
+        self.assertEqual(stats['default']['completed'], 1)
+        self.assertEqual(stats['probe']['completed'], 1)
+
+    def test_lane_limit_leaves_room_for_default(self):
+        executor = LanedExecutor(
+            2, [Lane('default', 2, 0), Lane('slow', 1, 1)])
+        release = threading.Event()
+        slow = [executor.submit(release.wait, 'slow') for _ in range(3)]
+        # Only one slow job can run, so this does not have to wait for
+        # any of them.
+        self.assertEqual(executor.submit(lambda: 'quick').result(timeout=5),
+                         'quick')
+        self.assertEqual(executor.stats()['slow']['running'], 1)
+        release.set()
+        for fut in slow:
+            self.assertTrue(fut.result(timeout=5))
+
+    def test_priority(self):
+        executor = LanedExecutor(1, [Lane('high', 1, 0), Lane('low', 1, 1)])
+        release = threading.Event()
+        order = []
+        blocker = executor.submit(release.wait, 'low')
+        low = executor.submit(lambda: order.append('low'), 'low')
+        high = executor.submit(lambda: order.append('high'), 'high')
+        release.set()
+        for fut in blocker, low, high:
+            fut.result(timeout=5)
+        self.assertEqual(order, ['high', 'low'])
@@ -0,0 +1,107 @@
+# Copyright 2019 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from subiquitycore.journal import (
+    COMPACT_MIN_RECORDS,
+    parse_fsync_policy,
+    StateJournal,
+    )
+from subiquitycore.tests import SubiTestCase
+
+
+class FakePool:
+    # Runs submitted functions when asked to.
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, func, lane='default'):
+        self.jobs.append(func)
+
+    def run_jobs(self):
+        jobs, self.jobs = self.jobs, []
+        for job in jobs:
+            job()
+
+
+class TestStateJournal(SubiTestCase):
+
+    def setUp(self):
+        self.pool = FakePool()
+        self.path = self.tmp_path('state-journal')
+
+    def make_journal(self, fsync_interval=0):
+        journal = StateJournal(self.path, self.pool, fsync_interval)
+        journal.reset()
+        return journal
+
+    def test_round_trip(self):
+        journal = self.make_journal()
+        journal.put('states/Keyboard', {'layout': 'us'})
+        journal.put('last-screen', 'Keyboard')
+        journal.put('last-screen', 'Network')
+        self.pool.run_jobs()
+        self.assertEqual(
+            StateJournal(self.path, self.pool).load(),
+            {'states/Keyboard': {'layout': 'us'}, 'last-screen': 'Network'})
+
+    def test_puts_are_batched(self):
+        journal = self.make_journal()
+        for i in range(5):
+            journal.put('last-screen', i)
+        self.assertEqual(len(self.pool.jobs), 1)
+        with open(self.path) as fp:
+            self.assertEqual(fp.read(), '')
+        self.pool.run_jobs()
+        self.assertEqual(journal.batches, 1)
+        journal.put('last-screen', 5)
+        self.assertEqual(len(self.pool.jobs), 1)
+
+    def test_value_encoded_at_put(self):
+        journal = self.make_journal()
+        value = {'a': 1}
+        journal.put('k', value)
+        value['a'] = 2
+        journal.flush()
+        self.assertEqual(journal.load(), {'k': {'a': 1}})
+
+    def test_truncated_record_skipped(self):
+        journal = self.make_journal()
+        journal.put('a', 1)
+        journal.put('b', 2)
+        journal.flush()
+        with open(self.path, 'a') as fp:
+            fp.write('["a", ')
+        self.assertEqual(journal.load(), {'a': 1, 'b': 2})
+
+    def test_compaction(self):
+        journal = self.make_journal(fsync_interval=None)
+        for i in range(COMPACT_MIN_RECORDS + 1):
+            journal.put('last-screen', i)
+            journal.flush()
+        self.assertEqual(journal.compactions, 1)
+        with open(self.path) as fp:
+            self.assertEqual(len(fp.readlines()), 1)
+        journal.put('b', 'c')
+        journal.close()
+        self.assertEqual(
+            journal.load(),
+            {'last-screen': COMPACT_MIN_RECORDS, 'b': 'c'})
+
+    def test_fsync_policy(self):
+        self.assertEqual(parse_fsync_policy('always'), 0)
+        self.assertIsNone(parse_fsync_policy('never'))
+        self.assertEqual(parse_fsync_policy('2.5'), 2.5)
+        with self.assertRaises(Exception):
+            parse_fsync_policy('sometimes')
@@ -459,18 +459,24 @@ class ScrollBarListBox(urwid.WidgetDecoration):
             offset, inset = lb.get_focus_offset_inset((maxcol - 1, maxrow))
             visible = lb.ends_visible((maxcol - 1, maxrow), focus)
 
-            seen_focus = False
-            height = height_before_focus = 0
-            focus_widget, focus_pos = lb.body.get_focus()
-            # Scan through the rows calculating total height and the
-            # height of the rows before the focus widget.
-            for widget in lb.body:
-                rows = widget.rows((maxcol - 1,))
-                if widget is focus_widget:
-                    seen_focus = True
-                elif not seen_focus:
-                    height_before_focus += rows
-                height += rows
+            estimate_rows = getattr(lb.body, 'estimate_rows', None)
+            if estimate_rows is not None:
+                # A walker that is too long to scan can say roughly
+                # where the focus is instead.
+                height_before_focus, height = estimate_rows(maxcol - 1)
+            else:
+                seen_focus = False
+                height = height_before_focus = 0
+                focus_widget, focus_pos = lb.body.get_focus()
+                # Scan through the rows calculating total height and the
+                # height of the rows before the focus widget.
+                for widget in lb.body:
+                    rows = widget.rows((maxcol - 1,))
+                    if widget is focus_widget:
+                        seen_focus = True
+                    elif not seen_focus:
+                        height_before_focus += rows
+                    height += rows
 
             # Calculate the number of rows off the top and bottom of
             # the listbox.
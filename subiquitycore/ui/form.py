@@ -452,6 +452,19 @@ class Form(object, metaclass=MetaForm):
         else:
             self.buttons.base_widget.contents[0][0].enabled = True
 
+    def errors(self):
+        """Return {field name: error} for the fields that are not valid.
+
+        This checks the same things as the form does as values are
+        entered, for when the values do not come from the user.
+        """
+        r = {}
+        for bf in self._fields:
+            error = bf._validate()
+            if error is not None:
+                r[bf.field.name] = error
+        return r
+
     def as_data(self):
         data = {}
         for field in self._fields:
@@ -0,0 +1,157 @@
+# Copyright 2019 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" A list walker for long logs
+
+FileLogWalker appends the lines it is given to a file and only keeps
+the offset of each line in memory. When a ListBox asks for a line, it
+is read back from the file (which is memory mapped) and a Text widget
+made for it, and only the widgets for recently shown lines are kept.
+So a log of a hundred thousand lines costs a few hundred kilobytes
+rather than a widget per line.
+
+"""
+
+import array
+import collections
+import mmap
+import tempfile
+
+import urwid
+
+
+class FileLogWalker(urwid.ListWalker):
+    """A walker over the lines of a log, with the last line at the bottom.
+
+    Positions are line numbers, counting from the first line ever
+    appended. Only the last max_lines lines can be shown: when there
+    are more the oldest ones are dropped (from the walker, the file
+    keeps everything).
+    """
+
+    def __init__(self, fp=None, *, max_lines=100000, cache_size=200):
+        if fp is None:
+            fp = tempfile.TemporaryFile()
+        self._fp = fp
+        self._mmap = None
+        self._size = 0  # bytes written to _fp
+        self._dirty = False  # written but not flushed
+        self._offsets = array.array('Q')  # where each line starts in _fp
+        self._first = 0  # position of the line at _offsets[0]
+        self._widgets = collections.OrderedDict()  # {position: Text}
+        self.max_lines = max_lines
+        self.cache_size = cache_size
+        self.focus = None
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def first_position(self):
+        return self._first
+
+    def last_position(self):
+        return self._first + len(self._offsets) - 1
+
+    def append(self, text):
+        offset = self._size
+        chunks = []
+        for line in text.splitlines() or ['']:
+            chunk = line.encode('utf-8', 'replace') + b'\n'
+            self._offsets.append(offset)
+            offset += len(chunk)
+            chunks.append(chunk)
+        self._fp.write(b''.join(chunks))
+        self._size = offset
+        self._dirty = True
+        # Dropping lines from the front of _offsets is a copy, so do it
+        # in chunks rather than for every line.
+        excess = len(self._offsets) - self.max_lines
+        if excess > self.max_lines // 10:
+            del self._offsets[:excess]
+            self._first += excess
+            for pos in list(self._widgets):
+                if pos < self._first:
+                    del self._widgets[pos]
+        if self.focus is None or self.focus < self._first:
+            self.focus = self._first
+        self._modified()
+
+    def _read_line(self, i):
+        if self._dirty:
+            self._fp.flush()
+            self._dirty = False
+        start = self._offsets[i]
+        if i + 1 < len(self._offsets):
+            end = self._offsets[i + 1] - 1
+        else:
+            end = self._size - 1
+        if self._mmap is None or len(self._mmap) < end:
+            # The file has grown since it was mapped.
+            if self._mmap is not None:
+                self._mmap.close()
+            self._mmap = mmap.mmap(
+                self._fp.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap[start:end].decode('utf-8', 'replace')
+
+    def __getitem__(self, position):
+        if not isinstance(position, int):
+            raise IndexError(position)
+        w = self._widgets.get(position)
+        if w is not None:
+            self._widgets.move_to_end(position)
+            return w
+        i = position - self._first
+        if not 0 <= i < len(self._offsets):
+            raise IndexError(position)
+        w = self._widgets[position] = urwid.Text(self._read_line(i))
+        if len(self._widgets) > self.cache_size:
+            self._widgets.popitem(last=False)
+        return w
+
+    def set_focus(self, position):
+        self.focus = position
+        self._modified()
+
+    def next_position(self, position):
+        if position >= self.last_position():
+            raise IndexError(position)
+        return position + 1
+
+    def prev_position(self, position):
+        if position <= self._first:
+            raise IndexError(position)
+        return position - 1
+
+    def positions(self, reverse=False):
+        r = range(self._first, self.last_position() + 1)
+        if reverse:
+            return reversed(r)
+        return r
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._fp.close()
+
+    def estimate_rows(self, maxcol):
+        """Return (rows before the focus, total rows) for a scroll bar.
+
+        Every line is counted as one row, working out how many rows
+        each line actually wraps to would mean reading them all.
+        """
+        if self.focus is None:
+            return 0, 0
+        return self.focus - self._first, len(self._offsets)
@@ -0,0 +1,87 @@
+# Copyright 2019 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from unittest import TestCase
+
+import urwid
+
+from subiquitycore.ui.logwalker import FileLogWalker
+
+
+def text_of(walker, position):
+    return walker[position].get_text()[0]
+
+
+class TestFileLogWalker(TestCase):
+
+    def make_walker(self, **kw):
+        walker = FileLogWalker(**kw)
+        self.addCleanup(walker.close)
+        return walker
+
+    def test_lines_read_back(self):
+        walker = self.make_walker()
+        walker.append("first")
+        walker.append("second\nthird")
+        walker.append("ünïcödé")
+        self.assertEqual(len(walker), 4)
+        self.assertEqual(
+            [text_of(walker, p) for p in walker.positions()],
+            ["first", "second", "third", "ünïcödé"])
+        walker.append("")
+        self.assertEqual(text_of(walker, 4), "")
+
+    def test_navigation(self):
+        walker = self.make_walker()
+        self.assertEqual(walker.get_focus(), (None, None))
+        walker.append("a\nb")
+        self.assertEqual(walker.focus, 0)
+        self.assertEqual(walker.get_next(0)[1], 1)
+        self.assertEqual(walker.get_next(1), (None, None))
+        self.assertEqual(walker.get_prev(0), (None, None))
+
+    def test_oldest_lines_dropped(self):
+        walker = self.make_walker(max_lines=10)
+        for i in range(25):
+            walker.append(str(i))
+        self.assertLessEqual(len(walker), 11)
+        self.assertEqual(walker.last_position(), 24)
+        self.assertEqual(text_of(walker, 24), "24")
+        first = walker.first_position()
+        self.assertEqual(text_of(walker, first), str(first))
+        self.assertEqual(walker.focus, first)
+        with self.assertRaises(IndexError):
+            walker[first - 1]
+
+    def test_widgets_bounded(self):
+        walker = self.make_walker(cache_size=5)
+        for i in range(100):
+            walker.append(str(i))
+        for p in walker.positions():
+            walker[p]
+        self.assertEqual(len(walker._widgets), 5)
+
+    def test_render_shows_end(self):
+        walker = self.make_walker()
+        lb = urwid.ListBox(walker)
+        for i in range(1000):
+            walker.append("line {}".format(i))
+            lb.set_focus(walker.last_position())
+            lb.set_focus_valign('bottom')
+        canvas = lb.render((20, 3))
+        self.assertEqual(
+            [row.decode().rstrip() for row in canvas.text],
+            ["line 997", "line 998", "line 999"])
+        self.assertLessEqual(len(walker._widgets), walker.cache_size)
@@ -13,6 +13,7 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import asyncio
 import crypt
 import logging
 import os
@@ -131,6 +132,31 @@ def run_command(cmd, *, input=None, stdout=subprocess.PIPE,
         return cp
 
 
+async def arun_command(cmd, *, input=None, stdout=subprocess.PIPE,
+                       stderr=subprocess.PIPE, encoding='utf-8',
+                       errors='replace', env=None, check=False, **kw):
+    """Like run_command, but a coroutine that does not need a thread."""
+    if input is None:
+        kw['stdin'] = subprocess.DEVNULL
+    else:
+        kw['stdin'] = subprocess.PIPE
+        input = input.encode(encoding)
+    log.debug("arun_command called: %s", cmd)
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdout=stdout, stderr=stderr, env=_clean_env(env), **kw)
+    stdout, stderr = await proc.communicate(input)
+    if encoding:
+        if isinstance(stdout, bytes):
+            stdout = stdout.decode(encoding, errors)
+        if isinstance(stderr, bytes):
+            stderr = stderr.decode(encoding, errors)
+    log.debug("arun_command %s exited with code %s", cmd, proc.returncode)
+    if check and proc.returncode != 0:
+        raise subprocess.CalledProcessError(
+            proc.returncode, cmd, stdout, stderr)
+    return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
+
 def start_command(cmd, *, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
                   stderr=subprocess.PIPE, encoding='utf-8', errors='replace',
                   env=None, **kw):